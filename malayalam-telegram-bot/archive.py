@@ -0,0 +1,275 @@
+import asyncio
+import datetime
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from gspread.exceptions import APIError
+
+import schema
+from sheets_scheduler import BACKGROUND
+
+# Rows in these states are finished with; everything else stays in the dialogue sheet
+FINAL_STATUSES = {"approved", "rejected"}
+
+# How the bot writes the timestamp column
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def submitted(record: dict):
+    """When the dialogue was submitted, or ``None`` if its timestamp can't be read."""
+    try:
+        return datetime.datetime.strptime((record.get("timestamp") or "").strip(), TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def read_directory(worksheet):
+    """``[(dialogue_id, row_idx, worksheet_title), ...]`` from the archive directory (blocking).
+
+    Rows deleted without being archived (legacy consent placeholders) are
+    listed with a blank dialogue ID and worksheet: they only keep their
+    ``row_idx`` from being reused.
+    """
+    entries = []
+    for values in worksheet.get_all_values()[1:]:
+        values = values + [""] * (3 - len(values))
+        if values[1].isdigit() and (values[0] or not values[2]):
+            entries.append((values[0], int(values[1]), values[2]))
+    return entries
+
+
+# ─── batchUpdate requests ───
+def append_cells(sheet_id: int, rows) -> dict:
+    return {
+        "appendCells": {
+            "sheetId": sheet_id,
+            "rows": [{"values": [{"userEnteredValue": {"stringValue": value}} for value in row]} for row in rows],
+            "fields": "userEnteredValue",
+        }
+    }
+
+
+def delete_rows(sheet_id: int, sheet_rows) -> list:
+    """``deleteDimension`` requests for 1-based rows, bottom first so each delete leaves the next one's rows in place."""
+    requests = []
+    for row in sorted(sheet_rows, reverse=True):
+        last = requests[-1]["deleteDimension"]["range"] if requests else None
+        if last and last["startIndex"] == row:
+            last["startIndex"] = row - 1
+        else:
+            requests.append({
+                "deleteDimension": {
+                    "range": {"sheetId": sheet_id, "dimension": "ROWS", "startIndex": row - 1, "endIndex": row}
+                }
+            })
+    return requests
+
+
+class Archive:
+    """Rows moved out of the dialogue sheet, kept in one archive worksheet per month.
+
+    The directory worksheet has a ``dialogue_id, row_idx, worksheet`` row for
+    every archived dialogue. ``load`` reads it and the worksheets it names
+    once at startup; archived rows are then served from memory, read-only,
+    under the ``row_idx`` they had in the dialogue sheet.
+    """
+
+    def __init__(self, directory, open_worksheet, prefix: str = "archive_"):
+        self.directory = directory
+        self.open_worksheet = open_worksheet
+        self.prefix = prefix
+        self.rows = {}           # row_idx -> record
+        self.by_dialogue = {}    # dialogue_id -> row_idx
+        self.by_user = {}        # user_id -> [row_idx, ...]
+        self.moved = []          # row_idx of every row the directory lists, sorted
+        self._worksheets = {}
+        self._lock = threading.Lock()
+
+    def title(self, record: dict) -> str:
+        """Archive worksheet for a row: the month it was submitted (this month if the timestamp is unreadable)."""
+        when = submitted(record) or datetime.datetime.now()
+        return f"{self.prefix}{when:%Y-%m}"
+
+    def worksheet(self, title: str):
+        """Archive worksheet by title, created with the dialogue columns on first use."""
+        if title not in self._worksheets:
+            self._worksheets[title] = self.open_worksheet(title, schema.COLUMNS)
+        return self._worksheets[title]
+
+    # ─── Loading ───
+    def load(self):
+        """Read the directory and every archive worksheet it names (blocking)."""
+        entries = read_directory(self.directory)
+        wanted = defaultdict(dict)   # title -> dialogue_id -> row_idx
+        for dialogue_id, row_idx, title in entries:
+            if title:
+                wanted[title][dialogue_id] = row_idx
+        rows = {}
+        for title, row_of in wanted.items():
+            for values in self.worksheet(title).get_all_values()[1:]:
+                record = dict(zip(schema.COLUMNS, values + [""] * (len(schema.COLUMNS) - len(values))))
+                if record["dialogue_id"] in row_of:
+                    rows[row_of[record["dialogue_id"]]] = record
+        with self._lock:
+            self.rows, self.by_dialogue, self.by_user = {}, {}, {}
+            self._add(rows)
+            self.moved = sorted(row_idx for _, row_idx, _ in entries)
+        listed = sum(len(row_of) for row_of in wanted.values())
+        if len(rows) < listed:
+            logging.warning(f"{listed - len(rows)} archived dialogues are listed but missing from their worksheet")
+        logging.info(f"Archive loaded {len(rows)} rows from {len(wanted)} worksheets")
+
+    def add(self, records: dict):
+        with self._lock:
+            self._add(records)
+
+    def discard(self, records: dict):
+        with self._lock:
+            for row_idx in records:
+                record = self.rows.pop(row_idx, None)
+                if record is None:
+                    continue
+                if self.by_dialogue.get(record["dialogue_id"]) == row_idx:
+                    del self.by_dialogue[record["dialogue_id"]]
+                if row_idx in self.by_user.get(record.get("user_id"), []):
+                    self.by_user[record["user_id"]].remove(row_idx)
+
+    # ─── Lookups ───
+    def get(self, row_idx: int):
+        return self.rows.get(row_idx)
+
+    def find_dialogue(self, dialogue_id):
+        row_idx = self.by_dialogue.get(str(dialogue_id))
+        return (row_idx, self.rows[row_idx]) if row_idx else None
+
+    def rows_for_user(self, user_id):
+        with self._lock:
+            return [(idx, self.rows[idx]) for idx in self.by_user.get(str(user_id), [])]
+
+    def records(self):
+        with self._lock:
+            return sorted(self.rows.items())
+
+    def dialogue_ids(self):
+        return list(self.by_dialogue)
+
+    def _add(self, records: dict):
+        for row_idx, record in records.items():
+            self.rows[row_idx] = record
+            if record.get("dialogue_id"):
+                self.by_dialogue[record["dialogue_id"]] = row_idx
+            if record.get("user_id"):
+                self.by_user.setdefault(record["user_id"], []).append(row_idx)
+
+
+class Archiver:
+    """Background job moving finished rows out of the dialogue sheet into the ``Archive``.
+
+    Every ``interval`` seconds, rows that have been approved or rejected for
+    ``settle_seconds`` (counted from submission for rows already finished at
+    startup) are copied to their month's worksheet, listed in the directory
+    and deleted from the dialogue sheet in one ``spreadsheets.batchUpdate``,
+    which Google applies all or nothing. Up to ``batch_rows`` rows move per
+    request. Queued writes are flushed first and held back until the move is
+    done, since every row below a moved one moves up.
+    """
+
+    def __init__(self, storage, gateway, interval: float = 3600, settle_seconds: float = 172800,
+                 batch_rows: int = 500, timeout: float = 120):
+        self.storage = storage
+        self.archive = storage.archive
+        self.gateway = gateway
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self.batch_rows = batch_rows
+        self.timeout = timeout
+        self.settled = None      # row_idx -> when it was first seen finished (epoch seconds)
+        self._task = None
+        self._move_lock = asyncio.Lock()
+
+    def _due(self, now: float) -> list:
+        """Finished rows of the dialogue sheet that have stayed finished for ``settle_seconds``."""
+        first_pass = self.settled is None
+        previous, self.settled = self.settled or {}, {}
+        for row_idx, record in self.storage.rows.records():
+            if record.get("dialogue_id") and (record.get("status") or "").strip().lower() in FINAL_STATUSES:
+                if row_idx in previous:
+                    self.settled[row_idx] = previous[row_idx]
+                elif first_pass and submitted(record):
+                    self.settled[row_idx] = submitted(record).timestamp()
+                else:
+                    self.settled[row_idx] = now
+        return [row_idx for row_idx, since in self.settled.items() if now - since >= self.settle_seconds]
+
+    async def archive_once(self) -> int:
+        """Move one batch of settled rows; returns how many moved."""
+        async with self._move_lock:
+            due = self._due(time.time())
+            if not due:
+                return 0
+            write_buffer = self.storage.write_buffer
+            async with write_buffer.exclusive():
+                # A row whose writes didn't flush waits for the next pass
+                unflushed = {row for row, _ in write_buffer.cells}
+                records = self.storage.rows.detach([row_idx for row_idx in due if row_idx not in unflushed][:self.batch_rows])
+                if not records:
+                    return 0
+                # From here on the rows are read-only: reads hit the archive, writes are refused
+                self.archive.add(records)
+                try:
+                    await self.gateway.run(
+                        self._move, records, priority=BACKGROUND, idempotent=False, timeout=self.timeout
+                    )
+                except APIError:
+                    # Google rejected the whole request; nothing moved
+                    self.archive.discard(records)
+                    self.storage.rows.attach(records)
+                    raise
+                except Exception:
+                    # The move may or may not have happened; believe the sheet
+                    logging.error(f"Moving {len(records)} rows to the archive didn't confirm; reloading")
+                    await self.storage.reload()
+                    raise
+            for row_idx in records:
+                self.settled.pop(row_idx, None)
+            logging.info(f"Archived {len(records)} rows; {len(self.storage.rows.rows)} left in the dialogue sheet")
+            return len(records)
+
+    def _move(self, records: dict):
+        """Blocking: copy, list and delete ``records`` in one atomic batchUpdate, then renumber the sheet rows."""
+        by_title = defaultdict(list)
+        for row_idx, record in sorted(records.items()):
+            by_title[self.archive.title(record)].append((row_idx, record))
+        requests = []
+        directory = []
+        for title, rows in by_title.items():
+            worksheet = self.archive.worksheet(title)
+            requests.append(append_cells(worksheet.id, [[record.get(field) or "" for field in schema.COLUMNS] for _, record in rows]))
+            directory += [[record["dialogue_id"], str(row_idx), title] for row_idx, record in rows]
+        requests.append(append_cells(self.archive.directory.id, directory))
+
+        store = self.storage.rows
+        with store.paused():
+            requests += delete_rows(store.worksheet.id, [store.sheet_row(row_idx) for row_idx in records])
+            store.worksheet.spreadsheet.batch_update({"requests": requests})
+            store.mark_removed(records)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                while await self.archive_once() == self.batch_rows:
+                    pass
+            except Exception as e:
+                logging.error(f"Error archiving rows: {e}")
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Let a move in progress finish: the sheet's rows are only renumbered once it's done
+        async with self._move_lock:
+            if self._task:
+                self._task.cancel()
@@ -0,0 +1,195 @@
+import logging
+
+import metrics
+import schema
+from config import (
+    STORAGE_BACKEND,
+    SQLITE_PATH,
+    SHEETS_MIRROR,
+    MIRROR_SECONDS,
+    ROW_CACHE_REFRESH_SECONDS,
+    WRITE_FLUSH_SECONDS,
+    WRITE_FLUSH_MAX_PENDING,
+    ID_BLOCK_SIZE,
+    ID_BLOCK_FILE,
+    LEASE_SECONDS,
+    CONSENT_WORKSHEET,
+    ARCHIVE_SECONDS,
+    ARCHIVE_AFTER_SECONDS,
+    ARCHIVE_WORKSHEET_PREFIX,
+    ARCHIVE_DIRECTORY_WORKSHEET,
+    DUPLICATE_THRESHOLD,
+    LABEL_MODEL_PATH,
+    NOTIFY_ANNOTATION_BACKLOG,
+    NOTIFY_REVIEW_BACKLOG,
+    NOTIFY_CHECK_SECONDS,
+    NOTIFY_DIGEST_SECONDS,
+    NOTIFY_MESSAGES_PER_SECOND,
+    NOTIFY_CHAT_MESSAGES_PER_MINUTE,
+    ANNOTATORS,
+    REVIEWERS,
+    COORDINATION_URL,
+    CHANGE_POLL_SECONDS,
+    WORKER_INDEX,
+)
+from consent import ConsentRegistry
+from contributor_stats import ContributorStats
+from coordination import SharedChanges, open_coordinator
+from dedup import DuplicateIndex
+from id_allocator import DialogueIdAllocator, FileBlockReserver
+from label_model import LabelSuggester
+from notify import Backlog, BacklogNotifier
+from work_queue import LeasedQueue, needs_annotation, needs_review
+
+# Storage backend; google_sheets is only imported when the sheet is used, and connects in start()
+google_sheets = None
+gateway = None
+mirror = None
+archiver = None
+started = False
+# Multi-worker mode: state shared with the other workers (connected on first use); worker 0 (or the only
+# process) runs the singleton jobs
+coordinator = open_coordinator(COORDINATION_URL, str(WORKER_INDEX)) if WORKER_INDEX is not None else None
+leader = WORKER_INDEX in (None, 0)
+if STORAGE_BACKEND == "sheets":
+    import google_sheets
+    from google_sheets import gateway, sheet, open_worksheet
+    from archive import Archive, Archiver
+    from storage import SheetsStorage
+
+    storage = SheetsStorage(
+        gateway,
+        sheet,
+        open_worksheet(CONSENT_WORKSHEET, schema.CONSENT_COLUMNS),
+        Archive(
+            open_worksheet(ARCHIVE_DIRECTORY_WORKSHEET, schema.ARCHIVE_DIRECTORY_COLUMNS),
+            open_worksheet,
+            prefix=ARCHIVE_WORKSHEET_PREFIX,
+        ),
+        refresh_interval=ROW_CACHE_REFRESH_SECONDS,
+        flush_interval=WRITE_FLUSH_SECONDS,
+        max_pending=WRITE_FLUSH_MAX_PENDING,
+    )
+    # Finished rows leave the dialogue sheet, so it only holds the working set
+    if ARCHIVE_SECONDS:
+        archiver = Archiver(storage, gateway, interval=ARCHIVE_SECONDS, settle_seconds=ARCHIVE_AFTER_SECONDS)
+elif STORAGE_BACKEND == "sqlite":
+    from sqlite_storage import SQLiteStorage, SheetsMirror
+
+    storage = SQLiteStorage(SQLITE_PATH)
+    if SHEETS_MIRROR and leader:
+        import google_sheets
+        from google_sheets import gateway, sheet, open_worksheet
+
+        mirror = SheetsMirror(
+            storage, gateway, sheet, open_worksheet(CONSENT_WORKSHEET, schema.CONSENT_COLUMNS), interval=MIRROR_SECONDS
+        )
+else:
+    raise ValueError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}; use 'sqlite' or 'sheets'.")
+
+# In-process dialogue ID counter, seeded from storage on startup
+id_allocator = DialogueIdAllocator(
+    block_size=ID_BLOCK_SIZE,
+    reserver=coordinator or (FileBlockReserver(ID_BLOCK_FILE) if ID_BLOCK_FILE else None),
+)
+
+# Pending work for /annotate and /review, fed by storage as rows load and change
+annotation_queue = LeasedQueue(
+    storage, needs_annotation, lease_seconds=LEASE_SECONDS, coordinator=coordinator, name="annotation"
+)
+review_queue = LeasedQueue(storage, needs_review, lease_seconds=LEASE_SECONDS, coordinator=coordinator, name="review")
+storage.listeners += [annotation_queue.offer, review_queue.offer]
+
+# Per-user counters behind /stats and /leaderboard, rebuilt as storage loads
+contributor_stats = ContributorStats()
+storage.listeners.append(contributor_stats.observe)
+
+# Exact and near-duplicate lookup over every stored utterance, rebuilt as storage loads
+duplicate_index = DuplicateIndex(
+    lambda dialogue_id: (storage.find_dialogue(dialogue_id) or (None, {}))[1].get("utterance"),
+    threshold=DUPLICATE_THRESHOLD,
+)
+storage.listeners.append(duplicate_index.observe)
+
+# Intent/emotion/topic suggestions for /annotate, learned from approved rows as they load and change
+label_suggester = LabelSuggester(LABEL_MODEL_PATH)
+storage.listeners.append(label_suggester.observe)
+
+# Digests telling annotators/reviewers about piled-up work, from counts kept as storage loads and changes
+backlog_notifier = BacklogNotifier(
+    [
+        Backlog(needs_annotation, ANNOTATORS, NOTIFY_ANNOTATION_BACKLOG, "📝 {count} dialogues to annotate: /annotate"),
+        Backlog(needs_review, REVIEWERS, NOTIFY_REVIEW_BACKLOG, "🔍 {count} dialogues to review: /review"),
+    ],
+    interval=NOTIFY_CHECK_SECONDS,
+    digest_seconds=NOTIFY_DIGEST_SECONDS,
+    messages_per_second=NOTIFY_MESSAGES_PER_SECOND,
+    chat_messages_per_minute=NOTIFY_CHAT_MESSAGES_PER_MINUTE,
+)
+storage.listeners += [backlog.observe for backlog in backlog_notifier.backlogs]
+
+# Sheets quota pressure, scraped with the other metrics
+if gateway:
+    metrics.registry.gauge("bot_sheets_queue_depth", "Sheets calls waiting for quota.", gateway.queue_depth)
+    metrics.registry.gauge(
+        "bot_sheets_retries_total", "Sheets calls retried after 429/5xx.", lambda: gateway.scheduler.retries, "counter"
+    )
+
+# Consent is checked with a set lookup
+consents = ConsentRegistry(storage)
+
+# Rows the other workers write reach the listeners above through the coordinator
+shared_changes = SharedChanges(storage, coordinator, interval=CHANGE_POLL_SECONDS) if coordinator else None
+
+
+async def start():
+    """Connect to the sheet, load storage and everything derived from it; called from ``post_init``."""
+    global started
+    if google_sheets:
+        await google_sheets.warm_up()
+    if mirror:
+        await mirror.import_if_empty()
+    label_suggester.load()
+    if shared_changes:
+        shared_changes.mark()
+    await storage.start()
+    label_suggester.loaded(storage.records())
+    if leader:
+        label_suggester.save()
+    id_allocator.seed(storage.dialogue_ids())
+    await consents.load()
+    if mirror:
+        mirror.start()
+    if archiver:
+        archiver.start()
+    if shared_changes:
+        shared_changes.start()
+    started = True
+    logging.info(
+        f"Storage backend ready: {STORAGE_BACKEND}{' + Sheets mirror' if mirror else ''}"
+        f"{f' (worker {WORKER_INDEX})' if coordinator else ''}"
+    )
+
+
+def ready() -> bool:
+    """Storage is loaded and, if used, the sheet is open: safe to route updates here."""
+    return started and (google_sheets is None or google_sheets.ready())
+
+
+async def stop():
+    """Flush pending writes and release connections; called from ``post_shutdown``."""
+    global started
+    started = False
+    if shared_changes:
+        await shared_changes.stop()
+    if mirror:
+        await mirror.stop()
+    if archiver:
+        await archiver.stop()
+    await storage.close()
+    if leader:
+        label_suggester.save()
+    if coordinator:
+        coordinator.close()
+    if gateway:
+        gateway.shutdown()
@@ -0,0 +1,261 @@
+"""Load benchmark for the handlers against an in-memory fake Google Sheet.
+
+    python bench.py --rows 1000 10000 100000 --contributors 20 --annotators 5 --reviewers 5
+
+Simulated contributors submit dialogues and check /stats, annotators run the
+three-step /annotate flow and reviewers approve or reject. For each sheet
+size it reports p50/p99 latency per handler, overall throughput and Sheets
+API calls per update. Each size runs in its own process because the storage
+backend is created at import time.
+
+By default it runs the bot's default setup: SQLite storage mirrored to the
+fake sheet. ``--backend sheets`` uses the sheet itself as the store;
+``--no-mirror`` leaves the sheet out entirely, so it reports 0 Sheets calls.
+
+    python bench.py --validator
+
+compares the Malayalam validator in utils with the original per-character
+check on long texts and on a batch of lines. The fake sheet stands in for
+``google_sheets``, so no credentials or network are needed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+SENTENCES = [
+    "സുപ്രഭാതം! നിങ്ങൾക്ക് എങ്ങനെ സഹായിക്കാം?",
+    "എനിക്ക് കേബിൾ കണക്ഷന്റെ വിശദാംശങ്ങൾ വേണം.",
+    "ഇന്റർനെറ്റ് വളരെ പതുക്കെയാണ്.",
+    "ബിൽ തുക എത്രയാണ്?",
+    "നന്ദി, നല്ല സേവനം.",
+]
+HEADER = [
+    "user_id", "username", "utterance", "timestamp", "dialogue_id", "intent", "emotion",
+    "topic", "reviewer_id", "status", "comment", "consent", "annotator_id",
+]
+CONTRIBUTOR_IDS = 10_000_000
+ANNOTATOR_IDS = 20_000_000
+REVIEWER_IDS = 30_000_000
+
+
+def legacy_is_malayalam(text: str) -> bool:
+    """The original per-character check, kept for comparison."""
+    return all('\u0D00' <= char <= '\u0D7F' or char.isspace() or char in ",.!?:" for char in text)
+
+
+def bench_validator(repeat: int = 5):
+    from utils import validator
+
+    def best_of(func, *args):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func(*args)
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    print(f"{'input':<28}{'legacy ms':>12}{'validator ms':>14}{'speedup':>9}")
+    for size in (1_000, 100_000, 1_000_000):
+        text = (" ".join(SENTENCES) * (size // 100 + 1))[:size]
+        legacy = best_of(legacy_is_malayalam, text)
+        new = best_of(validator.check, text)
+        print(f"{f'{size:,} chars':<28}{legacy * 1000:>12.3f}{new * 1000:>14.3f}{legacy / new:>8.1f}x")
+    lines = [SENTENCES[i % len(SENTENCES)] for i in range(10_000)]
+    legacy = best_of(lambda: [legacy_is_malayalam(line) for line in lines])
+    new = best_of(validator.check_many, lines)
+    print(f"{'10,000 lines (check_many)':<28}{legacy * 1000:>12.3f}{new * 1000:>14.3f}{legacy / new:>8.1f}x")
+
+
+def make_rows(count: int, seed: int = 0):
+    """Header plus ``count`` dialogue rows: ~40% unannotated, ~30% awaiting review, ~30% reviewed."""
+    rng = random.Random(seed)
+    rows = [HEADER]
+    for i in range(1, count + 1):
+        user_id = str(CONTRIBUTOR_IDS + rng.randrange(1000))
+        row = [user_id, f"user{user_id}", rng.choice(SENTENCES), "2024-01-01 00:00:00", str(i)]
+        stage = rng.random()
+        if stage > 0.4:
+            row += ["question", "neutral", "general"]
+        if stage > 0.7:
+            row += [str(REVIEWER_IDS), rng.choice(["approved", "rejected"]), "", "", str(ANNOTATOR_IDS)]
+        rows.append(row)
+    return rows
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run_workload(args):
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "bench")
+    os.environ.setdefault("GOOGLE_SHEET_ID", "bench")
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["SHEETS_MIRROR"] = "1" if args.backend == "sheets" or args.mirror else "0"
+    os.environ["SQLITE_PATH"] = ":memory:"
+    # Contributors pick from a handful of sentences; duplicate rejection would skip the save being measured
+    os.environ["DUPLICATE_ACTION"] = "off"
+
+    import fake_sheets
+    values = make_rows(args.rows[0], args.seed)
+    sheet = fake_sheets.FakeWorksheet(
+        values=values, latency=args.latency / 1000, per_row_latency=args.per_row_latency / 1000
+    )
+    spreadsheet = fake_sheets.FakeSpreadsheet(sheet)
+    fake_sheets.install(spreadsheet, timeout=600, rate_per_minute=args.quota, burst=max(1, int(args.quota // 60)))
+
+    import config
+    import backend
+    import handlers
+    from fake_telegram import FakeBot, FakeContext, FakeUpdate, FakeUser
+
+    annotators = [FakeUser(ANNOTATOR_IDS + i) for i in range(args.annotators)]
+    reviewers = [FakeUser(REVIEWER_IDS + i) for i in range(args.reviewers)]
+    contributors = [FakeUser(CONTRIBUTOR_IDS + i) for i in range(args.contributors)]
+    config.ANNOTATORS.update(user.id for user in annotators)
+    config.REVIEWERS.update(user.id for user in reviewers)
+
+    setup_started = time.perf_counter()
+    if backend.STORAGE_BACKEND == "sqlite" and not backend.mirror:
+        backend.storage.import_rows(values)   # nothing to import from, so load the rows directly
+    await backend.start()
+    setup_seconds = time.perf_counter() - setup_started
+    setup_calls = spreadsheet.total_calls()
+
+    bot, bot_data = FakeBot(), {}
+    latencies = defaultdict(list)
+    rng = random.Random(args.seed)
+
+    async def timed(handler, update, context):
+        started = time.perf_counter()
+        await handler(update, context)
+        latencies[handler.__name__].append(time.perf_counter() - started)
+
+    async def contributor(user):
+        context = FakeContext(bot, bot_data)
+        for _ in range(args.ops):
+            await timed(handlers.submit, FakeUpdate.text(user, "/submit"), context)
+            await timed(handlers.handle_message, FakeUpdate.text(user, rng.choice(SENTENCES)), context)
+            await timed(handlers.stats, FakeUpdate.text(user, "/stats"), context)
+
+    async def annotator(user):
+        context = FakeContext(bot, bot_data)
+        for _ in range(args.ops):
+            await timed(handlers.annotate, FakeUpdate.text(user, "/annotate"), context)
+            if not context.user_data.get("current_annotation"):
+                break
+            for data in ("intent_question", "emotion_happy", "topic_general", "annotate_save"):
+                await timed(handlers.annotation_callback, FakeUpdate.callback(user, data), context)
+
+    async def reviewer(user):
+        context = FakeContext(bot, bot_data)
+        for _ in range(args.ops):
+            await timed(handlers.review, FakeUpdate.text(user, "/review"), context)
+            if not context.user_data.get("pending_review"):
+                break
+            if rng.random() < 0.8:
+                await timed(handlers.review_callback, FakeUpdate.callback(user, "review_approve"), context)
+            else:
+                await timed(handlers.review_callback, FakeUpdate.callback(user, "review_reject"), context)
+                reply = FakeUpdate.text(user, "തെറ്റായ ലേബൽ", reply_to_message=object())
+                await timed(handlers.handle_review_comment, reply, context)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(contributor(user) for user in contributors),
+        *(annotator(user) for user in annotators),
+        *(reviewer(user) for user in reviewers),
+    )
+    elapsed = time.perf_counter() - started
+    await backend.stop()   # flush buffered writes so their Sheets calls are counted
+    flushed = time.perf_counter() - started
+
+    calls = spreadsheet.total_calls()
+    calls.subtract(setup_calls)
+    updates = sum(len(values) for values in latencies.values())
+    return {
+        "rows": args.rows[0],
+        "backend": args.backend + ((" + mirror" if args.mirror else ", no sheet") if args.backend == "sqlite" else ""),
+        "updates": updates,
+        "seconds": round(elapsed, 3),
+        "seconds_incl_flush": round(flushed, 3),
+        "setup_seconds": round(setup_seconds, 3),
+        "throughput": round(updates / elapsed, 1) if elapsed else 0,
+        "sheets_calls": sum(calls.values()),
+        "sheets_calls_per_update": round(sum(calls.values()) / updates, 3) if updates else 0,
+        "sheets_calls_by_method": {name: count for name, count in calls.items() if count},
+        "handlers": {
+            name: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+            }
+            for name, values in sorted(latencies.items())
+        },
+    }
+
+
+def print_report(results):
+    for result in results:
+        print(f"\n── {result['rows']:,} rows · {result['backend']} ──")
+        print(
+            f"{result['updates']} updates in {result['seconds']}s "
+            f"({result['throughput']}/s, {result['seconds_incl_flush']}s incl. final flush; "
+            f"startup load {result['setup_seconds']}s)"
+        )
+        print(f"Sheets calls: {result['sheets_calls']} ({result['sheets_calls_per_update']}/update) {result['sheets_calls_by_method']}")
+        print(f"{'handler':<24}{'count':>8}{'p50 ms':>12}{'p99 ms':>12}")
+        for name, stats in result["handlers"].items():
+            print(f"{name:<24}{stats['count']:>8}{stats['p50_ms']:>12}{stats['p99_ms']:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000], help="sheet sizes to test")
+    parser.add_argument("--contributors", type=int, default=20)
+    parser.add_argument("--annotators", type=int, default=5)
+    parser.add_argument("--reviewers", type=int, default=5)
+    parser.add_argument("--ops", type=int, default=5, help="rounds of work per simulated user")
+    parser.add_argument("--backend", choices=["sqlite", "sheets"], default="sqlite")
+    parser.add_argument("--mirror", action=argparse.BooleanOptionalAction, default=True,
+                        help="with --backend sqlite, mirror to the fake sheet (--no-mirror: no Sheets calls at all)")
+    parser.add_argument("--latency", type=float, default=50, help="fake Sheets round trip per call (ms)")
+    parser.add_argument("--per-row-latency", type=float, default=0.002, help="extra fake latency per row read (ms)")
+    parser.add_argument("--quota", type=float, default=6000, help="Sheets requests per minute allowed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    parser.add_argument("--validator", action="store_true", help="benchmark the Malayalam validator instead")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.validator:
+        bench_validator()
+        return
+
+    if args.single:
+        print(json.dumps(asyncio.run(run_workload(args))))
+        return
+
+    results = []
+    passthrough = [arg for arg in sys.argv[1:] if arg != "--json"]
+    for rows in args.rows:
+        command = [sys.executable, os.path.abspath(__file__), *passthrough, "--single", "--rows", str(rows)]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
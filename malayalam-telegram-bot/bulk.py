@@ -0,0 +1,75 @@
+import csv
+import io
+import itertools
+
+from utils import validator
+
+# CSV header cells naming the utterance column; otherwise the first column is used
+TEXT_COLUMNS = {"utterance", "text", "sentence", "dialogue"}
+
+
+def parse_text(stream):
+    """Yield ``(line_no, text)`` for each non-blank line."""
+    for line_no, line in enumerate(stream, start=1):
+        text = line.strip()
+        if text:
+            yield line_no, text
+
+
+def parse_csv(stream):
+    """Yield ``(line_no, text)`` from the utterance column (or the first column) of a CSV."""
+    reader = csv.reader(stream)
+    column = 0
+    for row in reader:
+        if reader.line_num == 1:
+            header = [cell.strip().lower() for cell in row]
+            matches = [i for i, cell in enumerate(header) if cell in TEXT_COLUMNS]
+            if matches:
+                column = matches[0]
+                continue
+        text = row[column].strip() if len(row) > column else ""
+        if text:
+            yield reader.line_num, text
+
+
+def open_document(data: bytes):
+    """Text stream over an uploaded file's bytes, decoded as UTF-8 (a BOM is skipped)."""
+    return io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", errors="replace", newline="")
+
+
+def split_valid(entries, max_lines: int, chunk_size: int = 256):
+    """Run the Malayalam validator over parsed lines, a chunk at a time.
+
+    Returns ``(accepted, rejected, truncated)``: accepted ``(line_no,
+    normalized_text)``, rejected ``(line_no, reason)``, and whether parsing
+    stopped at ``max_lines`` accepted lines.
+    """
+    accepted, rejected = [], []
+    entries = iter(entries)
+    while chunk := list(itertools.islice(entries, chunk_size)):
+        results = validator.check_many([text for _, text in chunk])
+        for (line_no, _), (text, reason) in zip(chunk, results):
+            if reason:
+                rejected.append((line_no, reason))
+            elif len(accepted) == max_lines:
+                return accepted, rejected, True
+            else:
+                accepted.append((line_no, text))
+    return accepted, rejected, False
+
+
+def find_duplicates(accepted, index):
+    """``{line_no: reason}`` for accepted lines that are already stored or repeat an earlier line of the batch."""
+    batch = index.scratch()
+    duplicates = {}
+    for line_no, text in accepted:
+        match = index.find(text)
+        if match:
+            duplicates[line_no] = f"duplicate of dialogue {match.key}"
+            continue
+        match = batch.find(text)
+        if match:
+            duplicates[line_no] = f"repeats line {match.key}"
+        else:
+            batch.add(line_no, text)
+    return duplicates
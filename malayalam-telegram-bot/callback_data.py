@@ -0,0 +1,51 @@
+from collections import namedtuple
+
+import schema
+
+# Telegram rejects inline buttons whose callback_data is longer than this
+MAX_BYTES = 64
+
+# Which row a button acts on: where it was, which dialogue it held and its content version then
+RowRef = namedtuple("RowRef", "row_idx dialogue_id version")
+
+
+def pack(action: str, row_idx: int, record: dict) -> str:
+    """``action:row:dialogue_id:version`` for a button acting on ``record`` at ``row_idx``.
+
+    The row index is base 36 and the version is ``schema.version``, so
+    even long actions like ``set_topic_customer_support`` fit in 64 bytes.
+    """
+    data = f"{action}:{schema.base36(row_idx)}:{record.get('dialogue_id', '')}:{schema.version(record)}"
+    if len(data.encode()) > MAX_BYTES:
+        raise ValueError(f"Callback data {data!r} is longer than {MAX_BYTES} bytes")
+    return data
+
+
+def unpack(data: str):
+    """``(action, RowRef)``, or ``(data, None)`` for buttons sent before callback data carried a row."""
+    parts = data.split(":")
+    if len(parts) != 4:
+        return data, None
+    action, row, dialogue_id, version = parts
+    try:
+        return action, RowRef(int(row, 36), dialogue_id, version)
+    except ValueError:
+        return data, None
+
+
+def resolve(storage, ref: RowRef):
+    """``(row_idx, record)`` the button meant, if that dialogue is still at the button's version.
+
+    No scan: the row is checked where it was, and if it moved (the sheet was
+    re-sorted, rows deleted) it is looked up by dialogue ID. ``None`` means
+    the row changed since the button was sent, and the caller should refuse.
+    """
+    record = storage.get(ref.row_idx)
+    if record is None or record.get("dialogue_id") != ref.dialogue_id:
+        found = storage.find_dialogue(ref.dialogue_id)
+        if found is None:
+            return None
+        row_idx, record = found
+    else:
+        row_idx = ref.row_idx
+    return (row_idx, record) if schema.version(record) == ref.version else None
@@ -14,13 +14,132 @@ logging.basicConfig(
 BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 SHEET_ID = os.environ.get("GOOGLE_SHEET_ID")
 
-if not BOT_TOKEN or not SHEET_ID:
-    raise ValueError("Missing environment variables. Please set TELEGRAM_BOT_TOKEN and GOOGLE_SHEET_ID.")
+# Storage: "sqlite" (local database, mirrored to the sheet) or "sheets" (the sheet itself)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "sqlite")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "bot.db")
+SHEETS_MIRROR = os.environ.get("SHEETS_MIRROR", "1") == "1"
+MIRROR_SECONDS = float(os.environ.get("MIRROR_SECONDS", "10"))
 
-# Save credentials to file for Google Sheets
-with open("credentials.json", "w") as f:
-    f.write(os.environ["GOOGLE_CREDENTIALS_JSON"])
+# The sheet is only needed when it is the store or the mirror
+USE_SHEETS = STORAGE_BACKEND == "sheets" or SHEETS_MIRROR
+# Service account key (JSON); read in memory when the sheet is first opened
+GOOGLE_CREDENTIALS_JSON = os.environ.get("GOOGLE_CREDENTIALS_JSON")
+
+
+def validate():
+    """Fail fast on missing settings; called by main() rather than on import so scripts can import freely."""
+    if not BOT_TOKEN or (USE_SHEETS and not SHEET_ID):
+        raise ValueError(
+            "Missing environment variables. Please set TELEGRAM_BOT_TOKEN and GOOGLE_SHEET_ID "
+            "(or STORAGE_BACKEND=sqlite with SHEETS_MIRROR=0 to run without Google Sheets)."
+        )
+    if WORKERS > 1 and (not WEBHOOK_URL or STORAGE_BACKEND != "sqlite" or SQLITE_PATH == ":memory:"):
+        raise ValueError(
+            "WORKERS > 1 needs WEBHOOK_URL (one webhook feeds every worker) and STORAGE_BACKEND=sqlite with a "
+            "database file the workers share; the sheets backend keeps rows in each process's memory."
+        )
+    if ARCHIVE_SECONDS and STORAGE_BACKEND != "sheets":
+        raise ValueError(
+            "ARCHIVE_SECONDS needs STORAGE_BACKEND=sheets: the SQLite mirror writes every dialogue to its own row "
+            "of the dialogue sheet and doesn't archive. Set ARCHIVE_SECONDS=0."
+        )
+
+# How often (seconds) the in-memory row store pulls rows appended by others
+ROW_CACHE_REFRESH_SECONDS = float(os.environ.get("ROW_CACHE_REFRESH_SECONDS", "60"))
+
+# Thread pool size and per-call timeout (seconds) for blocking gspread calls
+SHEETS_MAX_WORKERS = int(os.environ.get("SHEETS_MAX_WORKERS", "4"))
+SHEETS_TIMEOUT_SECONDS = float(os.environ.get("SHEETS_TIMEOUT_SECONDS", "20"))
+
+# Sheets quota pacing: sustained requests per minute, burst size and retries for 429/5xx
+SHEETS_REQUESTS_PER_MINUTE = float(os.environ.get("SHEETS_REQUESTS_PER_MINUTE", "60"))
+SHEETS_BURST = int(os.environ.get("SHEETS_BURST", "10"))
+SHEETS_MAX_RETRIES = int(os.environ.get("SHEETS_MAX_RETRIES", "5"))
+
+# Write-behind batching: flush queued writes after this many seconds or queued writes
+WRITE_FLUSH_SECONDS = float(os.environ.get("WRITE_FLUSH_SECONDS", "2"))
+WRITE_FLUSH_MAX_PENDING = int(os.environ.get("WRITE_FLUSH_MAX_PENDING", "50"))
+
+# Dialogue ID allocation; set ID_BLOCK_FILE when several bot processes share one sheet (multi-worker mode
+# reserves blocks through COORDINATION_URL instead)
+ID_BLOCK_SIZE = int(os.environ.get("ID_BLOCK_SIZE", "1"))
+ID_BLOCK_FILE = os.environ.get("ID_BLOCK_FILE")
+
+# Seconds an annotator/reviewer keeps a handed-out dialogue before it goes back in the queue
+LEASE_SECONDS = float(os.environ.get("LEASE_SECONDS", "900"))
+
+# Worksheet (in the same spreadsheet) holding one row per consenting user
+CONSENT_WORKSHEET = os.environ.get("CONSENT_WORKSHEET", "consent")
+
+# Archiving (sheets backend only): rows approved/rejected for ARCHIVE_AFTER_SECONDS move from the dialogue sheet to
+# monthly worksheets, checked every ARCHIVE_SECONDS (0 turns the job off; run it in one bot process only). The
+# SQLite backend's mirror keeps every row on the dialogue sheet at its row_idx, so there it must stay 0
+ARCHIVE_SECONDS = float(os.environ.get("ARCHIVE_SECONDS", "3600" if STORAGE_BACKEND == "sheets" else "0"))
+ARCHIVE_AFTER_SECONDS = float(os.environ.get("ARCHIVE_AFTER_SECONDS", "172800"))
+ARCHIVE_WORKSHEET_PREFIX = os.environ.get("ARCHIVE_WORKSHEET_PREFIX", "archive_")
+ARCHIVE_DIRECTORY_WORKSHEET = os.environ.get("ARCHIVE_DIRECTORY_WORKSHEET", "archive_directory")
+
+# Flow state (context.user_data) survives restarts in this database; idle state expires after the TTL
+CONVERSATION_STATE_PATH = os.environ.get("CONVERSATION_STATE_PATH", SQLITE_PATH)
+CONVERSATION_TTL_SECONDS = float(os.environ.get("CONVERSATION_TTL_SECONDS", "86400"))
+CONVERSATION_FLUSH_SECONDS = float(os.environ.get("CONVERSATION_FLUSH_SECONDS", "1"))
+
+# Bulk submission (/bulk): most lines saved per message or file, and the largest file accepted
+BULK_MAX_LINES = int(os.environ.get("BULK_MAX_LINES", "1000"))
+BULK_MAX_FILE_BYTES = int(os.environ.get("BULK_MAX_FILE_BYTES", "1000000"))
+
+# /review batch: dialogues per page (reviewers can ask for up to 15 with /review batch N)
+REVIEW_BATCH_SIZE = int(os.environ.get("REVIEW_BATCH_SIZE", "10"))
+
+# Malayalam validation: characters accepted on top of the default punctuation, and ASCII digits
+VALIDATOR_EXTRA_CHARS = os.environ.get("VALIDATOR_EXTRA_CHARS", "")
+VALIDATOR_ALLOW_DIGITS = os.environ.get("VALIDATOR_ALLOW_DIGITS", "1") == "1"
+
+# Duplicate submissions: "reject", "flag" (save but tell the user) or "off"; near-duplicate similarity cut-off
+DUPLICATE_ACTION = os.environ.get("DUPLICATE_ACTION", "reject")
+DUPLICATE_THRESHOLD = float(os.environ.get("DUPLICATE_THRESHOLD", "0.8"))
+
+# Where the label suggester keeps its trained counts between restarts ("" to keep them in memory only)
+LABEL_MODEL_PATH = os.environ.get("LABEL_MODEL_PATH", "label_model.json")
+
+# Backlog digests: annotators/reviewers are messaged once this many dialogues await them (0 = never), checked every
+# NOTIFY_CHECK_SECONDS (0 turns it off) and repeated at most every NOTIFY_DIGEST_SECONDS while the backlog grows
+NOTIFY_ANNOTATION_BACKLOG = int(os.environ.get("NOTIFY_ANNOTATION_BACKLOG", "20"))
+NOTIFY_REVIEW_BACKLOG = int(os.environ.get("NOTIFY_REVIEW_BACKLOG", "20"))
+NOTIFY_CHECK_SECONDS = float(os.environ.get("NOTIFY_CHECK_SECONDS", "60"))
+NOTIFY_DIGEST_SECONDS = float(os.environ.get("NOTIFY_DIGEST_SECONDS", "3600"))
+# Telegram send limits for digests: messages per second overall, and per minute to one chat
+NOTIFY_MESSAGES_PER_SECOND = float(os.environ.get("NOTIFY_MESSAGES_PER_SECOND", "25"))
+NOTIFY_CHAT_MESSAGES_PER_MINUTE = float(os.environ.get("NOTIFY_CHAT_MESSAGES_PER_MINUTE", "20"))
+
+# Serving mode: set WEBHOOK_URL (public https base URL) to use webhooks instead of polling
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("PORT", "8443"))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")
+
+# Multi-worker mode (needs WEBHOOK_URL and the sqlite backend): this process receives the webhook and hands each
+# update to one of WORKERS bot processes it starts (0 = one per CPU core), chosen by user, on ports from
+# WORKER_BASE_PORT up. They share IDs, leases, row changes and flow state through COORDINATION_URL: a SQLite file
+# for one host, or redis://… (needs the redis package). Singleton jobs (mirror, digests) run in worker 0.
+WORKERS = int(os.environ.get("WORKERS", "1")) or os.cpu_count() or 1
+WORKER_BASE_PORT = int(os.environ.get("WORKER_BASE_PORT", "8600"))
+COORDINATION_URL = os.environ.get("COORDINATION_URL", "coordination.db")
+# How often (seconds) a worker picks up rows the other workers wrote
+CHANGE_POLL_SECONDS = float(os.environ.get("CHANGE_POLL_SECONDS", "0.5"))
+# Set by the router for each worker it starts; unset in the router and when running a single process
+WORKER_INDEX = int(os.environ["WORKER_INDEX"]) if os.environ.get("WORKER_INDEX") else None
+
+# Updates processed at once (each user's updates still run in order)
+MAX_CONCURRENT_UPDATES = int(os.environ.get("MAX_CONCURRENT_UPDATES", "32"))
+
+# Prometheus metrics at http://METRICS_LISTEN:METRICS_PORT/metrics (disabled when unset)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_LISTEN = os.environ.get("METRICS_LISTEN", "127.0.0.1")
 
 # Annotators and reviewers (replace with actual IDs)
 ANNOTATORS = {123456789, 987654321, 1207889943}
 REVIEWERS = {112233445, 998877665, 1207889943,509779274}
+# Admins can see /perf
+ADMINS = {1207889943}
@@ -0,0 +1,21 @@
+class ConsentRegistry:
+    """Set of consenting user IDs, loaded once from storage and kept in sync on grant."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.users = set()
+        self.loaded = False
+
+    async def load(self):
+        self.users = await self.storage.load_consents()
+        self.loaded = True
+
+    def has_consented(self, user_id) -> bool:
+        return str(user_id) in self.users
+
+    async def grant(self, user_id):
+        user_id = str(user_id)
+        if user_id in self.users:
+            return
+        await self.storage.save_consent(user_id)
+        self.users.add(user_id)
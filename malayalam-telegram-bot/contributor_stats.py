@@ -0,0 +1,103 @@
+import heapq
+import threading
+from collections import Counter
+
+# Users kept ranked as scores change; /leaderboard asks for the top 10
+TOP_SIZE = 50
+
+
+class ContributorStats:
+    """Per-user submission, annotation and review counters.
+
+    Registered as a storage listener, so counters are rebuilt when storage
+    loads and adjusted on every write. Each row's last contribution is
+    remembered, so a changed row moves its counts instead of adding twice.
+
+    ``totals`` (the leaderboard score) is kept alongside, and so are the
+    ``TOP_SIZE`` best users with an upper bound on everyone else's score:
+    a leaderboard is read off those while the bound proves them the top,
+    and only ranks every user again after a top score fell below it.
+    """
+
+    def __init__(self):
+        self.submissions = Counter()
+        self.annotations = Counter()
+        self.approved = Counter()
+        self.rejected = Counter()
+        self.totals = Counter()  # user_id -> submissions + annotations + reviews
+        self.usernames = {}
+        self._rows = {}          # row_idx -> (submitter, annotator, reviewer, status)
+        self._top = {}           # user_id -> total, for up to TOP_SIZE users
+        self._others_max = 0     # no user outside _top has a higher total
+        self._lock = threading.Lock()
+
+    def observe(self, row_idx: int, record: dict):
+        contribution = (
+            record.get("user_id") if record.get("dialogue_id") else "",
+            record.get("annotator_id") if record.get("topic") else "",
+            record.get("reviewer_id", ""),
+            record.get("status", ""),
+        )
+        with self._lock:
+            previous = self._rows.get(row_idx)
+            if previous == contribution:
+                return
+            if previous:
+                self._count(previous, -1)
+            self._count(contribution, 1)
+            self._rows[row_idx] = contribution
+            if record.get("user_id") and record.get("username"):
+                self.usernames[record["user_id"]] = record["username"]
+
+    def _count(self, contribution, delta: int):
+        submitter, annotator, reviewer, status = contribution
+        if submitter:
+            self.submissions[submitter] += delta
+            self._add_total(submitter, delta)
+        if annotator:
+            self.annotations[annotator] += delta
+            self._add_total(annotator, delta)
+        if reviewer and status == "approved":
+            self.approved[reviewer] += delta
+            self._add_total(reviewer, delta)
+        elif reviewer and status == "rejected":
+            self.rejected[reviewer] += delta
+            self._add_total(reviewer, delta)
+
+    def _add_total(self, user_id: str, delta: int):
+        total = self.totals[user_id] = self.totals[user_id] + delta
+        if user_id in self._top:
+            self._top[user_id] = total
+        elif len(self._top) < TOP_SIZE and total > self._others_max:
+            self._top[user_id] = total
+        elif self._top and total > min(self._top.values()):
+            # Overtook the last of the top; it drops out and raises the bound on everyone outside
+            last = min(self._top, key=self._top.get)
+            self._others_max = max(self._others_max, self._top.pop(last))
+            self._top[user_id] = total
+        else:
+            self._others_max = max(self._others_max, total)
+
+    def for_user(self, user_id) -> dict:
+        user_id = str(user_id)
+        return {
+            "submissions": self.submissions[user_id],
+            "annotations": self.annotations[user_id],
+            "approved": self.approved[user_id],
+            "rejected": self.rejected[user_id],
+        }
+
+    def leaderboard(self, limit: int = 10):
+        """Top ``(user_id, score)`` by submissions + annotations + reviews."""
+        with self._lock:
+            if limit > TOP_SIZE:
+                return heapq.nlargest(limit, ((u, t) for u, t in self.totals.items() if t > 0), key=lambda item: item[1])
+            ranked = sorted(self._top.items(), key=lambda item: item[1], reverse=True)
+            proven = [(user_id, total) for user_id, total in ranked if total >= self._others_max and total > 0]
+            if len(proven) < limit and self._others_max > 0:
+                # A top score fell below someone outside; rank everyone again
+                ranked = heapq.nlargest(TOP_SIZE + 1, self.totals.items(), key=lambda item: item[1])
+                self._top = dict(ranked[:TOP_SIZE])
+                self._others_max = ranked[TOP_SIZE][1] if len(ranked) > TOP_SIZE else 0
+                proven = [(user_id, total) for user_id, total in ranked[:TOP_SIZE] if total > 0]
+            return proven[:limit]
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+
+class UserStateTable:
+    """``user_state`` table: one JSON row per user with the wall-clock time it was last saved."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS user_state (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+
+    def load(self, cutoff: float):
+        """Drop state not saved since ``cutoff`` and return the rest as ``[(user_id, data, updated_at), ...]``."""
+        self.conn.execute("DELETE FROM user_state WHERE updated_at < ?", (cutoff,))
+        return self.conn.execute("SELECT user_id, data, updated_at FROM user_state").fetchall()
+
+    def save(self, user_id: int, data: str, updated_at: float):
+        self.conn.execute(
+            "INSERT INTO user_state (user_id, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (user_id, data, updated_at),
+        )
+
+    def delete(self, user_id: int):
+        self.conn.execute("DELETE FROM user_state WHERE user_id = ?", (user_id,))
+
+    def close(self):
+        self.conn.close()
+
+
+class SQLitePersistence(BasePersistence):
+    """Keeps ``context.user_data`` (the submit/annotate/review flow state) in SQLite.
+
+    Only user data is stored, one JSON row per user. python-telegram-bot
+    hands us the users touched since the last run every ``update_interval``
+    seconds, and rows are rewritten when their JSON changed. State bigger
+    than ``max_bytes`` is not persisted. State of users who sent no update
+    for ``ttl_seconds`` is dropped from the database on load and, while
+    running, from the application's memory by ``start``'s eviction task; an
+    update that leaves the state as it was still counts, and refreshes the
+    stored time at most every ``touch_interval`` seconds.
+
+    In multi-worker mode ``store`` returns the coordination backend's user
+    state (same interface as ``UserStateTable``) and ``owns`` picks the users
+    whose updates this worker handles; only their state is loaded. Either
+    store is opened when the application first loads state, not when this
+    is built.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 86400, max_bytes: int = 4096, update_interval: float = 1,
+                 store=None, owns=None):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.owns = owns
+        self.changed_at = {}   # user_id -> wall-clock time of the user's last update
+        self._written = {}     # user_id -> JSON last written
+        self._stored_at = {}   # user_id -> updated_at last written
+        self.touch_interval = min(60, ttl_seconds / 10)
+        self._task = None
+        self._open_store = store or (lambda: UserStateTable(path))
+        self._store = None
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = self._open_store()
+        return self._store
+
+    # ─── User data ───
+    async def get_user_data(self):
+        user_data = {}
+        for user_id, data, updated_at in self.store.load(time.time() - self.ttl_seconds):
+            if self.owns and not self.owns(user_id):
+                continue
+            user_data[user_id] = json.loads(data)
+            self.changed_at[user_id] = updated_at
+            self._written[user_id] = data
+            self._stored_at[user_id] = updated_at
+        if user_data:
+            logging.info(f"Restored conversation state for {len(user_data)} users")
+        return user_data
+
+    async def update_user_data(self, user_id: int, data: dict):
+        try:
+            encoded = json.dumps(data, ensure_ascii=False, sort_keys=True) if data else None
+        except TypeError as e:
+            logging.warning(f"Not persisting state of user {user_id}: {e}")
+            return
+        now = time.time()
+        if encoded == self._written.get(user_id):
+            # Unchanged but still in use: keep it from expiring, rewriting the stored time at most every touch_interval
+            if encoded and now - self._stored_at.get(user_id, 0) >= self.touch_interval:
+                self.store.save(user_id, encoded, now)
+                self._stored_at[user_id] = now
+            self.changed_at[user_id] = now
+            return
+        if encoded and len(encoded.encode()) > self.max_bytes:
+            # Drop the stored row too: a restart shouldn't bring back a snapshot older than the live state
+            logging.warning(f"Not persisting state of user {user_id}: {len(encoded.encode())} bytes > {self.max_bytes}")
+            encoded = None
+        if encoded:
+            self.store.save(user_id, encoded, now)
+            self._written[user_id] = encoded
+            self._stored_at[user_id] = now
+        else:
+            self.store.delete(user_id)
+            self._written.pop(user_id, None)
+            self._stored_at.pop(user_id, None)
+        self.changed_at[user_id] = now
+
+    async def drop_user_data(self, user_id: int):
+        self.store.delete(user_id)
+        self._written.pop(user_id, None)
+        self._stored_at.pop(user_id, None)
+        self.changed_at.pop(user_id, None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        pass
+
+    # ─── Eviction ───
+    def start(self, application, interval: float = None):
+        """Periodically drop users whose state hasn't changed for ``ttl_seconds``."""
+        self._task = asyncio.create_task(self._evict_loop(application, interval or max(60, self.ttl_seconds / 10)))
+
+    async def _evict_loop(self, application, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            cutoff = time.time() - self.ttl_seconds
+            stale = [user_id for user_id, changed_at in self.changed_at.items() if changed_at < cutoff]
+            for user_id in stale:
+                application.drop_user_data(user_id)
+                self.changed_at.pop(user_id, None)
+            if stale:
+                logging.info(f"Evicted conversation state of {len(stale)} idle users")
+
+    async def flush(self):
+        if self._task:
+            self._task.cancel()
+        if self._store is not None:
+            self._store.close()
+
+    # ─── Not stored ───
+    async def get_chat_data(self):
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def get_bot_data(self):
+        return {}
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def get_conversations(self, name: str):
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state):
+        pass
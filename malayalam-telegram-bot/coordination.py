@@ -0,0 +1,435 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from conversation_state import UserStateTable
+
+
+def worker_for(user_id, workers: int) -> int:
+    """Worker handling ``user_id``'s updates; fixed for a user as long as the number of workers is."""
+    return int(user_id) % workers if workers > 1 else 0
+
+
+def open_coordinator(url: str, worker: str):
+    """``redis://``, ``rediss://`` or ``unix://`` URLs use Redis; anything else is a SQLite file (``sqlite:///`` optional)."""
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCoordinator(url, worker)
+    return SQLiteCoordinator(url.removeprefix("sqlite:///"), worker)
+
+
+class Coordinator:
+    """State the bot's worker processes share in multi-worker mode.
+
+    * ID blocks: ``reserve`` is a ``DialogueIdAllocator`` reserver, so no two
+      workers hand out the same dialogue ID.
+    * Leases: a row of a ``LeasedQueue`` is handed to one user across all
+      workers; ``try_lease`` takes or extends it, leases lapse on their own.
+    * Changes: every worker ``publish``es the rows it writes, and the others
+      read them back with ``changes`` to keep their queues, counters and
+      indexes in step (see ``SharedChanges``).
+    * User state: ``user_states`` stores ``context.user_data`` for
+      ``SQLitePersistence``.
+
+    ``worker`` names this process; its own changes are skipped on read.
+    The calls block: ``reserve`` and the lease calls are quick enough to
+    make from handlers, the change feed is read and written on a thread.
+    """
+
+    worker: str
+
+    def reserve(self, count: int, floor: int = 1) -> int:
+        """Return the first ID of a fresh block of ``count`` IDs, never below ``floor``."""
+        raise NotImplementedError
+
+    def try_lease(self, name: str, row_idx: int, holder: str, seconds: float) -> bool:
+        """Lease ``row_idx`` of queue ``name`` to ``holder`` for ``seconds`` unless someone else holds it."""
+        raise NotImplementedError
+
+    def release_lease(self, name: str, row_idx: int, holder: str):
+        """End ``holder``'s lease on the row, if they still hold it."""
+        raise NotImplementedError
+
+    def publish(self, row_idx: int):
+        raise NotImplementedError
+
+    def publish_many(self, rows):
+        for row_idx in rows:
+            self.publish(row_idx)
+
+    def latest_change(self):
+        """Cursor for ``changes``: the newest change published so far."""
+        raise NotImplementedError
+
+    def changes(self, cursor):
+        """``(cursor, [row_idx, ...])``: rows other workers changed after ``cursor``, and the cursor to read on from."""
+        raise NotImplementedError
+
+    def prune_changes(self, keep_seconds: float):
+        pass
+
+    def user_states(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteCoordinator(Coordinator):
+    """Coordination through a SQLite database file, for workers on one host (and for trying multi-worker mode out).
+
+    Handlers call in on the event loop, so a statement waits at most
+    ``busy_timeout`` seconds for another worker's write lock and is tried
+    ``attempts`` times before the error is raised, rather than stalling the
+    loop for SQLite's usual 30 seconds.
+    """
+
+    def __init__(self, path: str, worker: str, busy_timeout: float = 0.1, attempts: int = 5):
+        self.path = path
+        self.worker = worker
+        self.busy_timeout = busy_timeout
+        self.attempts = attempts
+        self._lock = threading.RLock()
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The database connection, opened (and the tables created) on first use rather than at import."""
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    self._conn = self._connect()
+        return self._conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=self.busy_timeout)
+        try:
+            conn.executescript("""
+                PRAGMA journal_mode = WAL;
+                PRAGMA synchronous = NORMAL;
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT NOT NULL,
+                    row_idx INTEGER NOT NULL,
+                    holder TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (name, row_idx)
+                );
+                CREATE TABLE IF NOT EXISTS changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    worker TEXT NOT NULL,
+                    row_idx INTEGER NOT NULL,
+                    at REAL NOT NULL
+                );
+            """)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _execute(self, func):
+        """``func(conn)`` under the lock, tried again while another worker holds the write lock."""
+        for attempt in range(1, self.attempts + 1):
+            try:
+                with self._lock:
+                    return func(self.conn)
+            except sqlite3.OperationalError as e:
+                if attempt == self.attempts or ("locked" not in str(e) and "busy" not in str(e)):
+                    raise
+                logging.warning(f"Coordination database {self.path} is busy; attempt {attempt + 1} of {self.attempts}")
+
+    @staticmethod
+    def _in_transaction(conn, func):
+        # IMMEDIATE takes the write lock before any read, so two workers can't both read the same counter
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def reserve(self, count: int, floor: int = 1) -> int:
+        def reserve(conn):
+            row = conn.execute("SELECT value FROM counters WHERE name = 'dialogue_id'").fetchone()
+            start = max(row[0] if row else 1, floor)
+            conn.execute(
+                "INSERT INTO counters (name, value) VALUES ('dialogue_id', ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                (start + count,),
+            )
+            return start
+        return self._execute(lambda conn: self._in_transaction(conn, reserve))
+
+    def try_lease(self, name: str, row_idx: int, holder: str, seconds: float) -> bool:
+        def try_lease(conn):
+            now = time.time()
+            cursor = conn.execute(
+                "INSERT INTO leases (name, row_idx, holder, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name, row_idx) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                "WHERE leases.holder = excluded.holder OR leases.expires_at <= ?",
+                (name, row_idx, holder, now + seconds, now),
+            )
+            return cursor.rowcount == 1
+        return self._execute(try_lease)
+
+    def release_lease(self, name: str, row_idx: int, holder: str):
+        self._execute(lambda conn: conn.execute(
+            "DELETE FROM leases WHERE name = ? AND row_idx = ? AND holder = ?", (name, row_idx, holder)
+        ))
+
+    def publish(self, row_idx: int):
+        self.publish_many([row_idx])
+
+    def publish_many(self, rows):
+        values = [(self.worker, row_idx, time.time()) for row_idx in rows]
+        self._execute(lambda conn: self._in_transaction(conn, lambda conn: conn.executemany(
+            "INSERT INTO changes (worker, row_idx, at) VALUES (?, ?, ?)", values
+        )))
+
+    def latest_change(self):
+        return self._execute(lambda conn: conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0])
+
+    def changes(self, cursor):
+        rows = self._execute(lambda conn: conn.execute(
+            "SELECT seq, worker, row_idx FROM changes WHERE seq > ? ORDER BY seq", (cursor,)
+        ).fetchall())
+        if rows:
+            cursor = rows[-1][0]
+        return cursor, [row_idx for _, worker, row_idx in rows if worker != self.worker]
+
+    def prune_changes(self, keep_seconds: float):
+        def prune(conn):
+            conn.execute("DELETE FROM changes WHERE at < ?", (time.time() - keep_seconds,))
+            conn.execute("DELETE FROM leases WHERE expires_at < ?", (time.time(),))
+        self._execute(prune)
+
+    def user_states(self):
+        return UserStateTable(self.path)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Redis scripts, so each check-and-set is one atomic round trip
+RESERVE_SCRIPT = """
+local start = math.max(tonumber(redis.call('GET', KEYS[1]) or '1'), tonumber(ARGV[2]))
+redis.call('SET', KEYS[1], start + tonumber(ARGV[1]))
+return start
+"""
+LEASE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder and holder ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisCoordinator(Coordinator):
+    """Coordination through Redis (needs the ``redis`` package), for production deployments.
+
+    Leases are keys that expire with the lease, changes go to a stream capped
+    at ``max_changes`` entries, and each user's state is a key kept for the
+    conversation TTL by ``SQLitePersistence`` itself.
+    """
+
+    def __init__(self, url: str, worker: str, prefix: str = "malayalam_bot:", max_changes: int = 100000):
+        self.url = url
+        self.worker = worker
+        self.prefix = prefix
+        self.max_changes = max_changes
+        self._client = None
+        self._scripts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The Redis client, created on first use rather than at import."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    try:
+                        import redis
+                    except ImportError:
+                        raise RuntimeError(
+                            "COORDINATION_URL points at Redis but the redis package isn't installed (pip install redis)"
+                        )
+                    self._client = redis.Redis.from_url(self.url, decode_responses=True)
+        return self._client
+
+    def _script(self, source: str):
+        if source not in self._scripts:
+            self._scripts[source] = self.client.register_script(source)
+        return self._scripts[source]
+
+    def reserve(self, count: int, floor: int = 1) -> int:
+        return int(self._script(RESERVE_SCRIPT)(keys=[f"{self.prefix}dialogue_id"], args=[count, floor]))
+
+    def try_lease(self, name: str, row_idx: int, holder: str, seconds: float) -> bool:
+        return self._script(LEASE_SCRIPT)(keys=[f"{self.prefix}lease:{name}:{row_idx}"], args=[holder, int(seconds * 1000)]) == 1
+
+    def release_lease(self, name: str, row_idx: int, holder: str):
+        self._script(RELEASE_SCRIPT)(keys=[f"{self.prefix}lease:{name}:{row_idx}"], args=[holder])
+
+    def publish(self, row_idx: int):
+        self.publish_many([row_idx])
+
+    def publish_many(self, rows):
+        pipeline = self.client.pipeline(transaction=False)
+        for row_idx in rows:
+            pipeline.xadd(
+                f"{self.prefix}changes", {"worker": self.worker, "row_idx": row_idx}, maxlen=self.max_changes, approximate=True
+            )
+        pipeline.execute()
+
+    def latest_change(self):
+        latest = self.client.xrevrange(f"{self.prefix}changes", count=1)
+        return latest[0][0] if latest else "0-0"
+
+    def changes(self, cursor):
+        rows = []
+        while True:
+            streams = self.client.xread({f"{self.prefix}changes": cursor}, count=1000)
+            entries = streams[0][1] if streams else []
+            for entry_id, fields in entries:
+                cursor = entry_id
+                if fields["worker"] != self.worker:
+                    rows.append(int(fields["row_idx"]))
+            if len(entries) < 1000:
+                return cursor, rows
+
+    def user_states(self):
+        return RedisUserStates(self.client, f"{self.prefix}user_state:")
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+
+class RedisUserStates:
+    """``UserStateTable`` interface over one Redis key per user."""
+
+    def __init__(self, client, prefix: str):
+        self.client = client
+        self.prefix = prefix
+
+    def load(self, cutoff: float):
+        states = []
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*", count=1000))
+        for key, value in zip(keys, self.client.mget(keys) if keys else []):
+            if value is None:
+                continue
+            saved = json.loads(value)
+            if saved["updated_at"] < cutoff:
+                self.client.delete(key)
+            else:
+                states.append((int(key[len(self.prefix):]), saved["data"], saved["updated_at"]))
+        return states
+
+    def save(self, user_id: int, data: str, updated_at: float):
+        self.client.set(f"{self.prefix}{user_id}", json.dumps({"data": data, "updated_at": updated_at}))
+
+    def delete(self, user_id: int):
+        self.client.delete(f"{self.prefix}{user_id}")
+
+    def close(self):
+        pass
+
+
+class SharedChanges:
+    """Keeps this worker's storage listeners in step with the rows other workers write.
+
+    ``observe`` (a storage listener) collects every row this worker writes;
+    every ``interval`` seconds they are published and the rows others
+    published are read back from the shared database, on a thread so the
+    event loop never waits on it, then passed to the listeners as if written
+    here.
+    """
+
+    def __init__(self, storage, coordinator, interval: float = 0.5, keep_seconds: float = 3600):
+        self.storage = storage
+        self.coordinator = coordinator
+        self.interval = interval
+        self.keep_seconds = keep_seconds
+        self.cursor = None
+        self._unpublished = []
+        self._replaying = False
+        self._task = None
+
+    def mark(self):
+        """Remember where the feed is; call before storage loads, so nothing written meanwhile is missed."""
+        self.cursor = self.coordinator.latest_change()
+
+    def observe(self, row_idx: int, record: dict):
+        if not self._replaying:
+            self._unpublished.append(row_idx)
+
+    def _exchange(self, rows: list, prune: bool):
+        """Publish ``rows`` and read the others' changes; blocking, so run on a thread."""
+        if rows:
+            self.coordinator.publish_many(rows)
+        if prune:
+            self.coordinator.prune_changes(self.keep_seconds)
+        return self.coordinator.changes(self.cursor)
+
+    async def poll(self, prune: bool = False) -> int:
+        rows, self._unpublished = self._unpublished, []
+        try:
+            self.cursor, changed = await asyncio.to_thread(self._exchange, rows, prune)
+        except Exception:
+            # Publish them with the next poll
+            self._unpublished[:0] = rows
+            raise
+        self._replaying = True
+        try:
+            self.storage.reread(dict.fromkeys(changed))
+        finally:
+            self._replaying = False
+        return len(changed)
+
+    async def _run(self):
+        pruned_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                prune = time.monotonic() - pruned_at > 60
+                await self.poll(prune)
+                if prune:
+                    pruned_at = time.monotonic()
+            except Exception as e:
+                logging.error(f"Error exchanging changes with other workers: {e}")
+
+    def start(self):
+        """Publish this worker's writes and start reading everyone else's; call once storage has loaded."""
+        if self.cursor is None:
+            self.mark()
+        self.storage.listeners.append(self.observe)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop polling and publish the rows written since the last poll."""
+        if self._task:
+            self._task.cancel()
+        rows, self._unpublished = self._unpublished, []
+        if rows:
+            try:
+                await asyncio.to_thread(self.coordinator.publish_many, rows)
+            except Exception as e:
+                logging.error(f"Couldn't publish {len(rows)} changed rows to other workers: {e}")
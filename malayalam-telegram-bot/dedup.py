@@ -0,0 +1,164 @@
+import re
+import threading
+from collections import Counter, namedtuple
+
+Match = namedtuple("Match", "key similarity")
+
+# Punctuation, joiners and runs of whitespace don't make a sentence different
+_NOISE = re.compile(r"[\s\u200C\u200D,.!?:;'\"‘’“”\-–—()…]+")
+
+
+def canonical(text: str) -> str:
+    return _NOISE.sub(" ", text).strip()
+
+
+def shingles(text: str, n: int = 3) -> set:
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class DuplicateIndex:
+    """Exact and near-duplicate lookup for utterances, without scanning storage.
+
+    Exact duplicates are found by the hash of the canonical text (punctuation
+    and spacing removed). Near duplicates use character n-gram MinHash with
+    LSH banding: each text gets a ``bins``-slot one-permutation MinHash
+    signature, split into ``bands`` buckets; texts sharing any bucket are
+    candidates, and candidates are confirmed with the exact Jaccard
+    similarity of their n-grams, using ``text_of(key)`` to fetch the stored
+    text. Only hashes are kept in memory (texts too when ``text_of`` is
+    ``None``, as for ``scratch`` indexes).
+
+    Registered as a storage listener (``observe``), so it is built as
+    storage loads and picks up every new row and edited utterance. A
+    forgotten key is skipped by ``find`` but left in its buckets until the
+    key is added again.
+    """
+
+    def __init__(self, text_of, threshold: float = 0.8, ngram: int = 3, bins: int = 32, bands: int = 8,
+                 max_candidates: int = 50):
+        self.text_of = text_of
+        self.threshold = threshold
+        self.ngram = ngram
+        self.bins = bins
+        self.rows_per_band = bins // bands
+        self.bands = bands
+        self.max_candidates = max_candidates
+        self.exact = {}       # hash(canonical text) -> key
+        self.keys = {}        # key -> hash(canonical text)
+        self.texts = {} if text_of is None else None
+        self.buckets = {}     # hash((band, band values)) -> key or [keys]
+        self._lock = threading.Lock()
+
+    # ─── Signatures ───
+    def _signature(self, grams: set):
+        """One-permutation MinHash: one hash per n-gram, the minimum kept per bin, empty bins filled from the next."""
+        bins = self.bins
+        # Sorted descending, so the last (smallest) hash written to each bin wins; no Python-level loop
+        hashes = sorted(map(hash, grams), reverse=True)
+        minima = dict(zip(map(bins.__rmod__, hashes), hashes))
+        signature = list(map(minima.get, range(bins)))
+        if len(minima) < bins:
+            # Rotation densification: an empty bin borrows the next filled bin, offset by the distance
+            filled = signature[:]
+            for i in range(bins):
+                if filled[i] is None:
+                    distance = 1
+                    while filled[(i + distance) % bins] is None:
+                        distance += 1
+                    signature[i] = filled[(i + distance) % bins] + distance * 0x9E3779B97F4A7C15
+        return signature
+
+    def _band_keys(self, signature):
+        rows = self.rows_per_band
+        return [hash((band,) + tuple(signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+    # ─── Index ───
+    def add(self, key, text: str):
+        text = canonical(text)
+        if not text:
+            return
+        with self._lock:
+            self.keys[key] = hash(text)
+            if self.texts is not None:
+                self.texts[key] = text
+            # An exact repeat is already found through ``exact``; keep the buckets small
+            if self.exact.setdefault(hash(text), key) != key:
+                return
+        band_keys = self._band_keys(self._signature(shingles(text, self.ngram)))
+        with self._lock:
+            for band_key in band_keys:
+                bucket = self.buckets.get(band_key)
+                if bucket is None:
+                    self.buckets[band_key] = key
+                elif isinstance(bucket, list):
+                    if key not in bucket:
+                        bucket.append(key)
+                elif bucket != key:
+                    self.buckets[band_key] = [bucket, key]
+
+    def forget(self, key):
+        """Drop ``key``; another key with the same text, if any, takes over its exact match."""
+        with self._lock:
+            text_hash = self.keys.pop(key, None)
+            if self.texts is not None:
+                self.texts.pop(key, None)
+            if text_hash is None or self.exact.get(text_hash) != key:
+                return
+            del self.exact[text_hash]
+            heir = next((other for other, other_hash in self.keys.items() if other_hash == text_hash), None)
+        if heir is not None:
+            text_of = self.texts.get if self.texts is not None else self.text_of
+            self.add(heir, text_of(heir) or "")
+
+    def observe(self, row_idx: int, record: dict):
+        """Storage listener: index each dialogue, keyed by its dialogue ID, and re-index it if the utterance changes."""
+        dialogue_id, utterance = record.get("dialogue_id"), record.get("utterance")
+        if not (dialogue_id and utterance):
+            return
+        known = self.keys.get(dialogue_id)
+        if known is None:
+            self.add(dialogue_id, utterance)
+        elif known != hash(canonical(utterance)):
+            self.forget(dialogue_id)
+            self.add(dialogue_id, utterance)
+
+    def find(self, text: str):
+        """Return a ``Match`` for the closest stored duplicate of ``text`` (similarity 1.0 if exact), or ``None``."""
+        text = canonical(text)
+        if not text:
+            return None
+        key = self.exact.get(hash(text))
+        if key is not None:
+            return Match(key, 1.0)
+
+        grams = shingles(text, self.ngram)
+        band_keys = self._band_keys(self._signature(grams))
+        candidates = Counter()
+        with self._lock:
+            for band_key in band_keys:
+                bucket = self.buckets.get(band_key)
+                if bucket is not None:
+                    candidates.update(bucket if isinstance(bucket, list) else [bucket])
+        # Candidates sharing the most bands are the likeliest matches; check those first
+        text_of = self.texts.get if self.texts is not None else self.text_of
+        best = None
+        for candidate, _ in candidates.most_common(self.max_candidates):
+            if candidate not in self.keys:
+                continue
+            similarity = jaccard(grams, shingles(canonical(text_of(candidate) or ""), self.ngram))
+            if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                best = Match(candidate, similarity)
+        return best
+
+    def scratch(self):
+        """An empty index with the same settings, for spotting duplicates inside one batch."""
+        return DuplicateIndex(None, self.threshold, self.ngram, self.bins, self.bands, self.max_candidates)
+
+    def __len__(self):
+        return len(self.exact)
@@ -0,0 +1,254 @@
+"""Export approved dialogues as a dataset, streaming, and only what's new since the last run.
+
+    python export.py approved.jsonl
+    python export.py approved.csv --format csv --source sheets
+
+Rows are read a chunk at a time (``--chunk-rows``) straight from the
+storage backend: a keyset-paged query on SQLite, or row-range reads of the
+dialogue sheet through the quota-paced gateway (then of the archive
+worksheets, from the first row not read yet), so memory stays flat however
+big the sheet is. Rows with ``status == approved`` are written with the
+fixed ``FIELDS`` schema, JSONL by default.
+
+Progress is kept in ``<output>.checkpoint.json``: the first row that was
+still awaiting review (everything before it is settled, so later runs start
+there), the next row to read in each archive worksheet (archived rows never
+change and archive worksheets only grow), a bitmap of the rows already
+exported, and the output size. A
+rerun truncates the output back to that size before appending, so a run
+that died half-way neither loses nor repeats rows. Rows approved after an
+earlier run rejected them are only picked up by ``--full``, which exports
+everything again from scratch.
+"""
+import argparse
+import asyncio
+import base64
+import bisect
+import csv
+import json
+import logging
+import os
+import sqlite3
+import zlib
+from collections import defaultdict
+
+from gspread.utils import rowcol_to_a1
+
+import schema
+from archive import read_directory
+from config import STORAGE_BACKEND, SQLITE_PATH, ARCHIVE_DIRECTORY_WORKSHEET
+from row_store import row_indexes
+
+# Columns of the exported dataset, in order; user_id/username are left out on purpose
+FIELDS = ["dialogue_id", "utterance", "intent", "emotion", "topic", "timestamp", "annotator_id", "reviewer_id"]
+
+
+# ─── Sources: yield chunks of (row_idx, record) in row order, from ``start`` on ───
+def sqlite_chunks(path: str, start: int, chunk_rows: int):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        after = start - 1
+        while True:
+            rows = conn.execute(
+                f"SELECT row_idx, {', '.join(schema.COLUMNS)} FROM dialogues WHERE row_idx > ? ORDER BY row_idx LIMIT ?",
+                (after, chunk_rows),
+            ).fetchall()
+            if not rows:
+                return
+            yield [(row[0], dict(zip(schema.COLUMNS, row[1:]))) for row in rows]
+            after = rows[-1][0]
+    finally:
+        conn.close()
+
+
+async def sheet_chunks(start: int, chunk_rows: int, archives: dict):
+    """The dialogue sheet from ``start`` on, then each archive worksheet from its row in ``archives`` on.
+
+    ``archives`` (worksheet title -> next sheet row to read) is moved past
+    each chunk before it is yielded.
+    """
+    import google_sheets
+    from sheets_scheduler import BACKGROUND
+
+    run = google_sheets.gateway.run
+    directory = google_sheets.open_worksheet(ARCHIVE_DIRECTORY_WORKSHEET, schema.ARCHIVE_DIRECTORY_COLUMNS)
+    entries = await run(read_directory, directory, priority=BACKGROUND)
+    # Archived rows keep their row_idx; the sheet rows below them moved up
+    removed = sorted(row_idx for _, row_idx, _ in entries)
+    start = max(start, 2)  # row 1 is the header
+    sheet_row = start - bisect.bisect_left(removed, start)
+    row_idx = row_indexes(removed, sheet_row)
+
+    while True:
+        values = await run(google_sheets.sheet.get, row_range(sheet_row, chunk_rows), priority=BACKGROUND)
+        chunk = [(next(row_idx), dict(zip(schema.COLUMNS, row))) for row in values]
+        if chunk:
+            yield chunk
+        # The API drops trailing empty rows, so a short read is the end of the data
+        if len(values) < chunk_rows:
+            break
+        sheet_row += chunk_rows
+
+    row_of = defaultdict(dict)   # title -> dialogue_id -> row_idx
+    for dialogue_id, archived_row, title in entries:
+        if title:
+            row_of[title][dialogue_id] = archived_row
+    for title in sorted(row_of):
+        worksheet = google_sheets.open_worksheet(title, schema.COLUMNS)
+        while True:
+            sheet_row = archives.get(title, 2)
+            values = await run(worksheet.get, row_range(sheet_row, chunk_rows), priority=BACKGROUND)
+            chunk = []
+            for row in values:
+                record = dict(zip(schema.COLUMNS, row))
+                # Moved after the directory was read: the next run picks it up
+                if record.get("dialogue_id") not in row_of[title]:
+                    break
+                chunk.append((row_of[title][record["dialogue_id"]], record))
+            archives[title] = sheet_row + len(chunk)
+            if chunk:
+                yield sorted(chunk)
+            if len(chunk) < chunk_rows:
+                break
+
+
+def row_range(sheet_row: int, count: int) -> str:
+    """A1 range of ``count`` dialogue rows from ``sheet_row`` down."""
+    last_col = rowcol_to_a1(1, len(schema.COLUMNS)).rstrip("0123456789")
+    return f"A{sheet_row}:{last_col}{sheet_row + count - 1}"
+
+
+async def chunks(source: str, start: int, chunk_rows: int, archives: dict):
+    if source == "sheets":
+        async for chunk in sheet_chunks(start, chunk_rows, archives):
+            yield chunk
+    else:
+        for chunk in sqlite_chunks(SQLITE_PATH, start, chunk_rows):
+            yield chunk
+
+
+# ─── Checkpoint ───
+class RowBitmap:
+    """Set of row indexes as one bit per row, so it stays small for any sheet size."""
+
+    def __init__(self, data: bytes = b""):
+        self.bits = bytearray(data)
+
+    def __contains__(self, row_idx: int) -> bool:
+        return row_idx >> 3 < len(self.bits) and bool(self.bits[row_idx >> 3] >> (row_idx & 7) & 1)
+
+    def add(self, row_idx: int):
+        if row_idx >> 3 >= len(self.bits):
+            self.bits.extend(bytes((row_idx >> 3) - len(self.bits) + 1))
+        self.bits[row_idx >> 3] |= 1 << (row_idx & 7)
+
+    def encode(self) -> str:
+        return base64.b64encode(zlib.compress(bytes(self.bits))).decode()
+
+    @classmethod
+    def decode(cls, text: str):
+        return cls(zlib.decompress(base64.b64decode(text)) if text else b"")
+
+
+def load_checkpoint(path: str):
+    if not os.path.exists(path):
+        return {"start": 1, "archives": {}, "exported": "", "offset": 0, "rows": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    # Write-then-rename, so a crash leaves either the old or the new checkpoint
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+# ─── Export ───
+class Writer:
+    """Appends records to the output in JSONL or CSV (header only on a new file)."""
+
+    def __init__(self, path: str, fmt: str, offset: int):
+        # Anything past the checkpointed size is from a run that didn't finish
+        self.file = open(path, "a+", encoding="utf-8", newline="")
+        self.file.truncate(offset)
+        self.fmt = fmt
+        if fmt == "csv":
+            self.csv = csv.DictWriter(self.file, fieldnames=FIELDS, extrasaction="ignore")
+            if offset == 0:
+                self.csv.writeheader()
+
+    def write(self, record: dict):
+        row = {field: record.get(field) or "" for field in FIELDS}
+        if self.fmt == "csv":
+            self.csv.writerow(row)
+        else:
+            self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def commit(self) -> int:
+        """Make everything written so far durable and return the output size."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+async def export(output: str, fmt: str, source: str, chunk_rows: int, full: bool = False):
+    checkpoint_path = output + ".checkpoint.json"
+    checkpoint = load_checkpoint(checkpoint_path)
+    if full:
+        checkpoint = {"start": 1, "archives": {}, "exported": "", "offset": 0, "rows": 0}
+    exported = RowBitmap.decode(checkpoint["exported"])
+    archives = dict(checkpoint.get("archives", {}))
+    total = checkpoint["rows"]
+    writer = Writer(output, fmt, checkpoint["offset"])
+    # Low-water mark: the first row not yet reviewed; nothing before it can still become approved
+    pending = None
+    through = checkpoint["start"] - 1
+    new_rows = 0
+    try:
+        async for chunk in chunks(source, checkpoint["start"], chunk_rows, archives):
+            for row_idx, record in chunk:
+                status = (record.get("status") or "").strip().lower()
+                if status == "approved" and row_idx not in exported:
+                    writer.write(record)
+                    exported.add(row_idx)
+                    new_rows += 1
+                elif not status and record.get("dialogue_id") and pending is None:
+                    pending = row_idx
+            through = max(through, chunk[-1][0])
+            checkpoint = {
+                "start": pending if pending is not None else through + 1,
+                "archives": archives,
+                "exported": exported.encode(),
+                "offset": writer.commit(),
+                "rows": total + new_rows,
+            }
+            save_checkpoint(checkpoint_path, checkpoint)
+            logging.info(f"Exported through row {chunk[-1][0]}: {new_rows} new approved dialogues")
+    finally:
+        writer.close()
+    logging.info(f"Done: {new_rows} new approved dialogues written to {output} ({total + new_rows} in total)")
+    return new_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="file to append approved dialogues to")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--source", choices=["sqlite", "sheets"], default=STORAGE_BACKEND)
+    parser.add_argument("--chunk-rows", type=int, default=5000, help="rows read per query / Sheets request")
+    parser.add_argument("--full", action="store_true", help="ignore the checkpoint and export everything again")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+    asyncio.run(export(args.output, args.format, args.source, args.chunk_rows, full=args.full))
+    if args.source == "sheets":
+        import google_sheets
+        google_sheets.gateway.shutdown()
+
+
+if __name__ == "__main__":
+    main()
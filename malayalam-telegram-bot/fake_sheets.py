@@ -0,0 +1,269 @@
+import asyncio
+import json
+import math
+import re
+import sys
+import threading
+import time
+import types
+from collections import Counter
+
+import requests
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_to_rowcol
+
+
+_real_sleep = asyncio.sleep
+
+
+class FakeClock:
+    """Stands in for ``time.monotonic`` and ``asyncio.sleep``; sleeping moves the clock on at once.
+
+    Every requested sleep is recorded in ``sleeps``.
+    """
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float, result=None):
+        self.sleeps.append(seconds)
+        if seconds > 0:
+            # A real clock always moves on, even for a sleep shorter than a float step at ``now``
+            self.now = max(self.now + seconds, math.nextafter(self.now, math.inf))
+        await _real_sleep(0)
+        return result
+
+
+def api_error(status: int, retry_after=None) -> APIError:
+    """The ``APIError`` gspread raises for an HTTP ``status`` response."""
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps({"error": {"code": status, "message": "fake", "status": "FAKE"}}).encode()
+    if retry_after is not None:
+        response.headers["Retry-After"] = str(retry_after)
+    return APIError(response)
+
+
+class FakeCell:
+    def __init__(self, row: int, col: int, value: str):
+        self.row, self.col, self.value = row, col, value
+
+
+class FakeWorksheet:
+    """List-of-lists worksheet implementing the gspread ``Worksheet`` calls used here.
+
+    Every call sleeps ``latency`` seconds, plus ``per_row_latency`` for each
+    row it returns, and is counted in ``calls``.
+    """
+
+    def __init__(self, title: str = "Sheet1", values=None, latency: float = 0, per_row_latency: float = 0):
+        self.title = title
+        self.values = [list(map(str, row)) for row in (values or [])]
+        self.latency = latency
+        self.per_row_latency = per_row_latency
+        self.row_count = max(1000, len(self.values))
+        self.col_count = 26
+        self.calls = Counter()
+        self.rows_read = 0
+        self.id = 0
+        self.spreadsheet = None
+        self._lock = threading.Lock()
+
+    # ─── Bookkeeping ───
+    def _call(self, name: str, rows_returned: int = 0):
+        self.calls[name] += 1
+        self.rows_read += rows_returned
+        delay = self.latency + rows_returned * self.per_row_latency
+        if delay:
+            time.sleep(delay)
+
+    def _set(self, row: int, col: int, value):
+        while len(self.values) < row:
+            self.values.append([])
+        cells = self.values[row - 1]
+        while len(cells) < col:
+            cells.append("")
+        cells[col - 1] = "" if value is None else str(value)
+        self.row_count = max(self.row_count, len(self.values))
+
+    def _width(self):
+        return max((len(row) for row in self.values), default=0)
+
+    # ─── Reads ───
+    def get_all_values(self, **kwargs):
+        with self._lock:
+            width = self._width()
+            values = [row + [""] * (width - len(row)) for row in self.values]
+        self._call("get_all_values", len(values))
+        return values
+
+    def get_all_records(self, **kwargs):
+        values = self.get_all_values()
+        self.calls["get_all_values"] -= 1
+        self.calls["get_all_records"] += 1
+        header = values[0] if values else []
+        return [dict(zip(header, row)) for row in values[1:]]
+
+    def get(self, range_name: str, **kwargs):
+        match = re.fullmatch(r"([A-Z]+)(\d+)(?::([A-Z]+)(\d*))?", range_name.split("!")[-1])
+        first_row, first_col = a1_to_rowcol(f"{match.group(1)}{match.group(2)}")
+        last_col = a1_to_rowcol(f"{match.group(3)}1")[1] if match.group(3) else first_col
+        last_row = int(match.group(4)) if match.group(4) else len(self.values)
+        with self._lock:
+            rows = [row[first_col - 1:last_col] for row in self.values[first_row - 1:last_row]]
+        self._call("get", len(rows))
+        return rows
+
+    def row_values(self, row: int, **kwargs):
+        with self._lock:
+            values = list(self.values[row - 1]) if row <= len(self.values) else []
+        self._call("row_values", 1)
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def col_values(self, col: int, **kwargs):
+        with self._lock:
+            values = [row[col - 1] if len(row) >= col else "" for row in self.values]
+        self._call("col_values", len(values))
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def cell(self, row: int, col: int, **kwargs):
+        with self._lock:
+            cells = self.values[row - 1] if row <= len(self.values) else []
+            value = cells[col - 1] if len(cells) >= col else ""
+        self._call("cell", 1)
+        return FakeCell(row, col, value)
+
+    # ─── Writes ───
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        with self._lock:
+            start = len(self.values) + 1
+            self.values.extend([list(map(str, row)) for row in values])
+            self.row_count = max(self.row_count, len(self.values))
+            end = len(self.values)
+        self._call("append_rows" if len(values) != 1 else "append_row")
+        return {"updates": {"updatedRange": f"{self.title}!A{start}:Z{end}"}}
+
+    def update_cell(self, row: int, col: int, value):
+        with self._lock:
+            self._set(row, col, value)
+        self._call("update_cell")
+
+    def update(self, range_name: str, values=None, **kwargs):
+        with self._lock:
+            self._write_range(range_name, values)
+        self._call("update")
+
+    def batch_update(self, data, **kwargs):
+        with self._lock:
+            for item in data:
+                self._write_range(item["range"], item["values"])
+        self._call("batch_update")
+
+    def _write_range(self, range_name: str, values):
+        first_row, first_col = a1_to_rowcol(range_name.split("!")[-1].split(":")[0])
+        for r, row in enumerate(values):
+            for c, value in enumerate(row):
+                self._set(first_row + r, first_col + c, value)
+
+    def _append_values(self, rows):
+        with self._lock:
+            self.values.extend(rows)
+            self.row_count = max(self.row_count, len(self.values))
+
+    def _delete_rows(self, start: int, end: int):
+        with self._lock:
+            del self.values[start:end]
+            self.row_count -= end - start
+
+    def add_rows(self, rows: int):
+        self.row_count += rows
+        self._call("add_rows")
+
+    def add_cols(self, cols: int):
+        self.col_count += cols
+        self._call("add_cols")
+
+
+class FakeSpreadsheet:
+    def __init__(self, sheet1: FakeWorksheet):
+        self.sheet1 = sheet1
+        self.worksheets = {sheet1.title: sheet1}
+        sheet1.spreadsheet = self
+        self.calls = Counter()
+
+    def worksheet(self, title: str):
+        if title not in self.worksheets:
+            raise WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26, **kwargs):
+        worksheet = FakeWorksheet(title, latency=self.sheet1.latency)
+        worksheet.id = len(self.worksheets)
+        worksheet.spreadsheet = self
+        self.worksheets[title] = worksheet
+        return worksheet
+
+    def batch_update(self, body):
+        """The ``appendCells`` and ``deleteDimension`` (rows) requests of ``spreadsheets.batchUpdate``."""
+        by_id = {worksheet.id: worksheet for worksheet in self.worksheets.values()}
+        for request in body["requests"]:
+            if "appendCells" in request:
+                append = request["appendCells"]
+                by_id[append["sheetId"]]._append_values([
+                    [cell["userEnteredValue"]["stringValue"] for cell in row["values"]] for row in append["rows"]
+                ])
+            else:
+                span = request["deleteDimension"]["range"]
+                by_id[span["sheetId"]]._delete_rows(span["startIndex"], span["endIndex"])
+        self.calls["batch_update"] += 1
+        if self.sheet1.latency:
+            time.sleep(self.sheet1.latency)
+        return {"replies": [{} for _ in body["requests"]]}
+
+    def total_calls(self) -> Counter:
+        total = Counter(self.calls)
+        for worksheet in self.worksheets.values():
+            total.update(worksheet.calls)
+        return total
+
+
+def install(spreadsheet: FakeSpreadsheet, **gateway_options):
+    """Register a ``google_sheets`` module backed by ``spreadsheet``.
+
+    Must run before ``backend`` (or anything importing ``google_sheets``) is
+    imported; the real module would otherwise authenticate with Google.
+    """
+    from sheets_gateway import SheetsGateway
+
+    module = types.ModuleType("google_sheets")
+    module.spreadsheet = spreadsheet
+    module.sheet = spreadsheet.sheet1
+
+    def open_worksheet(title: str, header: list):
+        try:
+            return spreadsheet.worksheet(title)
+        except WorksheetNotFound:
+            worksheet = spreadsheet.add_worksheet(title=title)
+            worksheet.append_row(header)
+            return worksheet
+
+    async def warm_up():
+        pass
+
+    module.open_worksheet = open_worksheet
+    module.warm_up = warm_up
+    module.ready = lambda: True
+    module.gateway = SheetsGateway(spreadsheet.sheet1, **gateway_options)
+    sys.modules["google_sheets"] = module
+    return module
@@ -0,0 +1,95 @@
+import itertools
+
+
+class FakeUser:
+    def __init__(self, user_id: int, username: str = None):
+        self.id = user_id
+        self.username = username if username is not None else f"user{user_id}"
+        self.is_bot = False
+
+
+class FakeChat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+        self.type = "private"
+
+
+class FakeMessage:
+    """Message with the ``reply_text`` the handlers call; replies are kept in ``replies``."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, user: FakeUser, text: str = "", reply_to_message=None, document=None):
+        self.message_id = next(self._ids)
+        self.from_user = user
+        self.chat = FakeChat(user.id)
+        self.chat_id = user.id
+        self.text = text
+        self.reply_to_message = reply_to_message
+        self.document = document
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+        return FakeMessage(self.from_user, text)
+
+
+class FakeCallbackQuery:
+    def __init__(self, user: FakeUser, data: str, message: FakeMessage = None):
+        self.from_user = user
+        self.data = data
+        self.message = message or FakeMessage(user)
+        self.edits = []
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+        return self.message
+
+
+class FakeUpdate:
+    """Either a text message or a callback query from ``user``, like ``telegram.Update``."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, user: FakeUser, message: FakeMessage = None, callback_query: FakeCallbackQuery = None):
+        self.update_id = next(self._ids)
+        self.effective_user = user
+        self.effective_chat = FakeChat(user.id)
+        self.message = message
+        self.callback_query = callback_query
+        self.effective_message = message or (callback_query.message if callback_query else None)
+
+    @classmethod
+    def text(cls, user: FakeUser, text: str, **kwargs):
+        return cls(user, message=FakeMessage(user, text, **kwargs))
+
+    @classmethod
+    def callback(cls, user: FakeUser, data: str):
+        return cls(user, callback_query=FakeCallbackQuery(user, data))
+
+    def outputs(self):
+        """Everything the bot said in response to this update."""
+        return (self.message.replies if self.message else []) + (self.callback_query.edits if self.callback_query else [])
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+class FakeContext:
+    """Per-user ``ContextTypes.DEFAULT_TYPE`` stand-in; share ``bot`` and ``bot_data`` across users."""
+
+    def __init__(self, bot: FakeBot = None, bot_data: dict = None, args=None):
+        self.bot = bot or FakeBot()
+        self.bot_data = bot_data if bot_data is not None else {}
+        self.user_data = {}
+        self.chat_data = {}
+        self.args = args or []
+        self.application = None
@@ -1,17 +1,121 @@
+import json
+import logging
+import os
+import threading
+import time
+
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
-from gspread.exceptions import APIError
-import logging
+from gspread.exceptions import APIError, WorksheetNotFound
 
-from config import SHEET_ID
+from config import (
+    SHEET_ID,
+    GOOGLE_CREDENTIALS_JSON,
+    SHEETS_MAX_WORKERS,
+    SHEETS_TIMEOUT_SECONDS,
+    SHEETS_REQUESTS_PER_MINUTE,
+    SHEETS_BURST,
+    SHEETS_MAX_RETRIES,
+)
+from sheets_gateway import SheetsGateway
+import metrics
 
-# Setup Google Sheets
+# Nothing here touches the network on import: the client is authorized and the
+# spreadsheet opened by connect(), on first use or from warm_up() in post_init.
 scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", scope)
-client = gspread.authorize(creds)
-
-try:
-    sheet = client.open_by_key(SHEET_ID).sheet1
-except Exception as e:
-    logging.error(f"Error opening Google Sheet: {e}")
-    raise e
+client = None
+spreadsheet = None
+_lock = threading.RLock()
+_worksheets = []
+
+
+def _credentials():
+    # Read from the environment in memory; credentials.json is only a fallback for local runs
+    if GOOGLE_CREDENTIALS_JSON:
+        return ServiceAccountCredentials.from_json_keyfile_dict(json.loads(GOOGLE_CREDENTIALS_JSON), scope)
+    if os.path.exists("credentials.json"):
+        return ServiceAccountCredentials.from_json_keyfile_name("credentials.json", scope)
+    raise ValueError("Set GOOGLE_CREDENTIALS_JSON to the service account key to use Google Sheets.")
+
+
+def connect():
+    """Authorize and open the spreadsheet once; blocking, so run it on the gateway's pool."""
+    global client, spreadsheet
+    with _lock:
+        if spreadsheet is None:
+            started = time.perf_counter()
+            client = gspread.authorize(_credentials())
+            metrics.track_session(client.http_client.session)
+            try:
+                spreadsheet = client.open_by_key(SHEET_ID)
+            except Exception as e:
+                logging.error(f"Error opening Google Sheet: {e}")
+                raise e
+            logging.info(f"Opened Google Sheet in {time.perf_counter() - started:.2f}s")
+    return spreadsheet
+
+
+class LazyWorksheet:
+    """Stands in for a gspread worksheet and opens it on first attribute access.
+
+    ``title=None`` is the first sheet; any other title is created with
+    ``header`` if it doesn't exist yet.
+    """
+
+    def __init__(self, title: str = None, header: list = None):
+        self._title = title
+        self._header = header
+        self._worksheet = None
+        _worksheets.append(self)
+
+    def resolve(self):
+        if self._worksheet is None:
+            with _lock:
+                if self._worksheet is None:
+                    self._worksheet = self._open(connect())
+        return self._worksheet
+
+    def _open(self, spreadsheet):
+        if self._title is None:
+            return spreadsheet.sheet1
+        try:
+            return spreadsheet.worksheet(self._title)
+        except WorksheetNotFound:
+            worksheet = spreadsheet.add_worksheet(title=self._title, rows=1000, cols=len(self._header))
+            worksheet.append_row(self._header)
+            return worksheet
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+
+def open_worksheet(title: str, header: list):
+    """Worksheet by title, created with ``header`` on first use if it doesn't exist yet."""
+    return LazyWorksheet(title, header)
+
+
+def _open_all():
+    for worksheet in _worksheets:
+        worksheet.resolve()
+
+
+async def warm_up():
+    """Connect and open every worksheet handed out so far, off the event loop."""
+    await gateway.run(_open_all)
+
+
+def ready() -> bool:
+    return spreadsheet is not None and all(worksheet._worksheet is not None for worksheet in _worksheets)
+
+
+sheet = LazyWorksheet()
+
+# Async, quota-paced access to the sheet; all gspread calls go through this
+gateway = SheetsGateway(
+    sheet,
+    max_workers=SHEETS_MAX_WORKERS,
+    timeout=SHEETS_TIMEOUT_SECONDS,
+    rate_per_minute=SHEETS_REQUESTS_PER_MINUTE,
+    burst=SHEETS_BURST,
+    max_retries=SHEETS_MAX_RETRIES,
+)
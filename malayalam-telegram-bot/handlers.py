@@ -3,12 +3,51 @@ import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup,ForceReply
 from telegram.ext import ContextTypes
 
-from config import ANNOTATORS, REVIEWERS
-from google_sheets import sheet
-from utils import is_malayalam, generate_short_id
+from config import (
+    ANNOTATORS, REVIEWERS, ADMINS, BULK_MAX_LINES, BULK_MAX_FILE_BYTES, DUPLICATE_ACTION, REVIEW_BATCH_SIZE,
+)
+from backend import (
+    storage, id_allocator, annotation_queue, review_queue, consents, contributor_stats, duplicate_index, label_suggester,
+)
+from utils import validator
+from callback_data import pack, unpack, resolve
+import bulk as bulk_input
+import metrics
+import schema
 from gspread.exceptions import APIError
 
 
+async def load_consents():
+    """Load the consent registry once, migrating consent kept in dialogue rows."""
+    if not consents.loaded:
+        await consents.load()
+
+def resume_flows(user_data):
+    """After a restart, re-lease the dialogues users were annotating or reviewing."""
+    for user_id, data in user_data.items():
+        for key, queue in (("current_annotation", annotation_queue), ("pending_review", review_queue)):
+            info = data.get(key)
+            if info and not queue.claim(user_id, info["row_idx"]):
+                data.pop(key, None)
+        batch = data.get("review_batch")
+        if batch:
+            review_queue.renew(user_id, batch_rows(batch))
+
+STALE_BUTTONS = "⚠️ This dialogue changed since these buttons were sent, so nothing was saved. Please start again."
+
+def target_row(ref, info):
+    """``(row_idx, record)`` a button acts on, or ``None`` if that row no longer holds what the button was sent for.
+
+    Buttons carrying a ``RowRef`` are checked against it; older buttons fall
+    back to the flow state in ``user_data``, checked by dialogue ID.
+    """
+    if ref:
+        return resolve(storage, ref)
+    if info:
+        record = storage.get(info["row_idx"])
+        if record and record.get("dialogue_id") == info["dialogue_id"]:
+            return info["row_idx"], record
+    return None
 
 def ask_for_consent(update, context):
     keyboard = [
@@ -26,16 +65,9 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(query.from_user.id)
 
     if query.data == 'consent_yes':
-        # ─── Persist the consent in your sheet ───
-        records = sheet.get_all_records()
-        for idx, row in enumerate(records, start=2):
-            if str(row.get("user_id")) == user_id:
-                # update the existing row’s “consent” column (col 12)
-                sheet.update_cell(idx, 12, "yes")
-                break
-        else:
-            # new user: append with consent=yes in the 12th column
-            sheet.append_row([user_id, "", "", "", "", "", "", "", "", "", "", "yes"])
+        # ─── Persist the consent in the consent registry ───
+        await load_consents()
+        await consents.grant(user_id)
 
         # ─── Confirmation and immediate welcome ───
         await query.edit_message_text("✅ Thank you for your consent!")
@@ -48,12 +80,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     user_id = str(update.effective_user.id)
 
-    # 1️⃣ Check consent in your sheet…
-    records = sheet.get_all_records()
-    consented = any(
-        str(r.get("user_id")) == user_id and r.get("consent","").lower() == "yes"
-        for r in records
-    )
+    # 1️⃣ Check consent in the registry…
+    await load_consents()
+    consented = consents.has_consented(user_id)
 
     # 2️⃣ If not consented, prompt and exit
     if not consented:
@@ -79,6 +108,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "💡 <b>How it works:</b>\n"
         "1️⃣ <b>Submit Dialogues</b>\n"
         "Use the /submit command to contribute Malayalam sentences or dialogues. Make sure you type only in Malayalam script.\n"
+        "Have a list ready? Use /bulk to send many lines or a .txt/.csv file at once.\n"
         "<i>Example:</i>\n"
         "• \"സുപ്രഭാതം! നിങ്ങൾക്ക് എങ്ങനെ സഹായിക്കാം?\"\n"
         "• \"എനിക്ക് കേബിള്‍ കണക്ഷന്‍റെ വിശദാംശങ്ങള്‍ വേണം.\"\n\n"
@@ -91,7 +121,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "<i>Example:</i>\n"
         "• /review 101 status=approved comment=accurate_annotation\n\n"
         "🔎 <b>Track your progress:</b>\n"
-        "Use /stats to see your total submissions.\n\n"
+        "Use /stats to see your total submissions and /leaderboard to see the top contributors.\n\n"
         "🤝 <b>Thank you for your contribution to this important research!</b>\n\n"
         "<b>Sincerely,</b>\n<b>Zulkifil Dawood</b>"
     )
@@ -112,26 +142,111 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def submit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["expecting_submission"] = True
+    context.user_data.pop("expecting_bulk", None)
     await update.message.reply_text("📝 Please send your Malayalam sentence or dialogue now:")
 
+async def bulk(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data["expecting_bulk"] = True
+    context.user_data["expecting_submission"] = False
+    await update.message.reply_text(
+        "📚 Send several Malayalam sentences, one per line, in a single message — "
+        f"or upload a .txt or .csv file (up to {BULK_MAX_LINES} lines)."
+    )
+
+async def save_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE, entries):
+    """Validate parsed ``(line_no, text)`` entries and save the Malayalam ones in one write."""
+    accepted, rejected, truncated = bulk_input.split_valid(entries, BULK_MAX_LINES)
+    context.user_data["expecting_bulk"] = False
+    duplicates = bulk_input.find_duplicates(accepted, duplicate_index) if DUPLICATE_ACTION != "off" else {}
+    if DUPLICATE_ACTION == "reject" and duplicates:
+        accepted = [(line_no, text) for line_no, text in accepted if line_no not in duplicates]
+        rejected = sorted(rejected + list(duplicates.items()))
+        duplicates = {}
+    if not accepted:
+        if rejected and all(reason.startswith(("duplicate", "repeats")) for _, reason in rejected):
+            return await update.message.reply_text("♻️ Every line has already been submitted. Nothing was saved.")
+        return await update.message.reply_text("⚠️ No lines in Malayalam script found. Nothing was saved.")
+
+    user_id   = str(update.effective_user.id)
+    username  = update.effective_user.username or ""
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        await storage.sync()
+        if not id_allocator.seeded:
+            id_allocator.seed(storage.dialogue_ids())
+        # One block of IDs and one append for the whole batch
+        dialogue_ids = id_allocator.next_ids(len(accepted))
+        storage.add_dialogues([
+            {"user_id": user_id, "username": username, "utterance": text, "timestamp": timestamp, "dialogue_id": d_id}
+            for d_id, (_, text) in zip(dialogue_ids, accepted)
+        ])
+    except Exception as e:
+        logging.error(f"Error saving bulk submission: {e}")
+        return await update.message.reply_text("⚠️ Couldn’t save right now. Please try again.")
+
+    plural = lambda n, word: f"{n} {word}{'' if n == 1 else 's'}"
+    text = f"✅ Saved {plural(len(accepted), 'dialogue')} (IDs {dialogue_ids[0]}–{dialogue_ids[-1]})."
+    if rejected:
+        text += f"\n⚠️ Skipped {plural(len(rejected), 'line')}:"
+        text += "".join(f"\n• line {line_no}: {reason}" for line_no, reason in rejected[:10])
+        if len(rejected) > 10:
+            text += f"\n• … and {len(rejected) - 10} more"
+    if duplicates:
+        text += f"\n♻️ {plural(len(duplicates), 'line')} look already submitted:"
+        text += "".join(f"\n• line {line_no}: {reason}" for line_no, reason in list(duplicates.items())[:10])
+    if truncated:
+        text += f"\n✂️ Stopped after {BULK_MAX_LINES} lines; send the rest separately."
+    await update.message.reply_text(text)
+
+async def handle_bulk_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    document = update.message.document
+    if document.file_size and document.file_size > BULK_MAX_FILE_BYTES:
+        return await update.message.reply_text(
+            f"⚠️ That file is too large; please keep it under {BULK_MAX_FILE_BYTES // 1000} KB."
+        )
+    try:
+        data = await (await document.get_file()).download_as_bytearray()
+    except Exception as e:
+        logging.error(f"Error downloading bulk file: {e}")
+        return await update.message.reply_text("⚠️ Couldn’t download that file. Please try again.")
+
+    stream = bulk_input.open_document(bytes(data))
+    is_csv = (document.file_name or "").lower().endswith(".csv")
+    entries = bulk_input.parse_csv(stream) if is_csv else bulk_input.parse_text(stream)
+    await save_bulk(update, context, entries)
+
+def describe_suggestions(text: str):
+    """Suggested labels for ``text`` as ``({field: label}, HTML lines)``, with the model's confidence."""
+    suggestions = label_suggester.suggest(text)
+    labels = label_suggester.labels_for(text)
+    lines = "".join(
+        f"• <b>{field.title()}</b>: {label}"
+        + (f" ({suggestions[field][1]:.0%})" if field in suggestions else "") + "\n"
+        for field, label in labels.items()
+    )
+    return labels, lines
+
 async def send_annotation_options(update: Update, context: ContextTypes.DEFAULT_TYPE, dialogue_id: str):
     # Provide suggested annotations in a more descriptive format
+    found = storage.find_dialogue(dialogue_id)
+    if not found:
+        return await update.message.reply_text("❌ Couldn’t find that dialogue.")
+    row_idx, record = found
+    _, lines = describe_suggestions(record.get("utterance", ""))
     message_text = (
         f"📝 <b>Suggested Annotations for Dialogue ID {dialogue_id}:</b>\n"
-        f"• <b>Intent</b>: request_info\n"
-        f"• <b>Emotion</b>: neutral\n"
-        f"• <b>Topic</b>: General\n\n"
+        f"{lines}\n"
         "👉 Would you like to accept these suggestions or edit them?"
     )
 
     # Provide more user-friendly buttons
     keyboard = [
         [
-            InlineKeyboardButton("✅ Accept All", callback_data=f"accept_{dialogue_id}"),
-            InlineKeyboardButton("✏️ Edit Individually", callback_data=f"edit_{dialogue_id}")
+            InlineKeyboardButton("✅ Accept All", callback_data=pack("accept", row_idx, record)),
+            InlineKeyboardButton("✏️ Edit Individually", callback_data=pack("edit_intent", row_idx, record))
         ],
         [
-            InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_{dialogue_id}")
+            InlineKeyboardButton("❌ Cancel", callback_data=pack("cancel", row_idx, record))
         ]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -143,41 +258,65 @@ async def send_annotation_options(update: Update, context: ContextTypes.DEFAULT_
     )
 #
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # This handler is registered first, so it passes on replies to a rejection awaiting its comment
+    pending = context.user_data.get("pending_review")
+    if pending and pending.get("version") and update.message.reply_to_message:
+        return await handle_review_comment(update, context)
+
+    if context.user_data.get("expecting_bulk"):
+        return await save_bulk(update, context, bulk_input.parse_text(update.message.text.splitlines()))
+
     if not context.user_data.get("expecting_submission"):
         return await update.message.reply_text(
             "Hey you cant do that! 😅 Here’s what you can do:\n\n"
             "✅ /start – Project info\n"
             "✅ /submit – Send a Malayalam sentence/dialogue\n"
+            "✅ /bulk – Send many sentences at once (lines or a .txt/.csv file)\n"
             "✅ /stats – Your submission count\n"
+            "✅ /leaderboard – Top contributors\n"
             "✅ /annotate – Label pending dialogues (annotators only)\n"
-            "✅ /review – Review annotations (reviewers only)\n\n"
+            "✅ /review – Review annotations (reviewers only; /review batch for a page at a time)\n\n"
             "To begin, type /submit"
         )
 
-    text = update.message.text.strip()
-    if not is_malayalam(text):
-        return await update.message.reply_text("⚠️ Please type only in Malayalam script.")
+    text, reason = validator.check(update.message.text.strip())
+    if reason:
+        return await update.message.reply_text(f"⚠️ Please type only in Malayalam script ({reason}).")
+
+    # In-memory duplicate lookup; no sheet reads
+    duplicate = duplicate_index.find(text) if DUPLICATE_ACTION != "off" else None
+    if duplicate and DUPLICATE_ACTION == "reject":
+        return await update.message.reply_text(
+            f"♻️ This has already been submitted (dialogue {duplicate.key}, {duplicate.similarity:.0%} similar). "
+            "Please send a different sentence."
+        )
 
     # prepare your five columns in one shot
     user_id     = str(update.effective_user.id)
     username    = update.effective_user.username or ""
     timestamp   = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    dialogue_id = generate_short_id(sheet)
 
     try:
-        # Append: user_id | username | text | timestamp | dialogue_id
-        sheet.append_row([
-            user_id,
-            username,
-            text,
-            timestamp,
-            dialogue_id
-        ])
+        await storage.sync()
+        if not id_allocator.seeded:
+            id_allocator.seed(storage.dialogue_ids())
+        # No awaits between allocating the ID and queueing the row
+        dialogue_id = id_allocator.next_id()
+
+        # Append: user_id | username | utterance | timestamp | dialogue_id
+        storage.add_dialogue({
+            "user_id":     user_id,
+            "username":    username,
+            "utterance":   text,
+            "timestamp":   timestamp,
+            "dialogue_id": dialogue_id,
+        })
 
         context.user_data["expecting_submission"] = False
+        note = f"\n♻️ It looks similar to dialogue {duplicate.key}." if duplicate else ""
         await update.message.reply_text(
             f"✅ Saved! Your dialogue ID is <b>{dialogue_id}</b>.\n"
-            "You can annotate it  later.",
+            "You can annotate it  later." + note,
             parse_mode="HTML"
         )
         #await send_annotation_options(update, context, dialogue_id)
@@ -194,27 +333,40 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    data = query.data
+    # New buttons carry their row (see callback_data); older ones end in _<dialogue_id>
+    data, ref = unpack(query.data)
 
     # ───── Accept suggestions ─────
-    if data.startswith("accept_"):
-        dialogue_id = data.split("_", 1)[1]
-
-        # persist defaults
-        records = sheet.get_all_records()
-        for idx, row in enumerate(records, start=2):
-            if str(row.get("dialogue_id")) == dialogue_id:
-                sheet.update_cell(idx, 6, "request_info")  # intent
-                sheet.update_cell(idx, 7, "neutral")       # emotion
-                sheet.update_cell(idx, 8, "General")      # topic
-                break
+    if data == "accept" or data.startswith("accept_"):
+        if ref:
+            found = resolve(storage, ref)
+        else:
+            await storage.sync()
+            found = storage.find_dialogue(data.split("_", 1)[1])
+        if not found:
+            return await query.edit_message_text(STALE_BUTTONS + " Use /annotate.")
+        row_idx, record = found
+        dialogue_id = record["dialogue_id"]
+        # The labels the annotator was shown, or the model's current guess
+        info = context.user_data.get("current_annotation") or {}
+        if info.get("dialogue_id") == dialogue_id and info.get("suggested"):
+            labels = info["suggested"]
+        else:
+            labels = label_suggester.labels_for(record.get("utterance", ""))
+
+        # intent, emotion, topic in one write, unless the row changed under us
+        if not storage.update_if(row_idx, schema.version(record), **labels, annotator_id=update.effective_user.id):
+            return await query.edit_message_text(STALE_BUTTONS + " Use /annotate.")
+        annotation_queue.complete(row_idx)
+        if info.get("dialogue_id") == dialogue_id:
+            context.user_data.pop("current_annotation", None)
 
         # confirm & show next-steps buttons
         await query.edit_message_text(
             f"✅ <b>Annotations saved for Dialogue {dialogue_id}:</b>\n"
-            f"• Intent: <code>request_info</code>\n"
-            f"• Emotion: <code>neutral</code>\n"
-            f"• Topic: <code>internet</code>\n\n"
+            f"• Intent: <code>{labels['intent']}</code>\n"
+            f"• Emotion: <code>{labels['emotion']}</code>\n"
+            f"• Topic: <code>{labels['topic']}</code>\n\n"
             "What would you like to do next?",
             parse_mode="HTML",
             reply_markup=InlineKeyboardMarkup([
@@ -228,33 +380,33 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # ───── Edit suggestions ─────
     elif data.startswith("edit_"):
         parts = data.split("_", 2)
-        if len(parts) < 3:
+        if len(parts) < (2 if ref else 3):
             await query.edit_message_text("⚠️ Invalid edit format. Please try again.")
             return
     
-        field, dialogue_id = parts[1], parts[2]
+        field = parts[1]
+        found = resolve(storage, ref) if ref else storage.find_dialogue(parts[2])
+        if not found:
+            return await query.edit_message_text(STALE_BUTTONS)
+        row_idx, record = found
+        dialogue_id = record["dialogue_id"]
 
     
         # Title correctly shows only the ID
         text = f"✏️ <b>Edit {field.title()}</b> for Dialogue {dialogue_id}\n\nSelect a new {field}:"
     
         # Build buttons specific to the field
-        if field == "intent":
-            options = ["request_info","question","greeting","complaint","feedback"]
-        elif field == "emotion":
-            options = ["neutral","happy","sad","angry","confused"]
-        else:  # topic
-            options = ["internet","customer_support","billing","technical","general"]
+        options = schema.ANNOTATION_OPTIONS.get(field, schema.ANNOTATION_OPTIONS["topic"])
     
         keyboard = [
             [
                 InlineKeyboardButton(opt.replace("_"," ").title(),
-                                     callback_data=f"set_{field}_{dialogue_id}_{opt}")
+                                     callback_data=pack(f"set_{field}_{opt}", row_idx, record))
             ]
             for opt in options
         ]
         # Add a Cancel / Back button
-        keyboard.append([InlineKeyboardButton("❌ Cancel", callback_data=f"cancel_{dialogue_id}")])
+        keyboard.append([InlineKeyboardButton("❌ Cancel", callback_data=pack("cancel", row_idx, record))])
     
         await query.edit_message_text(
             text,
@@ -263,8 +415,13 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
     # ───── Cancel flow ─────
-    elif data.startswith("cancel_"):
-        dialogue_id = data.split("_", 1)[1]
+    elif data == "cancel" or data.startswith("cancel_"):
+        dialogue_id = ref.dialogue_id if ref else data.split("_", 1)[1]
+        # Drop the unsaved draft and hand the dialogue back to the queue
+        info = context.user_data.get("current_annotation")
+        if info and info.get("dialogue_id") == dialogue_id:
+            context.user_data.pop("current_annotation")
+            annotation_queue.release(update.effective_user.id)
         try:
             await query.edit_message_text(
                 f"❌ Annotation flow canceled for Dialogue {dialogue_id}.\n"
@@ -290,71 +447,119 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     try:
-        records = sheet.get_all_records()
-        count = sum(1 for row in records if str(row.get("user_id", "")) == user_id)
-        await update.message.reply_text(f"📊 You’ve submitted {count} entries. Keep going!")
+        counts = contributor_stats.for_user(user_id)
+        text = f"📊 You’ve submitted {counts['submissions']} entries. Keep going!"
+        if counts["annotations"]:
+            text += f"\n✏️ Annotated: {counts['annotations']}"
+        if counts["approved"] or counts["rejected"]:
+            text += f"\n🕵️ Reviewed: {counts['approved']} approved, {counts['rejected']} rejected"
+        await update.message.reply_text(text)
     except Exception as e:
         logging.error(f"Error getting stats: {e}")
         await update.message.reply_text("⚠️ Couldn’t retrieve your stats. Please try again later.")
 
+async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    top = contributor_stats.leaderboard(10)
+    if not top:
+        return await update.message.reply_text("🏆 No contributions yet. Be the first with /submit!")
+
+    medals = ["🥇", "🥈", "🥉"]
+    lines = []
+    for rank, (user_id, score) in enumerate(top, start=1):
+        name = contributor_stats.usernames.get(user_id)
+        label = f"@{name}" if name else f"Contributor {user_id[-4:]}"
+        lines.append(f"{medals[rank - 1] if rank <= 3 else f'{rank}.'} {label} – {score}")
+    await update.message.reply_text(
+        "🏆 <b>Top contributors</b> (submissions + annotations + reviews)\n\n" + "\n".join(lines),
+        parse_mode="HTML"
+    )
+
+async def perf(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMINS:
+        return await update.message.reply_text("⛔ You’re not authorized to view performance data.")
+
+    # Latency per handler and per Sheets/Telegram method, estimated from the histograms
+    def table(title, histogram, errors, label):
+        lines = [f"{title:<22}{'n':>6}{'p50':>8}{'p99':>8}{'err':>5}"]
+        for value in histogram.label_values(label):
+            series = {label: value}
+            failed = sum(v for key, v in errors.values.items() if dict(key).get(label) == value)
+            lines.append(
+                f"{value[:22]:<22}{histogram.count(**series):>6}"
+                f"{histogram.quantile(0.5, **series) * 1000:>8.0f}{histogram.quantile(0.99, **series) * 1000:>8.0f}"
+                f"{failed:>5.0f}"
+            )
+        return "\n".join(lines)
+
+    sections = [
+        table("handler", metrics.handler_seconds, metrics.handler_errors, "handler"),
+        table("sheets call", metrics.sheets_seconds, metrics.sheets_errors, "method"),
+        table("telegram call", metrics.telegram_seconds, metrics.telegram_errors, "method"),
+    ]
+    rows = [
+        f"{method}: avg {metrics.sheets_rows.mean(method=method):.0f} rows"
+        for method in metrics.sheets_rows.label_values("method")
+    ]
+    sheets_bytes = sum(metrics.sheets_bytes.values.values())
+    footer = f"Sheets traffic: {sheets_bytes / 1024:.0f} KiB" + (f"\nRows read per call – {'; '.join(rows)}" if rows else "")
+    await update.message.reply_text(
+        "📈 <b>Performance since start</b> (ms)\n<pre>" + "\n\n".join(sections) + "</pre>\n" + footer,
+        parse_mode="HTML"
+    )
+
 async def annotate(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if user_id not in ANNOTATORS:
-        return await update.message.reply_text("⛔ You’re not authorized to annotate.")
+        return await update.effective_message.reply_text("⛔ You’re not authorized to annotate.")
 
-    # 1️⃣ Fetch all records and find the first row with empty intent/emotion/topic
-    records = sheet.get_all_records()
-    next_row = None
-    for idx, row in enumerate(records, start=2):
-        # assuming columns: dialogue_id at 5, intent at 6, emotion at 7, topic at 8
-        if row.get("dialogue_id") and not row.get("intent"):
-            next_row = (idx, row)
-            break
+    # 1️⃣ Lease the next row without a topic (or the one this annotator already holds)
+    await storage.sync()
+    row_idx = annotation_queue.lease(user_id)
 
     # 2️⃣ If nothing to annotate, let user know
-    if not next_row:
-        return await update.message.reply_text("✅ All dialogues have been annotated! No more items available.")
+    if row_idx is None:
+        return await update.effective_message.reply_text("✅ All dialogues have been annotated! No more items available.")
 
-    row_idx, row_data = next_row
+    row_data = storage.get(row_idx)
     dialogue_id = row_data["dialogue_id"]
     dialogue_text = row_data["utterance"]  # assuming column header is "message"
 
-    # 3️⃣ Save this row_idx in user_data for callbacks to reference
-    context.user_data["current_annotation"] = {"row_idx": row_idx, "dialogue_id": dialogue_id}
+    # 3️⃣ Save this row_idx (and what we suggest for it) in user_data for callbacks to reference
+    labels, lines = describe_suggestions(dialogue_text)
+    context.user_data["current_annotation"] = {
+        "row_idx": row_idx, "dialogue_id": dialogue_id, "suggested": labels, "draft": {},
+    }
 
-    # 4️⃣ Send the text + step-by-step buttons
-    await update.message.reply_text(
+    # 4️⃣ Send the text + one-tap accept + step-by-step buttons (choices are kept as a draft until Save)
+    step_text, step_keyboard = annotation_step(dialogue_id, {}, row_idx, row_data)
+    await update.effective_message.reply_text(
         f"✏️ <b>Annotating Dialogue {dialogue_id}:</b>\n\n"
         f"“{dialogue_text}”\n\n"
-        "Step 1/3: Choose the <b>Intent</b>:",
+        f"💡 <b>Suggested:</b>\n{lines}\n"
+        f"Accept the suggestions, or {step_text}",
         parse_mode="HTML",
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("Request Info", callback_data="intent_request_info"),
-             InlineKeyboardButton("Question",    callback_data="intent_question")],
-            [InlineKeyboardButton("Greeting",      callback_data="intent_greeting"),
-             InlineKeyboardButton("Complaint",   callback_data="intent_complaint")],
-            [InlineKeyboardButton("Feedback",      callback_data="intent_feedback")]
-        ])
+        reply_markup=InlineKeyboardMarkup(
+            [[InlineKeyboardButton("✅ Accept suggestions", callback_data=pack("accept", row_idx, row_data))]]
+            + list(step_keyboard.inline_keyboard)
+        )
     )
 
 async def review(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if user_id not in REVIEWERS:
         return await update.message.reply_text("⛔ You’re not authorized to review.")
+    if context.args and context.args[0].lower() == "batch":
+        return await review_batch(update, context)
 
-    # 1️⃣ Find the next un-reviewed row
-    records = sheet.get_all_records()
-    next_item = None
-    for idx, row in enumerate(records, start=2):
-        if row.get("dialogue_id") and not row.get("status"):
-            next_item = (idx, row)
-            break
+    # 1️⃣ Lease the next annotated, un-reviewed row
+    await storage.sync()
+    row_idx = review_queue.lease(user_id)
 
     # 2️⃣ If nothing left, inform the reviewer
-    if not next_item:
+    if row_idx is None:
         return await update.message.reply_text("✅ All dialogues have been reviewed. Great job!")
 
-    row_idx, row = next_item
+    row = storage.get(row_idx)
     dialogue_id   = row["dialogue_id"]
     dialogue_text = row.get("utterance", "—")  # or adjust to your actual message column
     intent        = row.get("intent", "—")
@@ -376,8 +581,8 @@ async def review(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
     keyboard = [[
-        InlineKeyboardButton("✅ Approve", callback_data="review_approve"),
-        InlineKeyboardButton("❌ Reject",  callback_data="review_reject")
+        InlineKeyboardButton("✅ Approve", callback_data=pack("review_approve", row_idx, row)),
+        InlineKeyboardButton("❌ Reject",  callback_data=pack("review_reject", row_idx, row))
     ]]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -386,23 +591,25 @@ async def review(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def review_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    action = query.data  # either "review_approve" or "review_reject"
+    action, ref = unpack(query.data)  # either "review_approve" or "review_reject"
 
     info = context.user_data.get("pending_review")
-    if not info:
+    if not info and not ref:
         return await query.edit_message_text("❌ No pending review. Type /review to start again.")
+    found = target_row(ref, info)
+    if not found:
+        context.user_data.pop("pending_review", None)
+        return await query.edit_message_text(STALE_BUTTONS + " Type /review.")
 
-    row_idx    = info["row_idx"]
-    dialogue_id = info["dialogue_id"]
+    row_idx, record = found
+    dialogue_id = record["dialogue_id"]
     reviewer_id = update.effective_user.id
 
-    # 1) Always record who reviewed it
-    sheet.update_cell(row_idx, 9, reviewer_id)
-
     if action == "review_approve":
-        # 2a) Mark approved
-        sheet.update_cell(row_idx, 10, "approved")
-        sheet.update_cell(row_idx, 11, "")  # clear any comment
+        # 1a) Record reviewer, mark approved and clear any comment in one write, if the annotations are still those shown
+        if not storage.update_if(row_idx, schema.version(record), reviewer_id=reviewer_id, status="approved", comment=""):
+            return await query.edit_message_text(STALE_BUTTONS + " Type /review.")
+        review_queue.complete(row_idx)
 
         # 3a) Confirm and prompt for next
         await query.edit_message_text(
@@ -413,8 +620,14 @@ async def review_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data.pop("pending_review", None)
 
     else:  # "review_reject"
-        # 2b) Mark rejected and ask for comment
-        sheet.update_cell(row_idx, 10, "rejected")
+        # 1b) Record reviewer, mark rejected and ask for comment
+        if not storage.update_if(row_idx, schema.version(record), reviewer_id=reviewer_id, status="rejected"):
+            return await query.edit_message_text(STALE_BUTTONS + " Type /review.")
+        review_queue.complete(row_idx)
+        # The comment is written against the row as we just left it
+        context.user_data["pending_review"] = {
+            "row_idx": row_idx, "dialogue_id": dialogue_id, "version": schema.version(storage.get(row_idx)),
+        }
         await query.edit_message_text(
             f"❌ Dialogue {dialogue_id} marked <b>rejected</b>.\n\n"
             "📝 Please reply to this message with your review comment:",
@@ -422,63 +635,280 @@ async def review_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=ForceReply(selective=True)
         )
 
-async def annotation_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    data = query.data  # e.g. "intent_request_info" or "emotion_happy"
-    field, value = data.split("_", 1)  # field = "intent", value = "request_info"
+# ─── /review batch: a page of dialogues, decided with toggles and applied in one write ───
+# Most dialogues on one page; more wouldn't fit in a Telegram message
+REVIEW_BATCH_MAX = 15
+# Each toggle tap moves an item along: undecided → approve → reject → undecided
+BATCH_MARKS = {None: "⬜", "approve": "✅", "reject": "❌"}
+BATCH_NEXT = {None: "approve", "approve": "reject", "reject": None}
+# Utterance characters shown per page, shared out among its dialogues (at most 200 each), so a page of long
+# utterances stays under Telegram's 4096-character message limit
+BATCH_PAGE_CHARS = 2400
+BATCH_ITEM_CHARS = 200
+# Decisions carried over from earlier pages until Apply; kept small, as the batch lives in the persisted user_data
+BATCH_MAX_CARRIED = 2 * REVIEW_BATCH_MAX
 
-    info = context.user_data.get("current_annotation")
-    if not info:
-        return await query.edit_message_text("❌ Couldn’t find which dialogue you’re annotating. Please /annotate again.")
 
-    row_idx = info["row_idx"]
-    dialogue_id = info["dialogue_id"]
+def shorten(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def review_batch_items(row_indexes):
+    return [
+        {"row_idx": row_idx, "dialogue_id": record["dialogue_id"], "version": schema.version(record), "decision": None}
+        for row_idx, record in ((row_idx, storage.get(row_idx)) for row_idx in row_indexes)
+    ]
 
-    # map field to column number
-    col_map = {"intent": 6, "emotion": 7, "topic": 8}
-    sheet.update_cell(row_idx, col_map[field], value)
 
-    # advance to next step
-    if field == "intent":
-        # ask Emotion
+def batch_rows(batch: dict):
+    """Every row a batch holds a lease on: its current page and the decided rows of earlier pages."""
+    return [item["row_idx"] for item in batch["items"]] + [carried[0] for carried in batch.get("carried", [])]
+
+
+def batch_decisions(batch: dict):
+    """Every decided item of a batch, earlier pages' included, as ``review_batch_items`` dicts."""
+    carried = [
+        {"row_idx": row_idx, "dialogue_id": dialogue_id, "version": version, "decision": decision}
+        for row_idx, dialogue_id, version, decision in batch.get("carried", [])
+    ]
+    return carried + [item for item in batch["items"] if item["decision"]]
+
+
+def review_batch_page(batch: dict, note: str = ""):
+    """Text and buttons for the current page of a batch review."""
+    page, token = batch["page"], batch["token"]
+    first = batch.get("first", 0)
+    items = batch["items"]
+    limit = min(BATCH_ITEM_CHARS, BATCH_PAGE_CHARS // max(len(items), 1))
+    lines, toggles = [], []
+    for index, item in enumerate(items, start=first):
+        record = storage.get(item["row_idx"]) or {}
+        mark = BATCH_MARKS[item["decision"]]
+        if record.get("dialogue_id") != item["dialogue_id"] or schema.version(record) != item["version"]:
+            lines.append(f"⚠️ <b>{index + 1}.</b> Dialogue {item['dialogue_id']} changed since it was listed; it will be skipped.")
+        else:
+            lines.append(
+                f"{mark} <b>{index + 1}.</b> Dialogue {item['dialogue_id']}: <code>{record['intent']}</code> · "
+                f"<code>{record['emotion']}</code> · <code>{record['topic']}</code>\n“{shorten(record['utterance'], limit)}”"
+            )
+        toggles.append(InlineKeyboardButton(f"{mark} {index + 1}", callback_data=f"review_batch_toggle:{token}:{index - first}:{page}"))
+    decided = len(batch_decisions(batch))
+    navigation = [
+        InlineKeyboardButton("✅ Approve page", callback_data=f"review_batch_all:{token}:{page}"),
+        InlineKeyboardButton("Next ➡️", callback_data=f"review_batch_page:{token}:{page + 1}"),
+    ]
+    text = (
+        f"🗂 <b>Batch review</b>, page {page + 1}\n"
+        "Tap a number to cycle ⬜ → ✅ approve → ❌ reject. Nothing is saved until Apply.\n\n"
+        + "\n\n".join(lines)
+        + (f"\n\n{note}" if note else "")
+    )
+    keyboard = [toggles[i:i + 5] for i in range(0, len(toggles), 5)] + [navigation, [
+        InlineKeyboardButton(f"💾 Apply {decided}", callback_data=f"review_batch_apply:{token}"),
+        InlineKeyboardButton("❌ Cancel", callback_data=f"review_batch_cancel:{token}"),
+    ]]
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+async def review_batch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """``/review batch [N]``: lease N pending dialogues at once and list them with a toggle each."""
+    user_id = update.effective_user.id
+    size = int(context.args[1]) if len(context.args) > 1 and context.args[1].isdigit() else REVIEW_BATCH_SIZE
+    size = max(1, min(size, REVIEW_BATCH_MAX))
+
+    # 1️⃣ Starting over gives back the rows of any batch still open
+    previous = context.user_data.pop("review_batch", None)
+    if previous:
+        review_queue.release_rows(user_id, batch_rows(previous))
+
+    # 2️⃣ Lease a page of annotated, un-reviewed rows
+    await storage.sync()
+    rows = review_queue.lease_many(user_id, size)
+    if not rows:
+        return await update.message.reply_text("✅ All dialogues have been reviewed. Great job!")
+
+    # 3️⃣ Decisions live in user_data until Apply; the token ties buttons to this batch.
+    # Only the current page is kept in full; earlier pages leave just their decisions in "carried"
+    batch = {
+        "token": schema.base36(int(datetime.datetime.now().timestamp() * 1000) % 36 ** 6),
+        "size": size,
+        "page": 0,
+        "first": 0,
+        "items": review_batch_items(rows),
+        "carried": [],
+    }
+    context.user_data["review_batch"] = batch
+    text, keyboard = review_batch_page(batch)
+    await update.message.reply_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+async def ask_for_comment(message, dialogue_id, remaining: int):
+    await message.reply_text(
+        f"📝 Reply to this message with your comment for rejected Dialogue {dialogue_id} (or - to skip)."
+        + (f" {remaining} more after this one." if remaining else ""),
+        reply_markup=ForceReply(selective=True),
+    )
+
+
+async def review_batch_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles review_batch_{toggle,all,page,apply,cancel}:{token}[:{arg}] callbacks."""
+    query = update.callback_query
+    await query.answer()
+    action, token, *arg = query.data.split(":")
+    user_id = update.effective_user.id
+    batch = context.user_data.get("review_batch")
+    if not batch or batch["token"] != token:
+        return await query.edit_message_text("⌛ This batch is closed. Type /review batch to start a new one.")
+    rows = batch_rows(batch)
+    # Buttons of a page already moved on from (a quick second tap) only redraw the current page
+    page = {"review_batch_toggle": arg[1:], "review_batch_all": arg, "review_batch_page": arg}.get(action)
+    stale = bool(page) and int(page[0]) != batch["page"] + (action == "review_batch_page")
+    stale = stale or action == "review_batch_toggle" and int(arg[0]) >= len(batch["items"])
+    note = ""
+
+    if stale:
+        pass
+    elif action == "review_batch_toggle":
+        item = batch["items"][int(arg[0])]
+        item["decision"] = BATCH_NEXT[item["decision"]]
+    elif action == "review_batch_all":
+        for item in batch["items"]:
+            item["decision"] = item["decision"] or "approve"
+    elif action == "review_batch_page":
+        decided = [item for item in batch["items"] if item["decision"]]
+        if len(batch.setdefault("carried", [])) + len(decided) > BATCH_MAX_CARRIED:
+            note = f"💾 Apply the {len(batch_decisions(batch))} decisions so far before moving on."
+        else:
+            more = review_queue.lease_many(user_id, batch["size"])
+            if not more:
+                note = "✅ That’s every dialogue waiting for review."
+            else:
+                # The page is done with: keep its decisions, give its undecided rows back
+                batch["carried"] += [
+                    [item["row_idx"], item["dialogue_id"], item["version"], item["decision"]] for item in decided
+                ]
+                review_queue.release_rows(user_id, [item["row_idx"] for item in batch["items"] if not item["decision"]])
+                batch["first"] = batch.get("first", 0) + len(batch["items"])
+                batch["page"] += 1
+                batch["items"] = review_batch_items(more)
+
+    elif action == "review_batch_apply":
+        # 1️⃣ Every decision in one write, each checked against the version that was listed
+        decided = batch_decisions(batch)
+        updates = [
+            (
+                item["row_idx"],
+                item["version"],
+                {"reviewer_id": user_id, "status": "approved", "comment": ""}
+                if item["decision"] == "approve" else {"reviewer_id": user_id, "status": "rejected"},
+            )
+            for item in decided
+        ]
+        results = storage.update_rows_if(updates)
+        for item, saved in zip(decided, results):
+            if saved:
+                review_queue.complete(item["row_idx"])
+        # 2️⃣ Undecided (and skipped) rows go back in the queue
+        review_queue.release_rows(user_id, rows)
+        context.user_data.pop("review_batch", None)
+
+        approved = sum(1 for item, saved in zip(decided, results) if saved and item["decision"] == "approve")
+        rejected = [
+            {"row_idx": item["row_idx"], "dialogue_id": item["dialogue_id"], "version": schema.version(storage.get(item["row_idx"]))}
+            for item, saved in zip(decided, results) if saved and item["decision"] == "reject"
+        ]
+        skipped = results.count(False)
         await query.edit_message_text(
-            f"✔️ Intent set to <b>{value.replace('_',' ').title()}</b>.\n\n"
-            "Step 2/3: Choose the <b>Emotion</b>:",
-            parse_mode="HTML",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("Neutral",   callback_data="emotion_neutral"),
-                 InlineKeyboardButton("Happy",     callback_data="emotion_happy")],
-                [InlineKeyboardButton("Sad",       callback_data="emotion_sad"),
-                 InlineKeyboardButton("Angry",     callback_data="emotion_angry")],
-                [InlineKeyboardButton("Confused",  callback_data="emotion_confused")]
-            ])
+            f"💾 Saved: ✅ {approved} approved, ❌ {len(rejected)} rejected."
+            + (f"\n⚠️ {skipped} changed since they were listed and were skipped." if skipped else "")
+            + "\n\n▶️ Type /review batch for the next page.",
         )
-    elif field == "emotion":
-        # ask Topic
-        await query.edit_message_text(
-            f"✔️ Emotion set to <b>{value.title()}</b>.\n\n"
-            "Step 3/3: Choose the <b>Topic</b>:",
-            parse_mode="HTML",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("Internet",         callback_data="topic_internet"),
-                 InlineKeyboardButton("Customer Support", callback_data="topic_customer_support")],
-                [InlineKeyboardButton("Billing",          callback_data="topic_billing"),
-                 InlineKeyboardButton("Technical",        callback_data="topic_technical")],
-                [InlineKeyboardButton("General",          callback_data="topic_general")]
-            ])
+        # 3️⃣ Comments for the rejections, one reply each, through handle_review_comment
+        if rejected:
+            context.user_data["pending_review"] = {**rejected[0], "next": rejected[1:]}
+            await ask_for_comment(query.message, rejected[0]["dialogue_id"], len(rejected) - 1)
+        return
+
+    else:  # "review_batch_cancel"
+        review_queue.release_rows(user_id, rows)
+        context.user_data.pop("review_batch", None)
+        return await query.edit_message_text("❌ Batch review canceled; nothing was saved. Type /review to continue.")
+
+    review_queue.renew(user_id, batch_rows(batch))
+    text, keyboard = review_batch_page(batch, note)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+def annotation_step(dialogue_id, draft: dict, row_idx: int, record: dict):
+    """Text and buttons for the next unanswered field of a draft, or the confirm screen once all are set.
+
+    Every button carries the row as it was leased; nothing is written until Save.
+    """
+    chosen = "".join(f"✔️ {field.title()}: <b>{draft[field].replace('_', ' ').title()}</b>\n" for field in draft)
+    back = [InlineKeyboardButton("⬅️ Back", callback_data=pack("annotate_back", row_idx, record))] if draft else []
+    navigation = back + [InlineKeyboardButton("❌ Cancel", callback_data=pack("cancel", row_idx, record))]
+    missing = [field for field in schema.ANNOTATION_FIELDS if field not in draft]
+    if not missing:
+        return (
+            f"📝 <b>Dialogue {dialogue_id}</b>\n{chosen}\nSave this annotation?",
+            InlineKeyboardMarkup([
+                [InlineKeyboardButton("✅ Save", callback_data=pack("annotate_save", row_idx, record))], navigation,
+            ]),
         )
-    else:  # field == "topic"
-        # finalize
-        await query.edit_message_text(
+    field = missing[0]
+    options = schema.ANNOTATION_OPTIONS[field]
+    buttons = [
+        InlineKeyboardButton(option.replace("_", " ").title(), callback_data=pack(f"{field}_{option}", row_idx, record))
+        for option in options
+    ]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)] + [navigation]
+    step = schema.ANNOTATION_FIELDS.index(field) + 1
+    text = f"{chosen}\nStep {step}/{len(schema.ANNOTATION_FIELDS)}: Choose the <b>{field.title()}</b>:"
+    return text.lstrip("\n"), InlineKeyboardMarkup(keyboard)
+
+async def annotation_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    data, ref = unpack(query.data)  # e.g. "intent_request_info", "emotion_happy", "annotate_back" or "annotate_save"
+    field, value = data.split("_", 1)  # field = "intent", value = "request_info"
+
+    info = context.user_data.get("current_annotation")
+    if not info and not ref:
+        return await query.edit_message_text("❌ Couldn’t find which dialogue you’re annotating. Please /annotate again.")
+    found = target_row(ref, info)
+    if not found:
+        context.user_data.pop("current_annotation", None)
+        return await query.edit_message_text(STALE_BUTTONS + " Use /annotate.")
+
+    row_idx, record = found
+    dialogue_id = record["dialogue_id"]
+    # The draft lives in user_data until Save; buttons of another dialogue start a fresh one
+    if not info or info.get("dialogue_id") != dialogue_id:
+        info = context.user_data["current_annotation"] = {"row_idx": row_idx, "dialogue_id": dialogue_id}
+    draft = info.setdefault("draft", {})
+
+    if field == "annotate" and value == "back":
+        # Undo the last choice
+        if draft:
+            draft.pop([f for f in schema.ANNOTATION_FIELDS if f in draft][-1])
+    elif field == "annotate" and value == "save" and all(f in draft for f in schema.ANNOTATION_FIELDS):
+        # All three fields and the annotator in one write, checked against the row as leased
+        if not storage.update_if(row_idx, schema.version(record), **draft, annotator_id=update.effective_user.id):
+            context.user_data.pop("current_annotation", None)
+            return await query.edit_message_text(STALE_BUTTONS + " Use /annotate.")
+        annotation_queue.complete(row_idx)
+        context.user_data.pop("current_annotation", None)
+        # Echo the draft; nothing needs reading back
+        return await query.edit_message_text(
             f"✅ Completed annotation for {dialogue_id}:\n"
-            f"• Intent: {sheet.cell(row_idx,6).value}\n"
-            f"• Emotion: {sheet.cell(row_idx,7).value}\n"
-            f"• Topic: {value.replace('_',' ').title()}\n\n"
-            "🎉 Great work! Use /annotate to pick the next one."
+            + "".join(f"• {f.title()}: {draft[f].replace('_', ' ').title()}\n" for f in schema.ANNOTATION_FIELDS)
+            + "\n🎉 Great work! Use /annotate to pick the next one."
         )
-        # clear it out
-        context.user_data.pop("current_annotation", None)
+    elif field in schema.ANNOTATION_FIELDS:
+        draft[field] = value
+
+    # advance to the next step (or the confirm screen)
+    text, keyboard = annotation_step(dialogue_id, draft, row_idx, record)
+    await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
 async def handle_review_comment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Only handle replies when we’re expecting a comment
@@ -491,37 +921,53 @@ async def handle_review_comment(update: Update, context: ContextTypes.DEFAULT_TY
     comment = update.message.text.strip()
 
     try:
-        sheet.update_cell(row_idx, 11, comment)
-        await update.message.reply_text(
-            f"✍️ Comment saved for Dialogue {dialogue_id}.\n\n"
-            "Use /review to continue."
-        )
+        record = storage.get(row_idx)
+        if comment == "-":
+            await update.message.reply_text(f"⏭ No comment for Dialogue {dialogue_id}.")
+        elif not storage.update_if(row_idx, info.get("version") or schema.version(record or {}), comment=comment):
+            await update.message.reply_text(
+                f"⚠️ Dialogue {dialogue_id} changed since you rejected it, so the comment wasn’t saved."
+            )
+        else:
+            await update.message.reply_text(
+                f"✍️ Comment saved for Dialogue {dialogue_id}.\n\n"
+                "Use /review to continue."
+            )
     except APIError as e:
         logging.error(f"Error saving review comment: {e}")
         await update.message.reply_text("⚠️ Couldn’t save your comment. Please try again.")
     finally:
-        # Clear pending state
+        # Clear pending state; rejections from a batch review are commented one after another
         context.user_data.pop("pending_review", None)
+        remaining = info.get("next")
+        if remaining:
+            context.user_data["pending_review"] = {**remaining[0], "next": remaining[1:]}
+            await ask_for_comment(update.message, remaining[0]["dialogue_id"], len(remaining) - 1)
 
 
 async def set_field_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handles all set_{field}_{id}_{value} callbacks."""
+    """Handles all set_{field}_{value} callbacks (and older set_{field}_{id}_{value} ones)."""
     query = update.callback_query
     await query.answer()
-    _, field, dialogue_id, value = query.data.split("_", 3)
-
-    # 1. find the row
-    records = sheet.get_all_records()
-    row_idx = next(
-        (i for i, r in enumerate(records, start=2) if str(r.get("dialogue_id")) == dialogue_id),
-        None
-    )
-    if not row_idx:
-        return await query.edit_message_text("❌ Couldn’t find that dialogue. Try /annotate again.")
-
-    # 2. map field → column index
-    col_map = {"intent":6, "emotion":7, "topic":8}
-    sheet.update_cell(row_idx, col_map[field], value)
+    data, ref = unpack(query.data)
+
+    # 1. find the row: the button says where it is; older buttons only name the dialogue
+    if ref:
+        _, field, value = data.split("_", 2)
+        found = resolve(storage, ref)
+    else:
+        _, field, dialogue_id, value = data.split("_", 3)
+        await storage.sync()
+        found = storage.find_dialogue(dialogue_id)
+    if not found:
+        return await query.edit_message_text(STALE_BUTTONS + " Try /annotate again.")
+    row_idx, record = found
+    dialogue_id = record["dialogue_id"]
+
+    # 2. write the field, unless the row changed since the buttons were sent
+    if not storage.update_if(row_idx, schema.version(record), **{field: value}):
+        return await query.edit_message_text(STALE_BUTTONS + " Try /annotate again.")
+    record = storage.get(row_idx)
 
     # 3. confirmation text
     text = (
@@ -533,7 +979,7 @@ async def set_field_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # 4. next-steps buttons
     kb = InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("🔄 Edit Another Field", callback_data=f"edit_intent_{dialogue_id}"),
+            InlineKeyboardButton("🔄 Edit Another Field", callback_data=pack("edit_intent", row_idx, record)),
             InlineKeyboardButton("🏠 Main Menu",        callback_data="main_menu")
         ]
     ])
@@ -0,0 +1,72 @@
+import fcntl
+import logging
+import os
+import threading
+
+
+class DialogueIdAllocator:
+    """Hands out increasing numeric dialogue IDs without reading the sheet.
+
+    The counter is seeded once from the dialogue IDs already known (normally
+    the row store after its first load) and then advanced under a lock.
+    With a ``reserver`` the allocator takes IDs from blocks of ``block_size``
+    reserved through it, so several bot processes never hand out the same ID.
+    """
+
+    def __init__(self, block_size: int = 1, reserver=None):
+        self.block_size = max(block_size, 1)
+        self.reserver = reserver
+        self.seeded = False
+        self._next = 1
+        self._block_end = 0     # last ID of the current reserved block
+        self._lock = threading.Lock()
+
+    def seed(self, dialogue_ids):
+        """Start after the highest numeric ID in ``dialogue_ids``."""
+        numeric_ids = [int(d_id) for d_id in dialogue_ids if str(d_id).isdigit()]
+        with self._lock:
+            self._next = max(self._next, max(numeric_ids, default=0) + 1)
+            self.seeded = True
+        logging.info(f"Dialogue ID allocator seeded at {self._next}")
+
+    def next_id(self) -> str:
+        return self.next_ids(1)[0]
+
+    def next_ids(self, count: int) -> list:
+        """Allocate ``count`` IDs at once; with a reserver, a short block is topped up with one reservation."""
+        with self._lock:
+            if not self.seeded:
+                raise RuntimeError("DialogueIdAllocator.next_ids() called before seed()")
+            ids = []
+            while len(ids) < count:
+                if self.reserver and self._next > self._block_end:
+                    size = max(self.block_size, count - len(ids))
+                    start = self.reserver.reserve(size, floor=self._next)
+                    self._next, self._block_end = start, start + size - 1
+                take = count - len(ids)
+                if self.reserver:
+                    take = min(take, self._block_end - self._next + 1)
+                ids.extend(str(i) for i in range(self._next, self._next + take))
+                self._next += take
+            return ids
+
+
+class FileBlockReserver:
+    """Reserves ID blocks from a counter file shared by processes on one host."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def reserve(self, count: int, floor: int = 1) -> int:
+        """Return the first ID of a fresh block of ``count`` IDs, never below ``floor``."""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            content = f.read().strip()
+            start = max(int(content) if content.isdigit() else 1, floor)
+            f.seek(0)
+            f.truncate()
+            f.write(str(start + count))
+            f.flush()
+            os.fsync(f.fileno())
+            return start
@@ -0,0 +1,176 @@
+import json
+import logging
+import math
+import os
+import threading
+from collections import Counter
+
+import schema
+from dedup import canonical
+
+# What /annotate falls back to before any annotation has been approved
+DEFAULT_LABELS = {"intent": "request_info", "emotion": "neutral", "topic": "general"}
+
+
+def features(text: str) -> Counter:
+    """Character 2- and 3-grams of the padded canonical text, plus whole words."""
+    text = f" {canonical(text)} "
+    grams = Counter(text[i:i + 2] for i in range(len(text) - 1))
+    grams.update(text[i:i + 3] for i in range(len(text) - 2))
+    grams.update("w:" + word for word in text.split())
+    return grams
+
+
+class LabelSuggester:
+    """Multinomial naive Bayes over character n-grams, one model per annotation field.
+
+    Trained on approved rows only. As a storage listener it learns each row
+    the moment it is approved and unlearns it if its labels or status
+    change, so it tracks the reviewed data without retraining. Counts are
+    saved to ``path`` on ``save`` and loaded back by ``load``, so a restart
+    only looks at rows approved since; ``loaded`` retrains from scratch if
+    the saved model no longer matches storage.
+    """
+
+    def __init__(self, path: str = None, fields=schema.ANNOTATION_FIELDS, alpha: float = 0.1):
+        self.path = path
+        self.fields = fields
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counts = {field: {} for field in self.fields}   # field -> label -> Counter(gram)
+        self.totals = {field: Counter() for field in self.fields}  # field -> label -> grams seen
+        self.docs = {field: Counter() for field in self.fields}    # field -> label -> rows
+        self.vocab = Counter()      # gram -> occurrences, for the smoothing denominator
+        self.trained = {}           # row_idx -> [dialogue_id, *labels, utterance] learned from that row
+        self.dirty = False
+        self._seen = None           # rows confirmed while storage loads, after ``load``
+        self._mismatch = False
+
+    # ─── Training ───
+    def _learn(self, text: str, labels, sign: int):
+        grams = features(text)
+        if sign < 0:
+            grams = Counter({gram: -count for gram, count in grams.items()})
+        self.vocab.update(grams)
+        size = sum(grams.values())
+        for field, label in zip(self.fields, labels):
+            counts = self.counts[field].setdefault(label, Counter())
+            counts.update(grams)
+            self.totals[field][label] += size
+            self.docs[field][label] += sign
+            if self.docs[field][label] <= 0:
+                del self.counts[field][label], self.totals[field][label], self.docs[field][label]
+            elif sign < 0:
+                self.counts[field][label] = +counts
+        if sign < 0:
+            # Unlearning is rare (a re-review), so dropping the zeroed grams by copying is fine
+            self.vocab = +self.vocab
+
+    def observe(self, row_idx: int, record: dict):
+        """Storage listener: learn approved rows, unlearn rows whose approval or labels changed."""
+        labels = [record.get(field) or "" for field in self.fields]
+        entry = None
+        if (record.get("status") or "").lower() == "approved" and all(labels) and record.get("utterance"):
+            entry = [record.get("dialogue_id", "")] + labels + [record["utterance"]]
+        with self._lock:
+            previous = self.trained.get(row_idx)
+            if self._seen is not None:
+                self._seen.add(row_idx)
+                # The saved model learned a different dialogue at this row: it's from another store
+                if self._mismatch or previous and previous[0] != record.get("dialogue_id", ""):
+                    self._mismatch = True
+                    return
+            if previous == entry:
+                return
+            if previous:
+                # Unlearn the text that was learned; the row's utterance may have been edited since
+                self._learn(previous[-1], previous[1:-1], -1)
+                del self.trained[row_idx]
+            if entry:
+                self._learn(entry[-1], entry[1:-1], 1)
+                self.trained[row_idx] = entry
+            self.dirty = True
+
+    # ─── Prediction ───
+    def suggest(self, text: str):
+        """``{field: (label, probability)}`` for every field that has approved examples."""
+        grams = features(text)
+        vocab_size = len(self.vocab) + 1
+        suggestions = {}
+        with self._lock:
+            for field in self.fields:
+                docs = self.docs[field]
+                if not docs:
+                    continue
+                rows = sum(docs.values())
+                scores = {}
+                for label, counts in self.counts[field].items():
+                    denominator = math.log(self.totals[field][label] + self.alpha * vocab_size)
+                    score = math.log(docs[label] / rows)
+                    for gram, n in grams.items():
+                        score += n * (math.log(counts[gram] + self.alpha) - denominator)
+                    scores[label] = score
+                best = max(scores, key=scores.get)
+                total = sum(math.exp(score - scores[best]) for score in scores.values())
+                suggestions[field] = (best, 1 / total)
+        return suggestions
+
+    def labels_for(self, text: str) -> dict:
+        """Best label per field, falling back to ``DEFAULT_LABELS`` for fields with no examples yet."""
+        suggestions = self.suggest(text)
+        return {field: suggestions[field][0] if field in suggestions else DEFAULT_LABELS[field] for field in self.fields}
+
+    # ─── Persistence ───
+    def load(self):
+        """Restore counts saved by ``save``; rows storage then loads are checked against them."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring saved label model {self.path}: {e}")
+            return
+        with self._lock:
+            self.reset()
+            for field in self.fields:
+                for label, counts in saved["counts"].get(field, {}).items():
+                    self.counts[field][label] = Counter(counts)
+                    self.totals[field][label] = sum(counts.values())
+                self.docs[field] = Counter(saved["docs"].get(field, {}))
+            self.vocab = Counter(saved["vocab"])
+            self.trained = {int(row_idx): entry for row_idx, entry in saved["trained"].items()}
+            self._seen = set()
+            # Saved before entries kept the utterance they were learned from: retrain once storage loads
+            self._mismatch = any(len(entry) != len(self.fields) + 2 for entry in self.trained.values())
+        logging.info(f"Loaded label model trained on {len(self.trained)} approved rows")
+
+    def loaded(self, records):
+        """Call once storage has loaded: retrain from ``records`` if the saved model didn't match it."""
+        with self._lock:
+            stale = self._seen is not None and (self._mismatch or len(self._seen & self.trained.keys()) < len(self.trained))
+            self._seen = None
+        if stale:
+            logging.info("Saved label model doesn't match storage; retraining")
+            with self._lock:
+                self.reset()
+            for row_idx, record in records:
+                self.observe(row_idx, record)
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        with self._lock:
+            saved = {
+                "counts": {field: {label: dict(c) for label, c in labels.items()} for field, labels in self.counts.items()},
+                "docs": {field: dict(docs) for field, docs in self.docs.items()},
+                "vocab": dict(self.vocab),
+                "trained": self.trained,
+            }
+            self.dirty = False
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(saved, f, ensure_ascii=False)
+        os.replace(self.path + ".tmp", self.path)
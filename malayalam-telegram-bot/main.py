@@ -1,4 +1,6 @@
+import asyncio
 import logging
+import os
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -6,12 +8,41 @@ from telegram.ext import (
     CallbackQueryHandler,
     filters,
 )
-from config import BOT_TOKEN
+import config
+from config import (
+    BOT_TOKEN,
+    WEBHOOK_URL,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    MAX_CONCURRENT_UPDATES,
+    METRICS_PORT,
+    METRICS_LISTEN,
+    CONVERSATION_STATE_PATH,
+    CONVERSATION_TTL_SECONDS,
+    CONVERSATION_FLUSH_SECONDS,
+    NOTIFY_CHECK_SECONDS,
+    WORKERS,
+    WORKER_INDEX,
+    WORKER_BASE_PORT,
+)
+from conversation_state import SQLitePersistence
+from coordination import worker_for
+from update_processor import PerUserUpdateProcessor
+from workers import Router, serve_worker
+import backend
+import metrics
 from handlers import (
     start,
     submit,
+    bulk,
     handle_message,
+    handle_bulk_document,
     stats,
+    leaderboard,
+    perf,
+    resume_flows,
     annotate,
     review,
     # Consent buttons
@@ -20,6 +51,7 @@ from handlers import (
     annotation_callback,
     # Review multi-step
     review_callback,
+    review_batch_callback,
     handle_review_comment,
     # Field edit callbacks
     set_field_callback,
@@ -27,20 +59,70 @@ from handlers import (
 
 )
 
+async def post_init(app):
+    # Metrics first, so /ready answers 503 while we warm up
+    if METRICS_PORT:
+        await metrics.start_server(METRICS_LISTEN, METRICS_PORT, ready=backend.ready)
+    # Open the sheet, load storage once, seed the dialogue ID counter, work queues and consent registry from it
+    await backend.start()
+    # Hand users back the dialogues their restored flows point at, then start expiring idle state
+    resume_flows(app.user_data)
+    app.persistence.start(app)
+
+async def post_shutdown(app):
+    # Push any queued writes, then let in-flight Sheets calls finish before exiting
+    await metrics.stop_server()
+    await backend.stop()
+
 def main():
+    config.validate()
+
     # 1️⃣ Logging
     logging.basicConfig(
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         level=logging.INFO
     )
 
+    #    Multi-worker mode: this process only routes the webhook's updates to the workers it starts
+    if WORKERS > 1 and WORKER_INDEX is None:
+        router = Router(
+            os.path.abspath(__file__), WORKERS, WORKER_BASE_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, metrics_port=METRICS_PORT
+        )
+        asyncio.run(router.run(
+            BOT_TOKEN,
+            WEBHOOK_LISTEN,
+            WEBHOOK_PORT,
+            f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            max_connections=min(100, MAX_CONCURRENT_UPDATES * WORKERS),
+        ))
+        return
+
     # 2️⃣ Build the bot
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    app = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .request(metrics.InstrumentedRequest(connection_pool_size=256))
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .persistence(SQLitePersistence(
+            CONVERSATION_STATE_PATH,
+            ttl_seconds=CONVERSATION_TTL_SECONDS,
+            update_interval=CONVERSATION_FLUSH_SECONDS,
+            # A worker keeps the flow state of its own users, in the store the workers share
+            store=backend.coordinator.user_states if backend.coordinator else None,
+            owns=(lambda user_id: worker_for(user_id, WORKERS) == WORKER_INDEX) if backend.coordinator else None,
+        ))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # 3️⃣ Command handlers
     app.add_handler(CommandHandler("start",    start))
     app.add_handler(CommandHandler("submit",   submit))
+    app.add_handler(CommandHandler("bulk",     bulk))
     app.add_handler(CommandHandler("stats",    stats))
+    app.add_handler(CommandHandler("leaderboard", leaderboard))
+    app.add_handler(CommandHandler("perf",     perf))
     app.add_handler(CommandHandler("annotate", annotate))
     app.add_handler(CommandHandler("review",   review))
 
@@ -49,6 +131,10 @@ def main():
     #    - reply-to messages after a reject go to handle_review_comment
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     app.add_handler(MessageHandler(filters.TEXT & filters.REPLY,      handle_review_comment))
+    #    - .txt/.csv uploads are bulk submissions
+    app.add_handler(MessageHandler(
+        filters.Document.FileExtension("txt") | filters.Document.FileExtension("csv"), handle_bulk_document
+    ))
 
     # 5️⃣ CallbackQuery handlers (in priority order)
 
@@ -59,19 +145,51 @@ def main():
     app.add_handler(CallbackQueryHandler(annotation_callback, pattern="^annotate_"))
     app.add_handler(CallbackQueryHandler(annotation_callback, pattern="^(intent|emotion|topic)_"))
 
+    # – Accept the suggested labels in one tap, or cancel
+    app.add_handler(CallbackQueryHandler(button_handler, pattern="^(accept|cancel)[_:]"))
+    app.add_handler(CallbackQueryHandler(button_handler, pattern="^next_annotate$"))
+
     # – Inline “Edit Annotations” submenu
     app.add_handler(CallbackQueryHandler(button_handler,    pattern="^edit_"))
     app.add_handler(CallbackQueryHandler(set_field_callback, pattern="^set_(intent|emotion|topic)_"))
 
     # – Review flow (approve/reject buttons)
-    app.add_handler(CallbackQueryHandler(review_callback, pattern="^review_(approve|reject)$"))
+    app.add_handler(CallbackQueryHandler(review_callback, pattern="^review_(approve|reject)(:|$)"))
+    # – Batch review (/review batch): toggles, paging, apply
+    app.add_handler(CallbackQueryHandler(review_batch_callback, pattern="^review_batch_"))
     # – Post-review navigation
-    app.add_handler(CallbackQueryHandler(lambda u,c: review(u,c), pattern="^review_next$"))
-    app.add_handler(CallbackQueryHandler(lambda u,c: start(u,c),  pattern="^main_menu$"))
+    app.add_handler(CallbackQueryHandler(review, pattern="^review_next$"))
+    app.add_handler(CallbackQueryHandler(start,  pattern="^main_menu$"))
+
+    # – Time every handler registered above (see /perf and the metrics endpoint)
+    for group in app.handlers.values():
+        for handler in group:
+            handler.callback = metrics.instrument(handler.callback)
+
+    # 6️⃣ Background jobs: backlog digests for annotators and reviewers (from one worker in multi-worker mode)
+    if NOTIFY_CHECK_SECONDS and backend.leader:
+        if app.job_queue:
+            backend.backlog_notifier.schedule(app.job_queue)
+        else:
+            logging.warning("No JobQueue (install python-telegram-bot[job-queue]); backlog digests are off")
 
-    # 6️⃣ Start polling
-    logging.info("🤖 Bot is running...")
-    app.run_polling()
+    # 7️⃣ Start serving: updates from the router as a worker, webhook on the built-in web server if configured,
+    #    else long polling
+    if WORKER_INDEX is not None:
+        asyncio.run(serve_worker(app, WORKER_BASE_PORT + WORKER_INDEX, WEBHOOK_PATH, WEBHOOK_SECRET))
+    elif WEBHOOK_URL:
+        logging.info(f"🤖 Bot is running (webhook on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH})...")
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            max_connections=MAX_CONCURRENT_UPDATES,
+        )
+    else:
+        logging.info("🤖 Bot is running...")
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,280 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+
+from telegram.request import HTTPXRequest
+
+# Latency buckets in seconds, and row-count buckets for Sheets reads
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ROWS_BUCKETS = (1, 10, 100, 1000, 10_000, 100_000)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple) -> str:
+    if not key:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in key) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, lock):
+        self.name, self.help, self._lock = name, help, lock
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(_label_key(labels), 0)
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, key, value
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects; quantiles are estimated from the buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, lock, buckets=SECONDS_BUCKETS):
+        self.name, self.help, self._lock = name, help, lock
+        self.buckets = tuple(buckets)
+        self.series = {}   # label key -> [bucket counts..., +Inf count], sum
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            counts, total = self.series.get(key) or ([0] * (len(self.buckets) + 1), 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self.series[key] = (counts, total + value)
+
+    def count(self, **labels) -> int:
+        counts, _ = self.series.get(_label_key(labels), ((), 0))
+        return sum(counts)
+
+    def mean(self, **labels) -> float:
+        counts, total = self.series.get(_label_key(labels), ((), 0))
+        return total / sum(counts) if counts and sum(counts) else 0.0
+
+    def quantile(self, q: float, **labels) -> float:
+        counts, _ = self.series.get(_label_key(labels), ((), 0))
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank, seen, lower = q * total, 0, 0.0
+        for bound, count in zip(self.buckets, counts):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen, lower = seen + count, bound
+        return self.buckets[-1]   # in the +Inf bucket; all we know is it's above the last bound
+
+    def label_values(self, name: str):
+        return sorted({dict(key).get(name) for key in self.series})
+
+    def samples(self):
+        for key, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", key + (("le", bound),), cumulative
+            yield f"{self.name}_sum", key, total
+            yield f"{self.name}_count", key, cumulative
+
+
+class Gauge:
+    """Value read from ``func`` when the metrics are rendered."""
+
+    def __init__(self, name: str, help: str, func, kind: str = "gauge"):
+        self.name, self.help, self.func, self.kind = name, help, func, kind
+
+    def samples(self):
+        yield self.name, (), self.func()
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()   # Sheets calls are observed from the executor threads
+        self.metrics = {}
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._add(Counter(name, help, self._lock))
+
+    def histogram(self, name: str, help: str, buckets=SECONDS_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, self._lock, buckets))
+
+    def gauge(self, name: str, help: str, func, kind: str = "gauge") -> Gauge:
+        return self._add(Gauge(name, help, func, kind))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for metric in self.metrics.values():
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                for name, key, value in list(metric.samples()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+handler_seconds = registry.histogram("bot_handler_seconds", "Time spent in each Telegram update handler.")
+handler_errors = registry.counter("bot_handler_errors_total", "Exceptions raised by update handlers.")
+telegram_seconds = registry.histogram("bot_telegram_request_seconds", "Bot API request latency by method.")
+telegram_errors = registry.counter("bot_telegram_request_errors_total", "Failed Bot API requests by method.")
+telegram_bytes = registry.counter("bot_telegram_bytes_total", "Bot API request and response payload bytes.")
+sheets_seconds = registry.histogram("bot_sheets_call_seconds", "Sheets API call latency by method (one attempt).")
+sheets_wait_seconds = registry.histogram(
+    "bot_sheets_request_seconds", "Sheets call latency as the caller sees it, including queueing and retries."
+)
+sheets_errors = registry.counter("bot_sheets_call_errors_total", "Failed Sheets API call attempts by method.")
+sheets_rows = registry.histogram("bot_sheets_rows_read", "Rows returned per Sheets read.", ROWS_BUCKETS)
+sheets_bytes = registry.counter("bot_sheets_bytes_total", "Sheets API request and response body bytes.")
+
+
+# ─── Handlers ───
+def instrument(callback, name: str = None):
+    """Wrap an async handler so its latency and exceptions are recorded under ``name``."""
+    name = name or callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception as e:
+            handler_errors.inc(handler=name, error=type(e).__name__)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - started, handler=name)
+
+    return wrapper
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """Bot API transport that records latency, errors and payload bytes per API method."""
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        try:
+            status, payload = await super().do_request(url, method, request_data=request_data, **kwargs)
+        except Exception as e:
+            telegram_errors.inc(method=api_method, error=type(e).__name__)
+            raise
+        finally:
+            telegram_seconds.observe(time.perf_counter() - started, method=api_method)
+        if status >= 400:
+            telegram_errors.inc(method=api_method, error=str(status))
+        sent = len(request_data.json_payload) if request_data and not request_data.contains_files else 0
+        telegram_bytes.inc(sent, method=api_method, direction="sent")
+        telegram_bytes.inc(len(payload), method=api_method, direction="received")
+        return status, payload
+
+
+# ─── Sheets ───
+_transfer = threading.local()
+
+
+def _count_bytes(response, *args, **kwargs):
+    """``requests`` response hook adding body sizes to the current thread's Sheets call."""
+    body = response.request.body if response.request is not None else None
+    _transfer.sent = getattr(_transfer, "sent", 0) + (len(body) if body else 0)
+    _transfer.received = getattr(_transfer, "received", 0) + len(response.content or b"")
+
+
+def track_session(session):
+    """Count bytes moved by the gspread client's HTTP session."""
+    session.hooks["response"].append(_count_bytes)
+
+
+def count_rows(rows: int):
+    """Report rows read inside a composite Sheets call (e.g. ``RowStore.sync``)."""
+    _transfer.rows = (getattr(_transfer, "rows", None) or 0) + rows
+
+
+def timed_sheets_call(name: str, call):
+    """Run one Sheets call attempt (on an executor thread) and record it under ``name``."""
+    _transfer.sent = _transfer.received = 0
+    _transfer.rows = None
+    started = time.perf_counter()
+    try:
+        result = call()
+    except Exception as e:
+        sheets_errors.inc(method=name, error=type(e).__name__)
+        raise
+    finally:
+        sheets_seconds.observe(time.perf_counter() - started, method=name)
+        sheets_bytes.inc(_transfer.sent, method=name, direction="sent")
+        sheets_bytes.inc(_transfer.received, method=name, direction="received")
+    rows = _transfer.rows if _transfer.rows is not None else len(result) if isinstance(result, list) else None
+    if rows is not None:
+        sheets_rows.observe(rows, method=name)
+    return result
+
+
+# ─── Exposition ───
+_server = None
+_ready = None
+
+
+async def _serve_request(reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        path = parts[1].split("?")[0] if len(parts) >= 2 and parts[0] == "GET" else None
+        if path == "/metrics":
+            status, body = "200 OK", registry.render().encode()
+        elif path == "/ready":
+            ok = _ready is None or _ready()
+            status, body = ("200 OK", b"ready\n") if ok else ("503 Service Unavailable", b"starting\n")
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(host: str, port: int, ready=None):
+    """Serve ``GET /metrics`` for Prometheus and ``GET /ready`` (200 once ``ready()`` is true, else 503)."""
+    global _server, _ready
+    _ready = ready
+    _server = await asyncio.start_server(_serve_request, host, port)
+    logging.info(f"📈 Metrics on http://{host}:{port}/metrics")
+
+
+async def stop_server():
+    global _server
+    if _server:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
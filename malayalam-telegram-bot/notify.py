@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+
+from telegram.error import RetryAfter, TelegramError
+
+from sheets_scheduler import TokenBucket
+
+
+class Backlog:
+    """Rows waiting for one kind of work, counted as storage loads and changes (``observe`` is a storage listener)."""
+
+    def __init__(self, is_pending, recipients, threshold: int, line: str):
+        self.is_pending = is_pending
+        self.recipients = recipients   # user IDs to tell; read on every check, so it can change
+        self.threshold = threshold     # 0 never announces
+        self.line = line               # digest line, formatted with {count}
+        self.pending = set()
+        self.announced = None          # size in the last digest; None until it reaches the threshold again
+        self.announced_at = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, row_idx: int, record: dict):
+        with self._lock:
+            if self.is_pending(record):
+                self.pending.add(row_idx)
+            else:
+                self.pending.discard(row_idx)
+
+    def __len__(self):
+        return len(self.pending)
+
+
+class BacklogNotifier:
+    """Tells annotators and reviewers when work piles up, so nobody has to poll /annotate or /review.
+
+    ``check`` runs as a repeating JobQueue job and reads only the in-memory
+    counts. A backlog is announced when it reaches its threshold, then again
+    at most every ``digest_seconds`` while it keeps growing, and starts over
+    once it drops below. Each user gets one digest covering every backlog due
+    for them. Sends are paced by a global token bucket and one per chat, under
+    Telegram's limits; a ``RetryAfter`` holds back all sends as long as asked.
+    """
+
+    def __init__(self, backlogs, interval: float = 60, digest_seconds: float = 3600,
+                 messages_per_second: float = 25, chat_messages_per_minute: float = 20):
+        self.backlogs = backlogs
+        self.interval = interval
+        self.digest_seconds = digest_seconds
+        self.bucket = TokenBucket(messages_per_second * 60, max(1, int(messages_per_second)))
+        self.chat_messages_per_minute = chat_messages_per_minute
+        self.chat_buckets = {}
+
+    def schedule(self, job_queue):
+        job_queue.run_repeating(self.check, interval=self.interval, first=self.interval, name="backlog_digest")
+
+    def digests(self, now: float) -> dict:
+        """``{user_id: text}`` for the backlogs due now; they count as announced from here."""
+        lines = {}
+        for backlog in self.backlogs:
+            count = len(backlog)
+            if not backlog.threshold or count < backlog.threshold:
+                backlog.announced = None
+                continue
+            if backlog.announced is not None and (
+                count <= backlog.announced or now - backlog.announced_at < self.digest_seconds
+            ):
+                continue
+            backlog.announced, backlog.announced_at = count, now
+            for user_id in backlog.recipients:
+                lines.setdefault(user_id, []).append(backlog.line.format(count=count))
+        return {user_id: "🔔 <b>Work is waiting</b>\n" + "\n".join(user_lines) for user_id, user_lines in lines.items()}
+
+    async def check(self, context):
+        digests = self.digests(time.monotonic())
+        for user_id, text in digests.items():
+            await self.send(context.bot, user_id, text)
+        if digests:
+            logging.info(f"Sent backlog digests to {len(digests)} users")
+
+    async def send(self, bot, chat_id, text: str):
+        chat_bucket = self.chat_buckets.get(chat_id)
+        if chat_bucket is None:
+            chat_bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_messages_per_minute, 1)
+        await chat_bucket.take()
+        for attempt in range(2):
+            await self.bucket.take()
+            try:
+                await bot.send_message(chat_id, text, parse_mode="HTML")
+                return
+            except RetryAfter as e:
+                logging.warning(f"Telegram asked to wait {e.retry_after}s before sending more digests")
+                self.bucket.penalize(float(e.retry_after))
+            except TelegramError as e:
+                # Usually a user who never started the bot or blocked it
+                logging.info(f"Couldn't send backlog digest to {chat_id}: {e}")
+                return
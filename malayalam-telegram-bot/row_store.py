@@ -0,0 +1,200 @@
+import bisect
+import itertools
+import logging
+import threading
+import time
+
+from gspread.utils import rowcol_to_a1
+
+import metrics
+
+
+class RowStore:
+    """In-memory copy of the dialogue sheet, indexed by row, user_id and dialogue_id.
+
+    The sheet is read once with ``get_all_values``; afterwards only rows
+    appended by someone else are fetched (``refresh``), and the bot's own
+    writes are applied with ``apply_update`` / ``apply_append``.
+
+    Syncing is meant to run on a worker thread (see ``SheetsGateway``) while
+    handlers read on the event loop, so network reads happen outside the
+    lock and only the in-memory merge is done under it.
+
+    Records are keyed by the sheet's header row, or by ``columns`` when
+    given (so the code doesn't depend on how the header cells are spelled).
+
+    Callables in ``listeners`` are called as ``listener(row_idx, record)``
+    whenever a row is loaded or changed, with the store lock held.
+
+    Rows moved out of the sheet (to the archive, see ``archive.py``) keep
+    their ``row_idx`` for good: ``removed`` lists them, and ``sheet_row``
+    gives the row a ``row_idx`` is on now that the rows below moved up.
+    """
+
+    def __init__(self, worksheet, refresh_interval: float = 60, columns=None):
+        self.worksheet = worksheet
+        self.refresh_interval = refresh_interval
+        self.columns = columns
+        self.header = list(columns or [])
+        self.rows = {}           # row_idx -> record dict
+        self.by_dialogue = {}    # dialogue_id -> row_idx
+        self.by_user = {}        # user_id -> [row_idx, ...]
+        self.last_row = 1        # header row
+        self.removed = []        # sorted row_idx of rows moved out of the sheet
+        self.loaded = False
+        self.synced_at = 0.0
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self.listeners = []
+
+    # ─── Loading ───
+    def load(self):
+        values = self.worksheet.get_all_values()
+        metrics.count_rows(len(values))
+        with self._lock:
+            self.header = list(self.columns or (values[0] if values else []))
+            self.rows, self.by_dialogue, self.by_user = {}, {}, {}
+            # New rows are numbered after every row_idx ever used, moved out or not
+            self.last_row = max([1] + self.removed)
+            for row_idx, row_values in zip(row_indexes(self.removed), values[1:]):
+                self._put(row_idx, row_values)
+            self.loaded = True
+            self.synced_at = time.monotonic()
+        logging.info(f"Row store loaded {len(self.rows)} rows")
+
+    def refresh(self):
+        """Fetch only the rows appended below ``last_row`` since the last sync."""
+        last_col = rowcol_to_a1(1, max(len(self.header), 1)).rstrip("0123456789")
+        start = self.last_row + 1
+        values = self.worksheet.get(f"A{start - len(self.removed)}:{last_col}")
+        metrics.count_rows(len(values))
+        with self._lock:
+            for offset, row_values in enumerate(values):
+                # Skip rows the bot appended itself while the read was in flight
+                if start + offset not in self.rows:
+                    self._put(start + offset, row_values)
+            self.synced_at = time.monotonic()
+
+    def sync(self):
+        """Load on first use, then refresh incrementally at most every ``refresh_interval`` seconds."""
+        with self._sync_lock:
+            if not self.loaded:
+                self.load()
+            elif time.monotonic() - self.synced_at >= self.refresh_interval:
+                self.refresh()
+
+    def reload(self, removed=None):
+        """Load from scratch once any sync in progress is done; ``removed()`` is called first for the rows moved out."""
+        with self._sync_lock:
+            if removed:
+                self.removed = sorted(removed())
+            self.load()
+
+    def paused(self):
+        """Hold off syncs while rows are deleted from the sheet: ``with store.paused(): ...``."""
+        return self._sync_lock
+
+    def is_stale(self) -> bool:
+        return not self.loaded or time.monotonic() - self.synced_at >= self.refresh_interval
+
+    # ─── Lookups ───
+    def get(self, row_idx: int):
+        return self.rows.get(row_idx)
+
+    def find_dialogue(self, dialogue_id):
+        """Return ``(row_idx, record)`` for a dialogue ID, or ``None``."""
+        row_idx = self.by_dialogue.get(str(dialogue_id))
+        return (row_idx, self.rows[row_idx]) if row_idx else None
+
+    def rows_for_user(self, user_id):
+        with self._lock:
+            return [(idx, self.rows[idx]) for idx in self.by_user.get(str(user_id), [])]
+
+    def records(self):
+        """All ``(row_idx, record)`` pairs in sheet order."""
+        with self._lock:
+            return sorted(self.rows.items())
+
+    def sheet_row(self, row_idx: int):
+        """The sheet row ``row_idx`` is on now, or ``None`` if it was moved out."""
+        above = bisect.bisect_left(self.removed, row_idx)
+        if above < len(self.removed) and self.removed[above] == row_idx:
+            return None
+        return row_idx - above
+
+    # ─── Applying the bot's own writes ───
+    def apply_update(self, row_idx: int, col: int, value):
+        with self._lock:
+            record = self.rows.get(row_idx)
+            if record is None or col > len(self.header):
+                return
+            self._unindex(row_idx, record)
+            record[self.header[col - 1]] = "" if value is None else str(value)
+            self._index(row_idx, record)
+            self._notify(row_idx, record)
+
+    def apply_append(self, values) -> int:
+        with self._lock:
+            row_idx = self.last_row + 1
+            self._put(row_idx, values)
+            return row_idx
+
+    # ─── Moving rows out of the sheet ───
+    def detach(self, row_indexes) -> dict:
+        """Take rows out of the store (listeners aren't told) and return them; the sheet still has them."""
+        detached = {}
+        with self._lock:
+            for row_idx in row_indexes:
+                record = self.rows.pop(row_idx, None)
+                if record is not None:
+                    self._unindex(row_idx, record)
+                    detached[row_idx] = record
+        return detached
+
+    def attach(self, records: dict):
+        """Put back rows ``detach`` took, when moving them didn't happen."""
+        with self._lock:
+            for row_idx, record in records.items():
+                self.rows[row_idx] = record
+                self._index(row_idx, record)
+
+    def mark_removed(self, row_indexes):
+        """The rows were deleted from the sheet, so the rows below them moved up."""
+        with self._lock:
+            self.removed = sorted(set(self.removed).union(row_indexes))
+
+    # ─── Internals ───
+    def _put(self, row_idx: int, row_values):
+        values = [str(v) for v in row_values] + [""] * (len(self.header) - len(row_values))
+        record = dict(zip(self.header, values))
+        old = self.rows.get(row_idx)
+        if old is not None:
+            self._unindex(row_idx, old)
+        self.rows[row_idx] = record
+        self._index(row_idx, record)
+        self.last_row = max(self.last_row, row_idx)
+        self._notify(row_idx, record)
+
+    def _notify(self, row_idx: int, record: dict):
+        for listener in self.listeners:
+            listener(row_idx, record)
+
+    def _index(self, row_idx: int, record: dict):
+        if record.get("dialogue_id"):
+            self.by_dialogue[record["dialogue_id"]] = row_idx
+        if record.get("user_id"):
+            self.by_user.setdefault(record["user_id"], []).append(row_idx)
+
+    def _unindex(self, row_idx: int, record: dict):
+        if self.by_dialogue.get(record.get("dialogue_id")) == row_idx:
+            del self.by_dialogue[record["dialogue_id"]]
+        user_rows = self.by_user.get(record.get("user_id"))
+        if user_rows and row_idx in user_rows:
+            user_rows.remove(row_idx)
+
+
+def row_indexes(removed, sheet_row: int = 2):
+    """``row_idx`` of each sheet row from ``sheet_row`` down, given the ``row_idx``es moved out of the sheet."""
+    removed = set(removed)
+    kept = (row_idx for row_idx in itertools.count(2) if row_idx not in removed)
+    return itertools.islice(kept, sheet_row - 2, None)
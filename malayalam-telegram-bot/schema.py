@@ -0,0 +1,62 @@
+import zlib
+
+# Column layout of the dialogue sheet, in sheet order (column 1 first)
+COLUMNS = [
+    "user_id",
+    "username",
+    "utterance",
+    "timestamp",
+    "dialogue_id",
+    "intent",
+    "emotion",
+    "topic",
+    "reviewer_id",
+    "status",
+    "comment",
+    "consent",
+    "annotator_id",
+]
+
+ANNOTATION_FIELDS = ("intent", "emotion", "topic")
+
+# Choices offered for each annotation field, in button order
+ANNOTATION_OPTIONS = {
+    "intent": ["request_info", "question", "greeting", "complaint", "feedback"],
+    "emotion": ["neutral", "happy", "sad", "angry", "confused"],
+    "topic": ["internet", "customer_support", "billing", "technical", "general"],
+}
+
+# Column layout of the consent worksheet
+CONSENT_COLUMNS = ["user_id", "consent", "timestamp"]
+
+# Column layout of the archive directory: where each archived dialogue went, and the row it left
+ARCHIVE_DIRECTORY_COLUMNS = ["dialogue_id", "row_idx", "worksheet"]
+
+
+def col(field: str) -> int:
+    """1-based sheet column of ``field``."""
+    return COLUMNS.index(field) + 1
+
+
+def to_row(record: dict) -> list:
+    """Record dict → list of cell values in sheet order, without trailing blanks."""
+    values = ["" if record.get(field) is None else str(record.get(field)) for field in COLUMNS]
+    while values and values[-1] == "":
+        values.pop()
+    return values
+
+
+def version(record: dict) -> str:
+    """Short content hash of a row; it changes whenever any of its cells does."""
+    data = "\x1f".join("" if record.get(field) is None else str(record.get(field)) for field in COLUMNS)
+    return base36(zlib.crc32(data.encode()))
+
+
+def base36(n: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    text = ""
+    while True:
+        n, digit = divmod(n, 36)
+        text = digits[digit] + text
+        if not n:
+            return text
@@ -0,0 +1,77 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+from sheets_scheduler import SheetsScheduler, INTERACTIVE
+
+
+class SheetsGateway:
+    """Async facade over a gspread worksheet.
+
+    Every blocking gspread call runs on a small, bounded thread pool so a slow
+    Sheets round trip never stalls the bot's event loop. Calls that exceed
+    ``timeout`` raise ``asyncio.TimeoutError``. A call still waiting for quota
+    or a free thread when it times out (or the awaiting task is cancelled)
+    never runs; one already running can't be stopped: it finishes on its
+    thread, so a timed-out write may still land (see ``WriteBuffer``).
+
+    All calls go through a ``SheetsScheduler`` that paces them to the API
+    quota, retries transient errors and serves ``INTERACTIVE`` calls before
+    ``BACKGROUND`` ones; ``timeout`` covers queueing and retries too.
+    """
+
+    def __init__(self, worksheet, max_workers: int = 4, timeout: float = 20, **scheduler_options):
+        self.worksheet = worksheet
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sheets")
+        self.scheduler = SheetsScheduler(self.executor, **scheduler_options)
+
+    async def run(self, func, *args, timeout: float = None, priority: int = INTERACTIVE,
+                  idempotent: bool = True, **kwargs):
+        """Run ``func(*args, **kwargs)`` on the pool and await its result."""
+        call = functools.partial(func, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(
+                self.scheduler.submit(call, priority=priority, idempotent=idempotent), timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            logging.warning(f"Sheets call {getattr(func, '__name__', func)} timed out after {timeout or self.timeout}s")
+            raise
+        finally:
+            metrics.sheets_wait_seconds.observe(
+                time.perf_counter() - started, method=getattr(func, "__name__", "call"), priority=priority
+            )
+
+    # ─── Worksheet calls used by the handlers ───
+    def queue_depth(self) -> int:
+        return self.scheduler.depth()
+
+    async def append_row(self, values, **kwargs):
+        return await self.run(self.worksheet.append_row, values, idempotent=False, **kwargs)
+
+    async def append_rows(self, rows, **kwargs):
+        return await self.run(self.worksheet.append_rows, rows, idempotent=False, **kwargs)
+
+    async def batch_update(self, data, **kwargs):
+        return await self.run(self.worksheet.batch_update, data, **kwargs)
+
+    async def update_cell(self, row: int, col: int, value):
+        return await self.run(self.worksheet.update_cell, row, col, value)
+
+    async def cell(self, row: int, col: int):
+        return await self.run(self.worksheet.cell, row, col)
+
+    async def get_all_records(self, **kwargs):
+        return await self.run(self.worksheet.get_all_records, **kwargs)
+
+    async def col_values(self, col: int):
+        return await self.run(self.worksheet.col_values, col)
+
+    def shutdown(self):
+        # Let in-flight writes finish, drop anything still queued
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,155 @@
+import asyncio
+import itertools
+import logging
+import random
+import threading
+import time
+
+import requests
+from gspread.exceptions import APIError
+
+import metrics
+
+# Priority classes: lower runs first
+INTERACTIVE = 0   # writes and reads a user is waiting on
+BACKGROUND = 1    # refreshes, mirroring, exports
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def status_code(error: Exception):
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+
+def is_retryable(error: Exception, idempotent: bool = True) -> bool:
+    # A 429 was rejected before doing anything; other failures may have been applied
+    if isinstance(error, APIError) and status_code(error) == 429:
+        return True
+    if not idempotent:
+        return False
+    if isinstance(error, APIError):
+        return status_code(error) in RETRYABLE_STATUS
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def retry_after(error: Exception):
+    """Seconds the server asked us to wait, if it said so."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Allows ``rate_per_minute`` requests per minute with bursts of up to ``burst``."""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def take(self):
+        self._refill()
+        while self.tokens < 1:
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= 1
+
+    def penalize(self, seconds: float):
+        """Drain the bucket so nothing else goes out for ``seconds`` (after a 429)."""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class SheetsScheduler:
+    """Paces Sheets calls to the API quota and retries transient failures.
+
+    Calls wait in a priority queue; a single dispatcher takes one token from
+    the bucket per call, so interactive calls overtake queued background
+    ones whenever the quota is the bottleneck. Calls failing with 429/5xx or
+    a connection error are re-queued after exponential backoff with full
+    jitter (or the server's ``Retry-After``), up to ``max_retries`` times.
+    Non-idempotent calls (appends) are only retried after a 429.
+    """
+
+    def __init__(self, executor, rate_per_minute: float = 60, burst: int = 10, max_retries: int = 5,
+                 base_delay: float = 1, max_delay: float = 32, warn_depth: int = 50):
+        self.executor = executor
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.warn_depth = warn_depth
+        self.retries = 0
+        self._queue = None
+        self._dispatcher = None
+        self._running = set()
+        self._seq = itertools.count()
+
+    def depth(self) -> int:
+        """Calls waiting for a token (not counting ones running or backing off)."""
+        return self._queue.qsize() if self._queue else 0
+
+    async def submit(self, func, priority: int = INTERACTIVE, idempotent: bool = True):
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._queue = self._queue or asyncio.PriorityQueue()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        future = loop.create_future()
+        self._enqueue(priority, (func, idempotent), future, attempt=0)
+        return await future
+
+    def _enqueue(self, priority, call, future, attempt):
+        self._queue.put_nowait((priority, next(self._seq), call, future, attempt))
+        if self.depth() == self.warn_depth:
+            logging.warning(f"Sheets request queue is {self.warn_depth} deep; responses will be delayed")
+
+    async def _dispatch(self):
+        while True:
+            priority, _, call, future, attempt = await self._queue.get()
+            if future.done():   # caller timed out or was cancelled while queued
+                continue
+            await self.bucket.take()
+            task = asyncio.create_task(self._execute(priority, call, future, attempt))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _execute(self, priority, call, future, attempt):
+        loop = asyncio.get_running_loop()
+        func, idempotent = call
+        name = getattr(func, "func", func).__name__
+        # A caller that gave up while the call waited for a thread shouldn't have it run; one already running finishes
+        abandoned = threading.Event()
+        future.add_done_callback(lambda _: abandoned.set())
+
+        def run():
+            if abandoned.is_set():
+                return None
+            return metrics.timed_sheets_call(name, func)
+
+        try:
+            result = await loop.run_in_executor(self.executor, run)
+        except Exception as e:
+            if future.done():
+                return
+            if attempt < self.max_retries and is_retryable(e, idempotent):
+                delay = retry_after(e) or random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if status_code(e) == 429:
+                    self.bucket.penalize(delay)
+                self.retries += 1
+                logging.warning(f"Sheets call {name} failed ({e}); retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                if not future.done():
+                    self._enqueue(priority, call, future, attempt + 1)
+            else:
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
@@ -0,0 +1,366 @@
+import asyncio
+import contextlib
+import datetime
+import logging
+import sqlite3
+import threading
+
+from gspread.utils import rowcol_to_a1, ValueInputOption
+
+import schema
+from sheets_scheduler import BACKGROUND
+from storage import Storage, ensure_header
+
+
+class SQLiteStorage(Storage):
+    """Local SQLite database as the primary dialogue store.
+
+    ``row_idx`` is the integer primary key and matches the row the dialogue
+    occupies in the Google Sheet mirror. Each update bumps the row's
+    ``revision``; ``SheetsMirror`` pushes rows whose ``mirrored_revision``
+    lags behind.
+
+    Several bot processes may share the database (multi-worker mode): row
+    numbers and version checks are taken inside ``BEGIN IMMEDIATE``
+    transactions, and ``reread`` passes rows written elsewhere to listeners.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.listeners = []
+        self._lock = threading.RLock()
+        self._depth = 0          # nesting of _transaction
+        self._notes = []         # (row_idx, record) to tell listeners once the transaction commits
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The database connection, opened (and the tables created) on first use rather than at import."""
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+                    conn.row_factory = sqlite3.Row
+                    self._create_tables(conn)
+                    self._conn = conn
+        return self._conn
+
+    def _create_tables(self, conn):
+        columns = ",\n".join(f"    {field} TEXT NOT NULL DEFAULT ''" for field in schema.COLUMNS)
+        conn.executescript(f"""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS dialogues (
+                row_idx INTEGER PRIMARY KEY,
+            {columns},
+                revision INTEGER NOT NULL DEFAULT 1,
+                mirrored_revision INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS dialogues_dialogue_id ON dialogues (dialogue_id);
+            CREATE INDEX IF NOT EXISTS dialogues_user_id ON dialogues (user_id);
+            CREATE INDEX IF NOT EXISTS dialogues_unmirrored ON dialogues (row_idx) WHERE revision > mirrored_revision;
+            CREATE TABLE IF NOT EXISTS consents (
+                user_id TEXT PRIMARY KEY,
+                timestamp TEXT NOT NULL DEFAULT '',
+                mirrored INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        # Columns added to the schema after the table was created
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(dialogues)")}
+        for field in schema.COLUMNS:
+            if field not in existing:
+                conn.execute(f"ALTER TABLE dialogues ADD COLUMN {field} TEXT NOT NULL DEFAULT ''")
+
+    # ─── Storage interface ───
+    async def start(self):
+        for row_idx, record in self.records():
+            self._notify(row_idx, record)
+
+    async def sync(self):
+        # Reads always hit the database; rows other workers write reach listeners through reread
+        pass
+
+    def reread(self, row_indexes):
+        """Tell listeners about rows another process changed, read fresh from the database."""
+        for row_idx in row_indexes:
+            record = self.get(row_idx)
+            if record is not None:
+                self._notify(row_idx, record)
+
+    def get(self, row_idx: int):
+        row = self._query_one("SELECT * FROM dialogues WHERE row_idx = ?", (row_idx,))
+        return self._record(row) if row else None
+
+    def find_dialogue(self, dialogue_id):
+        # Latest row wins if an ID was ever duplicated, like RowStore
+        row = self._query_one(
+            "SELECT * FROM dialogues WHERE dialogue_id = ? ORDER BY row_idx DESC LIMIT 1", (str(dialogue_id),)
+        )
+        return (row["row_idx"], self._record(row)) if row else None
+
+    def rows_for_user(self, user_id):
+        rows = self._query("SELECT * FROM dialogues WHERE user_id = ? ORDER BY row_idx", (str(user_id),))
+        return [(row["row_idx"], self._record(row)) for row in rows]
+
+    def records(self):
+        return [(row["row_idx"], self._record(row)) for row in self._query("SELECT * FROM dialogues ORDER BY row_idx")]
+
+    def dialogue_ids(self):
+        return [row[0] for row in self._query("SELECT dialogue_id FROM dialogues WHERE dialogue_id != ''")]
+
+    def add_dialogue(self, record: dict) -> int:
+        fields = [field for field in schema.COLUMNS if record.get(field) not in (None, "")]
+        with self._transaction():
+            row_idx = self._query_one("SELECT COALESCE(MAX(row_idx), 1) + 1 FROM dialogues")[0]
+            self.conn.execute(
+                f"INSERT INTO dialogues (row_idx, {', '.join(fields)}) VALUES (?{', ?' * len(fields)})",
+                [row_idx] + [str(record[field]) for field in fields],
+            )
+            self._notify(row_idx, self.get(row_idx))
+        return row_idx
+
+    def add_dialogues(self, records) -> list:
+        records = list(records)
+        placeholders = ", ".join("?" * (len(schema.COLUMNS) + 1))
+        with self._transaction():
+            first = self._query_one("SELECT COALESCE(MAX(row_idx), 1) + 1 FROM dialogues")[0]
+            row_indexes = list(range(first, first + len(records)))
+            self.conn.executemany(
+                f"INSERT INTO dialogues (row_idx, {', '.join(schema.COLUMNS)}) VALUES ({placeholders})",
+                [
+                    [row_idx] + ["" if record.get(field) is None else str(record[field]) for field in schema.COLUMNS]
+                    for row_idx, record in zip(row_indexes, records)
+                ],
+            )
+            for row_idx in row_indexes:
+                self._notify(row_idx, self.get(row_idx))
+        return row_indexes
+
+    def update(self, row_idx: int, **fields):
+        for field in fields:
+            schema.col(field)  # unknown field → ValueError, never reaches the SQL
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        with self._lock:
+            self.conn.execute(
+                f"UPDATE dialogues SET {assignments}, revision = revision + 1 WHERE row_idx = ?",
+                ["" if value is None else str(value) for value in fields.values()] + [row_idx],
+            )
+        record = self.get(row_idx)
+        if record is not None:
+            self._notify(row_idx, record)
+
+    def update_if(self, row_idx: int, version: str, **fields) -> bool:
+        # Check and write in one transaction, so no other write (from any process) slips in between
+        with self._transaction():
+            return super().update_if(row_idx, version, **fields)
+
+    def update_rows_if(self, updates) -> list:
+        # One transaction, so a batch review is a single commit
+        with self._transaction():
+            return super().update_rows_if(updates)
+
+    async def load_consents(self) -> set:
+        with self._transaction():
+            # Consent used to be kept in the dialogue rows; copy it over once, then drop the consent-only rows
+            self.conn.execute(
+                "INSERT OR IGNORE INTO consents (user_id) "
+                "SELECT DISTINCT user_id FROM dialogues WHERE user_id != '' AND lower(consent) = 'yes'"
+            )
+            deleted = self.conn.execute("DELETE FROM dialogues WHERE dialogue_id = '' AND lower(consent) = 'yes'").rowcount
+        if deleted:
+            logging.info(f"Deleted {deleted} consent rows from the dialogues table")
+        return {row[0] for row in self._query("SELECT user_id FROM consents")}
+
+    async def save_consent(self, user_id: str):
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self.conn.execute("INSERT OR IGNORE INTO consents (user_id, timestamp) VALUES (?, ?)", (user_id, timestamp))
+
+    async def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ─── Mirror support ───
+    def is_empty(self) -> bool:
+        return self._query_one("SELECT 1 FROM dialogues LIMIT 1") is None
+
+    def import_rows(self, sheet_values, consent_values=()):
+        """Bulk-load a sheet's values (header row first) as already mirrored rows."""
+        placeholders = ", ".join("?" * (len(schema.COLUMNS) + 1))
+        rows = []
+        for row_idx, values in enumerate(sheet_values[1:], start=2):
+            if any(values):
+                values = [str(v) for v in values[:len(schema.COLUMNS)]]
+                rows.append([row_idx] + values + [""] * (len(schema.COLUMNS) - len(values)))
+        with self._lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                f"INSERT INTO dialogues (row_idx, {', '.join(schema.COLUMNS)}) VALUES ({placeholders})", rows
+            )
+            self.conn.execute("UPDATE dialogues SET mirrored_revision = revision")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO consents (user_id, timestamp, mirrored) VALUES (?, ?, 1)",
+                [(row[0], row[2] if len(row) > 2 else "") for row in consent_values[1:]
+                 if len(row) > 1 and row[1].lower() == "yes"],
+            )
+            self.conn.execute("COMMIT")
+        logging.info(f"Imported {len(rows)} rows from the sheet into {self.path}")
+
+    def unmirrored_rows(self, limit: int = 500):
+        rows = self._query(
+            "SELECT * FROM dialogues WHERE revision > mirrored_revision ORDER BY row_idx LIMIT ?", (limit,)
+        )
+        return [(row["row_idx"], row["revision"], self._record(row)) for row in rows]
+
+    def mark_mirrored(self, revisions):
+        """``revisions`` is ``[(row_idx, revision), ...]`` as returned by ``unmirrored_rows``."""
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE dialogues SET mirrored_revision = ? WHERE row_idx = ? AND mirrored_revision < ?",
+                [(revision, row_idx, revision) for row_idx, revision in revisions],
+            )
+
+    def unmirrored_consents(self):
+        return [tuple(row) for row in self._query("SELECT user_id, timestamp FROM consents WHERE mirrored = 0")]
+
+    def mark_consents_mirrored(self, user_ids):
+        with self._lock:
+            self.conn.executemany("UPDATE consents SET mirrored = 1 WHERE user_id = ?", [(u,) for u in user_ids])
+
+    # ─── Internals ───
+    @contextlib.contextmanager
+    def _transaction(self):
+        """``BEGIN IMMEDIATE`` … ``COMMIT``, nestable; listeners hear about the writes once the outermost one commits.
+
+        IMMEDIATE takes the database's write lock up front, so reading the
+        next row number or a row's version and writing on it is atomic
+        against other processes too.
+        """
+        with self._lock:
+            outermost = self._depth == 0
+            if outermost:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if outermost:
+                    self.conn.execute("ROLLBACK")
+                    self._notes = []
+                raise
+            self._depth -= 1
+            if not outermost:
+                return
+            self.conn.execute("COMMIT")
+            notes, self._notes = self._notes, []
+        for row_idx, record in notes:
+            self._notify(row_idx, record)
+
+    def _query(self, sql: str, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _query_one(self, sql: str, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    @staticmethod
+    def _record(row) -> dict:
+        return {field: row[field] for field in schema.COLUMNS}
+
+    def _notify(self, row_idx: int, record: dict):
+        if self._depth:
+            self._notes.append((row_idx, record))
+            return
+        for listener in self.listeners:
+            listener(row_idx, record)
+
+
+class SheetsMirror:
+    """One-way copy of a ``SQLiteStorage`` into the research team's Google Sheet.
+
+    Every ``interval`` seconds, rows changed since the last push are written
+    to their own row (whole-row ranges in one ``batch_update``) and new
+    consents are appended to the consent worksheet. Edits made directly in
+    the sheet are not read back. Nothing is archived: the dialogue sheet keeps
+    every row, since its row numbers are the database's ``row_idx``
+    (``ARCHIVE_SECONDS`` is refused with this backend).
+    """
+
+    def __init__(self, storage, gateway, worksheet, consent_worksheet, interval: float = 10):
+        self.storage = storage
+        self.gateway = gateway
+        self.worksheet = worksheet
+        self.consent_worksheet = consent_worksheet
+        self.interval = interval
+        self._task = None
+        self._push_lock = asyncio.Lock()
+
+    async def import_if_empty(self):
+        """Seed an empty database from the sheet, so switching backends keeps existing data."""
+        await self.gateway.run(ensure_header, self.worksheet)
+        if not self.storage.is_empty():
+            return
+        values = await self.gateway.run(self.worksheet.get_all_values)
+        consent_values = await self.gateway.run(self.consent_worksheet.get_all_values)
+        self.storage.import_rows(values, consent_values)
+
+    async def push(self):
+        async with self._push_lock:
+            await self._push_rows()
+            await self._push_consents()
+
+    async def _push_rows(self):
+        while True:
+            rows = self.storage.unmirrored_rows()
+            if not rows:
+                return
+            last_row = rows[-1][0]
+            if last_row > self.worksheet.row_count:
+                # batch_update can't write past the grid; grow it with some headroom
+                await self.gateway.run(
+                    self.worksheet.add_rows, last_row - self.worksheet.row_count + 500, priority=BACKGROUND
+                )
+            last_col = len(schema.COLUMNS)
+            data = [
+                {
+                    "range": f"{rowcol_to_a1(row_idx, 1)}:{rowcol_to_a1(row_idx, last_col)}",
+                    "values": [[record[field] for field in schema.COLUMNS]],
+                }
+                for row_idx, _, record in rows
+            ]
+            await self.gateway.batch_update(data, value_input_option=ValueInputOption.raw, priority=BACKGROUND)
+            self.storage.mark_mirrored([(row_idx, revision) for row_idx, revision, _ in rows])
+
+    async def _push_consents(self):
+        consents = self.storage.unmirrored_consents()
+        if consents:
+            await self.gateway.run(
+                self.consent_worksheet.append_rows,
+                [[user_id, "yes", timestamp] for user_id, timestamp in consents],
+                priority=BACKGROUND,
+                idempotent=False,
+            )
+            self.storage.mark_consents_mirrored([user_id for user_id, _ in consents])
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.push()
+            except Exception as e:
+                logging.error(f"Error mirroring to Google Sheets: {e}")
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        try:
+            await self.push()
+        except Exception as e:
+            logging.error(f"Error in final mirror push: {e}")
@@ -0,0 +1,235 @@
+import datetime
+import logging
+
+from gspread.utils import rowcol_to_a1
+
+from gspread.exceptions import APIError
+
+import schema
+from archive import append_cells, delete_rows
+from sheets_scheduler import BACKGROUND
+from row_store import RowStore
+from write_buffer import WriteBuffer
+
+
+def ensure_header(worksheet):
+    """Fill in header cells for columns the sheet doesn't label yet (blocking)."""
+    header = worksheet.row_values(1)
+    if len(header) >= len(schema.COLUMNS):
+        return
+    if worksheet.col_count < len(schema.COLUMNS):
+        worksheet.add_cols(len(schema.COLUMNS) - worksheet.col_count)
+    start = len(header) + 1
+    worksheet.update(
+        f"{rowcol_to_a1(1, start)}:{rowcol_to_a1(1, len(schema.COLUMNS))}",
+        [schema.COLUMNS[start - 1:]],
+    )
+
+
+class Storage:
+    """What the handlers need from the dialogue store.
+
+    Rows are addressed by ``row_idx``, the row number the dialogue has (or
+    will have) in the Google Sheet, and returned as ``{field: str}`` records
+    keyed by ``schema.COLUMNS``. Reads never block; writes return immediately
+    and reach durable storage as the backend sees fit, so anything that may
+    touch the network is ``async``. ``listeners`` are called as
+    ``listener(row_idx, record)`` for every row loaded or changed.
+    """
+
+    listeners: list
+
+    async def start(self):
+        """Load existing rows (notifying listeners) before the bot takes updates."""
+        raise NotImplementedError
+
+    async def sync(self):
+        """Pick up rows written by someone else, if the backend can have any."""
+        raise NotImplementedError
+
+    def get(self, row_idx: int):
+        raise NotImplementedError
+
+    def find_dialogue(self, dialogue_id):
+        """Return ``(row_idx, record)`` for a dialogue ID, or ``None``."""
+        raise NotImplementedError
+
+    def rows_for_user(self, user_id):
+        raise NotImplementedError
+
+    def records(self):
+        """All ``(row_idx, record)`` pairs in row order."""
+        raise NotImplementedError
+
+    def dialogue_ids(self):
+        raise NotImplementedError
+
+    def add_dialogue(self, record: dict) -> int:
+        """Store a new row and return its ``row_idx``."""
+        raise NotImplementedError
+
+    def add_dialogues(self, records) -> list:
+        """Store several new rows in one write and return their ``row_idx``es."""
+        return [self.add_dialogue(record) for record in records]
+
+    def update(self, row_idx: int, **fields):
+        raise NotImplementedError
+
+    def update_if(self, row_idx: int, version: str, **fields) -> bool:
+        """``update`` only if the row is still at ``version`` (``schema.version``); ``False`` if it changed."""
+        record = self.get(row_idx)
+        if record is None or schema.version(record) != version:
+            return False
+        self.update(row_idx, **fields)
+        return True
+
+    def update_rows_if(self, updates) -> list:
+        """``update_if`` for each ``(row_idx, version, fields)`` as one write; returns which rows were updated."""
+        return [self.update_if(row_idx, version, **fields) for row_idx, version, fields in updates]
+
+    async def load_consents(self) -> set:
+        raise NotImplementedError
+
+    async def save_consent(self, user_id: str):
+        raise NotImplementedError
+
+    async def flush(self):
+        """Push anything still buffered."""
+
+    async def close(self):
+        await self.flush()
+
+
+class SheetsStorage(Storage):
+    """The Google Sheet itself as the store, read through ``RowStore`` and written through ``WriteBuffer``.
+
+    The dialogue sheet only holds the working set: finished rows are moved
+    to ``archive`` worksheets (see ``archive.Archiver``). Lookups fall back
+    to the archive, so callers don't see the difference, except that
+    archived rows are read-only.
+    """
+
+    def __init__(self, gateway, worksheet, consent_worksheet, archive, refresh_interval: float = 60,
+                 flush_interval: float = 2, max_pending: int = 50):
+        self.gateway = gateway
+        self.consent_worksheet = consent_worksheet
+        self.archive = archive
+        self.rows = RowStore(worksheet, refresh_interval=refresh_interval, columns=schema.COLUMNS)
+        self.write_buffer = WriteBuffer(gateway, self.rows, flush_interval=flush_interval, max_pending=max_pending)
+        self.listeners = self.rows.listeners
+
+    async def start(self):
+        await self.gateway.run(ensure_header, self.rows.worksheet)
+        # The directory says which rows left the sheet, so it is read before the sheet is numbered
+        await self.gateway.run(self.archive.load)
+        self.rows.removed = list(self.archive.moved)
+        await self.gateway.run(self.rows.sync)
+        for row_idx, record in self.archive.records():
+            for listener in self.listeners:
+                listener(row_idx, record)
+
+    async def sync(self):
+        if self.rows.is_stale():
+            await self.gateway.run(self.rows.sync, priority=BACKGROUND)
+
+    async def reload(self):
+        """Read the archive and the sheet again from scratch, e.g. after a move whose outcome is unknown."""
+        await self.gateway.run(self.rows.reload, self._load_archive, priority=BACKGROUND)
+
+    def _load_archive(self):
+        self.archive.load()
+        return self.archive.moved
+
+    def get(self, row_idx: int):
+        record = self.rows.get(row_idx)
+        return record if record is not None else self.archive.get(row_idx)
+
+    def find_dialogue(self, dialogue_id):
+        return self.rows.find_dialogue(dialogue_id) or self.archive.find_dialogue(dialogue_id)
+
+    def rows_for_user(self, user_id):
+        return sorted(self.rows.rows_for_user(user_id) + self.archive.rows_for_user(user_id), key=lambda row: row[0])
+
+    def records(self):
+        return sorted(self.rows.records() + self.archive.records(), key=lambda row: row[0])
+
+    def dialogue_ids(self):
+        return list(self.rows.by_dialogue) + self.archive.dialogue_ids()
+
+    def add_dialogue(self, record: dict) -> int:
+        return self.write_buffer.append_row(schema.to_row(record))
+
+    def add_dialogues(self, records) -> list:
+        return self.write_buffer.append_rows([schema.to_row(record) for record in records])
+
+    def update(self, row_idx: int, **fields):
+        if self.rows.get(row_idx) is None and self.archive.get(row_idx) is not None:
+            logging.warning(f"Not updating row {row_idx}: it was moved to the archive")
+            return
+        self.write_buffer.update_cells(row_idx, {schema.col(field): value for field, value in fields.items()})
+
+    def update_if(self, row_idx: int, version: str, **fields) -> bool:
+        # Archived rows are read-only
+        return self.rows.get(row_idx) is not None and super().update_if(row_idx, version, **fields)
+
+    async def load_consents(self) -> set:
+        await self.sync()
+        users = await self.gateway.run(self._load_consents)
+        try:
+            await self._drop_consent_rows()
+        except Exception as e:
+            logging.error(f"Error deleting consent rows from the dialogue sheet: {e}")
+        return users
+
+    async def _drop_consent_rows(self):
+        """Delete the legacy consent-only rows (no dialogue, consent "yes") once the registry has them."""
+        async with self.write_buffer.exclusive():
+            records = self.rows.detach([
+                row_idx for row_idx, record in self.rows.records()
+                if not record.get("dialogue_id") and record.get("consent", "").lower() == "yes"
+            ])
+            if not records:
+                return
+            try:
+                await self.gateway.run(self._delete_rows, records, priority=BACKGROUND, idempotent=False)
+            except APIError:
+                self.rows.attach(records)
+                raise
+            except Exception:
+                # The delete may or may not have happened; believe the sheet
+                await self.reload()
+                raise
+        logging.info(f"Deleted {len(records)} consent rows from the dialogue sheet")
+
+    def _delete_rows(self, records: dict):
+        """Blocking: delete rows from the sheet and list their row_idx in the archive directory, in one batchUpdate.
+
+        Listed without a dialogue or worksheet, the rows are skipped like
+        archived ones when the sheet is numbered, so no row_idx changes.
+        """
+        with self.rows.paused():
+            requests = [append_cells(self.archive.directory.id, [["", str(row_idx), ""] for row_idx in sorted(records)])]
+            requests += delete_rows(self.rows.worksheet.id, [self.rows.sheet_row(row_idx) for row_idx in records])
+            self.rows.worksheet.spreadsheet.batch_update({"requests": requests})
+            self.rows.mark_removed(records)
+            self.archive.moved = sorted(set(self.archive.moved).union(records))
+
+    def _load_consents(self) -> set:
+        values = self.consent_worksheet.get_all_values()
+        users = {row[0] for row in values[1:] if len(row) > 1 and row[1].lower() == "yes"}
+        # Consent used to be kept in column 12 of the dialogue sheet; copy it over once
+        legacy = {
+            r["user_id"] for _, r in self.records()
+            if r.get("user_id") and r.get("consent", "").lower() == "yes"
+        } - users
+        if legacy:
+            self.consent_worksheet.append_rows([[user_id, "yes", ""] for user_id in sorted(legacy)])
+            logging.info(f"Migrated consent for {len(legacy)} users from the dialogue sheet")
+        return users | legacy
+
+    async def save_consent(self, user_id: str):
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        await self.gateway.run(self.consent_worksheet.append_row, [user_id, "yes", timestamp], idempotent=False)
+
+    async def flush(self):
+        await self.write_buffer.flush()
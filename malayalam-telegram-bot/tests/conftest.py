@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+# The bot's modules are top-level scripts, imported by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schema
+from archive import Archive
+from fake_sheets import FakeSpreadsheet, FakeWorksheet
+from sheets_gateway import SheetsGateway
+from storage import SheetsStorage
+
+
+def dialogue(dialogue_id: int, status: str = "", timestamp: str = "2024-01-05 10:00:00", **fields) -> dict:
+    """A dialogue record; annotated (and so reviewable) unless ``topic=""`` is given."""
+    record = {
+        "user_id": str(1000 + dialogue_id % 3), "username": "contributor", "utterance": f"utterance {dialogue_id}",
+        "timestamp": timestamp, "dialogue_id": str(dialogue_id),
+        "intent": "question", "emotion": "neutral", "topic": "general", "status": status,
+    }
+    record.update(fields)
+    return record
+
+
+def sheet_values(records) -> list:
+    return [list(schema.COLUMNS)] + [schema.to_row(record) for record in records]
+
+
+def open_worksheet(spreadsheet: FakeSpreadsheet):
+    def open_(title: str, header: list):
+        if title not in spreadsheet.worksheets:
+            spreadsheet.add_worksheet(title=title).append_row(header)
+        return spreadsheet.worksheet(title)
+    return open_
+
+
+def make_sheets_storage(spreadsheet: FakeSpreadsheet, gateway: SheetsGateway) -> SheetsStorage:
+    open_ = open_worksheet(spreadsheet)
+    return SheetsStorage(
+        gateway,
+        spreadsheet.sheet1,
+        open_("consent", schema.CONSENT_COLUMNS),
+        Archive(open_("archive_directory", schema.ARCHIVE_DIRECTORY_COLUMNS), open_),
+        flush_interval=0,
+    )
+
+
+@pytest.fixture
+def spreadsheet():
+    return FakeSpreadsheet(FakeWorksheet(values=[list(schema.COLUMNS)]))
+
+
+@pytest.fixture
+def gateway(spreadsheet):
+    gateway = SheetsGateway(spreadsheet.sheet1, timeout=10, rate_per_minute=6000, burst=100)
+    yield gateway
+    gateway.shutdown()
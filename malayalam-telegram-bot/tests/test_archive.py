@@ -0,0 +1,59 @@
+import asyncio
+
+import schema
+from archive import Archiver
+from conftest import dialogue, make_sheets_storage, sheet_values
+
+
+def on_sheet(spreadsheet, storage, row_idx: int) -> list:
+    """The dialogue sheet's cells on the row ``row_idx`` is on now, padded to every column."""
+    values = spreadsheet.sheet1.values[storage.rows.sheet_row(row_idx) - 1]
+    return (values + [""] * len(schema.COLUMNS))[:len(schema.COLUMNS)]
+
+
+def test_writes_after_archiving_land_on_the_moved_up_rows(spreadsheet, gateway):
+    records = [
+        dialogue(1, status="approved", timestamp="2024-01-05 10:00:00"),
+        dialogue(2),
+        dialogue(3, status="rejected", timestamp="2024-02-07 10:00:00"),
+        dialogue(4, topic=""),
+        dialogue(5),
+    ]
+    spreadsheet.sheet1.values = sheet_values(records)
+
+    async def scenario():
+        storage = make_sheets_storage(spreadsheet, gateway)
+        await storage.start()
+        archiver = Archiver(storage, gateway, settle_seconds=0)
+        assert await archiver.archive_once() == 2
+
+        # Rows 2 and 4 left the sheet; the rest moved up but kept their row_idx
+        assert [row[4] for row in spreadsheet.sheet1.values[1:]] == ["2", "4", "5"]
+        assert storage.rows.sheet_row(2) is None
+        assert storage.rows.sheet_row(5) == 3
+        assert spreadsheet.worksheet("archive_2024-01").values[1][4] == "1"
+        assert spreadsheet.worksheet("archive_2024-02").values[1][4] == "3"
+        assert spreadsheet.worksheet("archive_directory").values[1:] == [["1", "2", "archive_2024-01"], ["3", "4", "archive_2024-02"]]
+
+        # Updates and appends after the move go to the rows the dialogues are on now
+        storage.update(5, intent="greeting", emotion="sad", topic="billing")
+        storage.update(6, status="approved", reviewer_id="77")
+        new_row = storage.add_dialogue(dialogue(6, topic=""))
+        await storage.flush()
+        assert new_row == 7
+        for row_idx in (3, 5, 6, 7):
+            assert on_sheet(spreadsheet, storage, row_idx) == [storage.get(row_idx)[field] for field in schema.COLUMNS]
+        assert on_sheet(spreadsheet, storage, 5)[5:8] == ["greeting", "sad", "billing"]
+
+        # Archived rows are still found, read-only
+        row_idx, archived = storage.find_dialogue("1")
+        assert row_idx == 2 and archived["status"] == "approved"
+        assert not storage.update_if(2, schema.version(archived), comment="late")
+
+        # A restart over the same spreadsheet numbers every row as before
+        restarted = make_sheets_storage(spreadsheet, gateway)
+        await restarted.start()
+        assert restarted.records() == storage.records()
+
+    asyncio.run(scenario())
+
@@ -0,0 +1,39 @@
+import bulk
+
+
+def parse(data: bytes, parser) -> list:
+    return list(parser(bulk.open_document(data)))
+
+
+def test_text_file_skips_blank_lines_and_keeps_line_numbers():
+    data = "\ufeffനമസ്കാരം\n\n   \r\nസുഖമാണോ?  \r\nനന്ദി".encode()
+    assert parse(data, bulk.parse_text) == [(1, "നമസ്കാരം"), (4, "സുഖമാണോ?"), (5, "നന്ദി")]
+
+
+def test_csv_reads_the_named_column():
+    data = 'id,Utterance,notes\n1,"നമസ്കാരം, സുഹൃത്തേ",x\n2,,y\n3,നന്ദി\n'.encode()
+    assert parse(data, bulk.parse_csv) == [(2, "നമസ്കാരം, സുഹൃത്തേ"), (4, "നന്ദി")]
+
+
+def test_csv_without_a_known_header_uses_the_first_column():
+    data = "നമസ്കാരം,1\nസുഖമാണോ,2\n".encode()
+    assert parse(data, bulk.parse_csv) == [(1, "നമസ്കാരം"), (2, "സുഖമാണോ")]
+
+
+def test_csv_line_numbers_count_quoted_newlines():
+    data = 'text\n"ഒന്ന്\nരണ്ട്"\nമൂന്ന്\n'.encode()
+    assert parse(data, bulk.parse_csv) == [(3, "ഒന്ന്\nരണ്ട്"), (4, "മൂന്ന്")]
+
+
+def test_split_valid_rejects_with_reasons_and_stops_at_the_line_limit():
+    entries = [(1, "നമസ്കാരം"), (2, "hello"), (3, "സുഖമാണോ"), (4, "123"), (5, "നന്ദി"), (6, "വീണ്ടും")]
+    accepted, rejected, truncated = bulk.split_valid(entries, max_lines=2, chunk_size=2)
+    assert accepted == [(1, "നമസ്കാരം"), (3, "സുഖമാണോ")]
+    # Rejected lines don't count towards the limit
+    assert [line_no for line_no, _ in rejected] == [2, 4]
+    assert truncated
+
+
+def test_split_valid_at_exactly_the_limit_is_not_truncated():
+    entries = [(1, "നമസ്കാരം"), (2, "സുഖമാണോ")]
+    assert bulk.split_valid(entries, max_lines=2) == (entries, [], False)
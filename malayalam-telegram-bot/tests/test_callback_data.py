@@ -0,0 +1,63 @@
+import pytest
+
+import schema
+from callback_data import RowRef, pack, resolve, unpack
+from conftest import dialogue
+
+
+class Rows(dict):
+    """row_idx -> record, with the lookups ``resolve`` needs."""
+
+    def find_dialogue(self, dialogue_id):
+        return next(((row_idx, record) for row_idx, record in self.items() if record["dialogue_id"] == dialogue_id), None)
+
+
+def test_pack_unpack_round_trip():
+    record = dialogue(42)
+    data = pack("set_topic_customer_support", 1234, record)
+    assert len(data.encode()) <= 64
+    assert unpack(data) == ("set_topic_customer_support", RowRef(1234, "42", schema.version(record)))
+
+
+def test_unpack_leaves_older_buttons_alone():
+    assert unpack("consent_yes") == ("consent_yes", None)
+    assert unpack("approve_review") == ("approve_review", None)
+    assert unpack("a:not base36!:c:d") == ("a:not base36!:c:d", None)
+
+
+def test_pack_refuses_data_over_64_bytes():
+    with pytest.raises(ValueError):
+        pack("x" * 60, 2, dialogue(1))
+
+
+def test_resolve_finds_the_row_at_the_same_version():
+    record = dialogue(7)
+    rows = Rows({5: record})
+    _, ref = unpack(pack("approve", 5, record))
+    assert resolve(rows, ref) == (5, record)
+
+
+def test_resolve_refuses_a_changed_row():
+    record = dialogue(7)
+    rows = Rows({5: record})
+    _, ref = unpack(pack("approve", 5, record))
+    rows[5] = dict(record, intent="greeting")
+    assert resolve(rows, ref) is None
+
+
+def test_resolve_follows_a_moved_dialogue_by_id():
+    record = dialogue(7)
+    _, ref = unpack(pack("approve", 5, record))
+    # Another dialogue took row 5; ours is now on row 9
+    moved = Rows({5: dialogue(8), 9: record})
+    assert resolve(moved, ref) == (9, record)
+    # ...and if it also changed, the button is stale
+    moved[9] = dict(record, status="rejected")
+    assert resolve(moved, ref) is None
+
+
+def test_resolve_refuses_a_dialogue_that_is_gone():
+    record = dialogue(7)
+    _, ref = unpack(pack("approve", 5, record))
+    assert resolve(Rows({5: dialogue(8)}), ref) is None
+    assert resolve(Rows(), ref) is None
@@ -0,0 +1,52 @@
+import asyncio
+
+import schema
+from conftest import dialogue, make_sheets_storage, sheet_values
+from sqlite_storage import SQLiteStorage
+
+
+def placeholder(user_id: str) -> dict:
+    """The row the bot used to append just to record consent."""
+    return {"user_id": user_id, "consent": "yes"}
+
+
+def test_sheets_migration_deletes_placeholder_rows(spreadsheet, gateway):
+    spreadsheet.sheet1.values = sheet_values([
+        placeholder("501"), dialogue(1), placeholder("502"), dialogue(2, consent="yes"), dialogue(3),
+    ])
+
+    async def scenario():
+        storage = make_sheets_storage(spreadsheet, gateway)
+        await storage.start()
+        before = {row_idx: record for row_idx, record in storage.records() if record["dialogue_id"]}
+
+        users = await storage.load_consents()
+        assert users == {"501", "502", dialogue(2)["user_id"]}
+        assert sorted(row[0] for row in spreadsheet.worksheet("consent").values[1:]) == sorted(users)
+
+        # Only dialogue rows are left, and each keeps its row_idx
+        assert [row[schema.col("dialogue_id") - 1] for row in spreadsheet.sheet1.values[1:]] == ["1", "2", "3"]
+        assert {row_idx: record for row_idx, record in storage.records()} == before
+        storage.update(6, topic="billing")
+        await storage.flush()
+        assert spreadsheet.sheet1.values[3][schema.col("topic") - 1] == "billing"
+
+        # Nothing left to migrate or delete the next time, and a restart numbers rows the same way
+        assert await storage.load_consents() == users
+        assert len(spreadsheet.worksheet("consent").values) == 1 + len(users)
+        restarted = make_sheets_storage(spreadsheet, gateway)
+        await restarted.start()
+        assert restarted.records() == storage.records()
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_migration_deletes_placeholder_rows():
+    storage = SQLiteStorage(":memory:")
+    storage.import_rows(sheet_values([placeholder("501"), dialogue(1), placeholder("502"), dialogue(2, consent="yes")]))
+
+    users = asyncio.run(storage.load_consents())
+
+    assert users == {"501", "502", dialogue(2)["user_id"]}
+    assert [row_idx for row_idx, _ in storage.records()] == [3, 5]
+    assert {user_id for user_id, _ in storage.unmirrored_consents()} == users
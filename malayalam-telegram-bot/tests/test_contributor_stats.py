@@ -0,0 +1,54 @@
+import random
+
+from contributor_stats import TOP_SIZE, ContributorStats
+
+
+def ranked_totals(stats: ContributorStats, limit: int) -> list:
+    scores = stats.submissions + stats.annotations + stats.approved + stats.rejected
+    return sorted(scores.values(), reverse=True)[:limit]
+
+
+def test_leaderboard_follows_changed_rows():
+    rng = random.Random(0)
+    stats = ContributorStats()
+    users = [str(user_id) for user_id in range(3 * TOP_SIZE)]
+    for step in range(3000):
+        record = {"dialogue_id": str(step), "user_id": rng.choice(users)}
+        if rng.random() < 0.6:
+            record.update(topic="general", annotator_id=rng.choice(users))
+        if rng.random() < 0.4:
+            record.update(reviewer_id=rng.choice(users), status=rng.choice(["approved", "rejected", ""]))
+        # Rewriting earlier rows moves counts between users, so top scores fall too
+        stats.observe(rng.randrange(500), record)
+        if step % 50 == 0:
+            for limit in (1, 10, TOP_SIZE, TOP_SIZE + 5):
+                top = stats.leaderboard(limit)
+                assert [total for _, total in top] == ranked_totals(stats, limit)
+                assert all(stats.totals[user_id] == total for user_id, total in top)
+
+
+def test_leaderboard_leaves_out_users_without_contributions():
+    stats = ContributorStats()
+    stats.observe(2, {"dialogue_id": "1", "user_id": "5"})
+    stats.observe(2, {"dialogue_id": "1", "user_id": "6"})
+    assert stats.leaderboard(10) == [("6", 1)]
+
+
+def test_user_outside_the_top_gets_back_in_when_a_top_total_drops():
+    stats = ContributorStats()
+    row = iter(range(2, 10000))
+    rows_of = {}
+    for user_id in [f"top{i}" for i in range(TOP_SIZE)] * 3 + ["outsider"] * 2:
+        row_idx = next(row)
+        rows_of.setdefault(user_id, []).append(row_idx)
+        stats.observe(row_idx, {"dialogue_id": str(row_idx), "user_id": user_id})
+    assert "outsider" not in dict(stats.leaderboard(TOP_SIZE))
+
+    # Two of top0's rows are credited to top1 instead, leaving top0 behind the outsider
+    for row_idx in rows_of["top0"][:2]:
+        stats.observe(row_idx, {"dialogue_id": str(row_idx), "user_id": "top1"})
+
+    top = stats.leaderboard(TOP_SIZE)
+    assert top[-1] == ("outsider", 2)
+    assert "top0" not in dict(top)
+    assert [total for _, total in top] == ranked_totals(stats, TOP_SIZE)
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from conversation_state import SQLitePersistence
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Application:
+    """Just the ``drop_user_data`` the eviction task calls."""
+
+    def __init__(self):
+        self.dropped = []
+
+    def drop_user_data(self, user_id: int):
+        self.dropped.append(user_id)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("conversation_state.time.time", clock)
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "state.db")
+
+
+def reopen(path: str, **options) -> dict:
+    async def load():
+        persistence = SQLitePersistence(path, **options)
+        try:
+            return await persistence.get_user_data()
+        finally:
+            await persistence.flush()
+    return asyncio.run(load())
+
+
+def test_state_is_restored_after_reopening(clock, path):
+    async def run():
+        persistence = SQLitePersistence(path)
+        await persistence.update_user_data(1, {"step": "annotate", "row": 7, "text": "നമസ്കാരം"})
+        await persistence.update_user_data(2, {"step": "review"})
+        await persistence.update_user_data(2, {})
+        await persistence.flush()
+
+    asyncio.run(run())
+    assert reopen(path) == {1: {"step": "annotate", "row": 7, "text": "നമസ്കാരം"}}
+
+
+def test_state_older_than_the_ttl_is_dropped_on_load(clock, path):
+    async def run():
+        persistence = SQLitePersistence(path, ttl_seconds=3600)
+        await persistence.update_user_data(1, {"step": "submit"})
+        clock.now += 3000
+        await persistence.update_user_data(2, {"step": "review"})
+        await persistence.flush()
+
+    asyncio.run(run())
+    clock.now += 1000
+    assert reopen(path, ttl_seconds=3600) == {2: {"step": "review"}}
+    # Dropped from the database, not just skipped
+    clock.now -= 1000
+    assert reopen(path, ttl_seconds=3600) == {2: {"step": "review"}}
+
+
+def test_updates_that_leave_the_state_unchanged_keep_it_alive(clock, path):
+    async def run():
+        persistence = SQLitePersistence(path, ttl_seconds=3600)
+        for _ in range(4):
+            await persistence.update_user_data(1, {"step": "annotate"})
+            clock.now += 1000
+        await persistence.flush()
+
+    asyncio.run(run())
+    # Last update was 1000 s ago, the last change 4000 s ago
+    assert reopen(path, ttl_seconds=3600) == {1: {"step": "annotate"}}
+
+
+def test_idle_users_are_evicted_from_memory(clock, path):
+    application = Application()
+
+    async def run():
+        persistence = SQLitePersistence(path, ttl_seconds=3600)
+        await persistence.update_user_data(1, {"step": "submit"})
+        await persistence.update_user_data(2, {"step": "review"})
+        persistence.start(application, interval=0.01)
+        clock.now += 3000
+        await persistence.update_user_data(2, {"step": "review"})
+        clock.now += 1000
+        await asyncio.sleep(0.05)
+        await persistence.flush()
+        return persistence
+
+    persistence = asyncio.run(run())
+    assert application.dropped == [1]
+    assert list(persistence.changed_at) == [2]
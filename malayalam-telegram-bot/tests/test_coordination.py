@@ -0,0 +1,117 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from coordination import SharedChanges, SQLiteCoordinator
+
+
+@pytest.fixture
+def workers(tmp_path):
+    path = str(tmp_path / "coordination.db")
+    first, second = SQLiteCoordinator(path, "0"), SQLiteCoordinator(path, "1")
+    yield first, second
+    first.close()
+    second.close()
+
+
+class Storage:
+    """Just the listeners and ``reread`` ``SharedChanges`` uses."""
+
+    def __init__(self):
+        self.listeners = []
+        self.reread_rows = []
+
+    def reread(self, row_indexes):
+        self.reread_rows.extend(row_indexes)
+        for row_idx in row_indexes:
+            for listener in self.listeners:
+                listener(row_idx, {})
+
+    def write(self, row_idx: int):
+        for listener in self.listeners:
+            listener(row_idx, {})
+
+
+def test_reserved_blocks_never_overlap(workers):
+    first, second = workers
+    blocks = [first.reserve(10), second.reserve(10), first.reserve(5, floor=100), second.reserve(1)]
+    assert blocks == [1, 11, 100, 105]
+
+
+def test_a_lease_is_held_by_one_worker_until_it_lapses_or_is_released(workers):
+    first, second = workers
+    assert first.try_lease("review", 7, "alice", 60)
+    assert not second.try_lease("review", 7, "bob", 60)
+    # The holder renews from any worker; other queues and rows are separate
+    assert second.try_lease("review", 7, "alice", 60)
+    assert second.try_lease("annotation", 7, "bob", 60)
+    assert second.try_lease("review", 8, "bob", 60)
+
+    second.release_lease("review", 7, "bob")
+    assert not first.try_lease("review", 7, "bob", 60)
+    first.release_lease("review", 7, "alice")
+    assert second.try_lease("review", 7, "bob", -1)
+    # Lapsed straight away
+    assert first.try_lease("review", 7, "carol", 60)
+
+
+def test_changes_come_back_to_the_other_worker_only(workers):
+    first, second = workers
+    cursor = second.latest_change()
+    first.publish_many([5, 6])
+    second.publish(7)
+    first.publish(5)
+
+    cursor, rows = second.changes(cursor)
+    assert rows == [5, 6, 5]
+    assert second.changes(cursor) == (cursor, [])
+    assert first.changes(0)[1] == [7]
+
+
+def test_shared_changes_publish_and_replay_between_workers(workers):
+    async def scenario():
+        storages = Storage(), Storage()
+        shared = [SharedChanges(storage, coordinator) for storage, coordinator in zip(storages, workers)]
+        for changes in shared:
+            changes.mark()
+            changes.storage.listeners.append(changes.observe)
+
+        storages[0].write(3)
+        storages[0].write(4)
+        assert await shared[1].poll() == 0
+        assert await shared[0].poll() == 0
+        assert await shared[1].poll() == 2
+        assert storages[1].reread_rows == [3, 4]
+        # Replayed rows aren't published back
+        assert await shared[0].poll() == 0
+
+        storages[1].write(9)
+        await shared[1].stop()
+        assert await shared[0].poll() == 1
+        assert storages[0].reread_rows == [9]
+
+    asyncio.run(scenario())
+
+
+def test_a_locked_database_is_retried_briefly_then_reported(tmp_path):
+    path = str(tmp_path / "coordination.db")
+    coordinator = SQLiteCoordinator(path, "0", busy_timeout=0.05, attempts=4)
+    coordinator.latest_change()
+    other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+
+    other.execute("BEGIN IMMEDIATE")
+    started = time.monotonic()
+    with pytest.raises(sqlite3.OperationalError):
+        coordinator.try_lease("review", 2, "alice", 60)
+    assert time.monotonic() - started < 1
+
+    # A write lock held for less than the retries last is waited out
+    timer = threading.Timer(0.08, lambda: other.execute("COMMIT"))
+    timer.start()
+    assert coordinator.try_lease("review", 2, "alice", 60)
+    timer.join()
+    other.close()
+    coordinator.close()
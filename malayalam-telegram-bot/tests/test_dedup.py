@@ -0,0 +1,71 @@
+import pytest
+
+from dedup import DuplicateIndex
+
+SENTENCE = "ഇന്ന് വൈകുന്നേരം നമുക്ക് കടൽത്തീരത്ത് നടക്കാൻ പോകാം"
+
+
+@pytest.fixture
+def rows():
+    # dialogue_id -> record, standing in for storage
+    return {}
+
+
+@pytest.fixture
+def index(rows):
+    return DuplicateIndex(lambda key: rows[key]["utterance"] if key in rows else None)
+
+
+def store(rows, index, dialogue_id: str, utterance: str):
+    rows[dialogue_id] = {"dialogue_id": dialogue_id, "utterance": utterance}
+    index.observe(len(rows) + 1, rows[dialogue_id])
+
+
+def test_exact_match_ignores_punctuation_spacing_and_joiners(rows, index):
+    store(rows, index, "1", SENTENCE)
+    match = index.find(f"  {SENTENCE.replace(' ', '  ')}!!\u200C ")
+    assert (match.key, match.similarity) == ("1", 1.0)
+    assert index.find("മറ്റൊരു വാക്യം") is None
+
+
+def test_near_match_above_the_threshold_only(rows, index):
+    store(rows, index, "1", SENTENCE)
+    store(rows, index, "2", "നാളെ രാവിലെ ഞങ്ങൾ ബസ്സിൽ സ്കൂളിലേക്ക് പോകും")
+    near = index.find(SENTENCE.replace("പോകാം", "പോകാമോ"))
+    assert near.key == "1" and 0.8 <= near.similarity < 1.0
+    assert index.find("ഇന്ന് വൈകുന്നേരം മഴ പെയ്യുമെന്ന് തോന്നുന്നു") is None
+
+
+def test_forgotten_rows_no_longer_match(rows, index):
+    store(rows, index, "1", SENTENCE)
+    index.forget("1")
+    assert index.find(SENTENCE) is None
+    assert index.find(SENTENCE + " ഇപ്പോൾ") is None
+    assert len(index) == 0
+    index.forget("1")
+
+
+def test_a_repeat_takes_over_when_the_first_copy_is_forgotten(rows, index):
+    store(rows, index, "1", SENTENCE)
+    store(rows, index, "2", SENTENCE + ".")
+    assert index.find(SENTENCE).key == "1"
+    index.forget("1")
+    assert index.find(SENTENCE).key == "2"
+    assert index.find(SENTENCE.replace("പോകാം", "പോകാമോ")).key == "2"
+
+
+def test_edited_utterance_is_reindexed(rows, index):
+    store(rows, index, "1", SENTENCE)
+    store(rows, index, "1", "നാളെ രാവിലെ ഞങ്ങൾ ബസ്സിൽ സ്കൂളിലേക്ക് പോകും")
+    assert index.find(SENTENCE) is None
+    assert index.find("നാളെ രാവിലെ ഞങ്ങൾ ബസ്സിൽ സ്കൂളിലേക്ക് പോകും").key == "1"
+    # Unchanged rewrites (annotations, reviews) leave the entry alone
+    index.observe(2, {**rows["1"], "topic": "travel"})
+    assert len(index) == 1
+
+
+def test_scratch_index_keeps_its_own_texts(index):
+    batch = index.scratch()
+    batch.add(3, SENTENCE)
+    assert batch.find(SENTENCE.replace("പോകാം", "പോകാമോ")).key == 3
+    assert index.find(SENTENCE) is None
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import sys
+
+import pytest
+
+import export
+import fake_sheets
+from archive import Archiver
+from conftest import dialogue, make_sheets_storage, sheet_values
+
+
+@pytest.fixture
+def sheets(monkeypatch, spreadsheet):
+    """``google_sheets`` backed by the fake spreadsheet, for the export's own imports."""
+    monkeypatch.setitem(sys.modules, "google_sheets", None)
+    module = fake_sheets.install(spreadsheet, timeout=10, rate_per_minute=6000, burst=100)
+    yield module
+    module.gateway.shutdown()
+
+
+def exported_ids(path) -> list:
+    with open(path) as f:
+        return [json.loads(line)["dialogue_id"] for line in f]
+
+
+def archive_reads(spreadsheet) -> int:
+    return sum(
+        worksheet.rows_read for title, worksheet in spreadsheet.worksheets.items()
+        if title.startswith("archive_20")
+    )
+
+
+def test_repeat_runs_read_only_new_archive_rows(tmp_path, spreadsheet, sheets):
+    spreadsheet.sheet1.values = sheet_values([
+        dialogue(1, status="approved", timestamp="2024-01-05 10:00:00"),
+        dialogue(2, status="rejected", timestamp="2024-01-06 10:00:00"),
+        dialogue(3, status="approved", timestamp="2024-02-07 10:00:00"),
+        dialogue(4),
+        dialogue(5, status="approved", timestamp="2024-02-08 10:00:00"),
+        dialogue(6, topic=""),
+    ])
+    output = str(tmp_path / "approved.jsonl")
+
+    async def scenario():
+        storage = make_sheets_storage(spreadsheet, sheets.gateway)
+        await storage.start()
+        archiver = Archiver(storage, sheets.gateway, settle_seconds=0)
+        assert await archiver.archive_once() == 4
+
+        # First run: the archive worksheets are read in chunks of two rows
+        assert await export.export(output, "jsonl", "sheets", chunk_rows=2) == 3
+        assert sorted(exported_ids(output)) == ["1", "3", "5"]
+        assert not any(worksheet.calls["get_all_values"] for title, worksheet in spreadsheet.worksheets.items()
+                       if title.startswith("archive_20"))
+
+        # Nothing new: the archive rows (rejected ones included) aren't read again
+        reads = archive_reads(spreadsheet)
+        assert await export.export(output, "jsonl", "sheets", chunk_rows=2) == 0
+        assert archive_reads(spreadsheet) == reads
+
+        # Dialogue 4 is approved and archived: the next run reads just that row
+        storage.update(5, status="approved", reviewer_id="77")
+        await storage.flush()
+        assert await archiver.archive_once() == 1
+        reads = archive_reads(spreadsheet)
+        assert await export.export(output, "jsonl", "sheets", chunk_rows=2) == 1
+        assert archive_reads(spreadsheet) == reads + 1
+        assert sorted(exported_ids(output)) == ["1", "3", "4", "5"]
+
+    asyncio.run(scenario())
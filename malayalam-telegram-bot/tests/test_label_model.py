@@ -0,0 +1,61 @@
+from conftest import dialogue
+from label_model import LabelSuggester
+
+TEXTS = {
+    2: "എന്റെ ബിൽ തുക എത്രയാണ്?",
+    3: "ബിൽ അടയ്ക്കാൻ കഴിയുന്നില്ല",
+    4: "ഇന്റർനെറ്റ് വളരെ പതുക്കെയാണ്",
+    5: "ഇന്റർനെറ്റ് കണക്ഷൻ ഇല്ല",
+}
+
+
+def approved(row_idx: int, topic: str, **fields) -> dict:
+    return dialogue(row_idx, status="approved", utterance=TEXTS[row_idx], topic=topic, **fields)
+
+
+def train(rows: dict) -> LabelSuggester:
+    model = LabelSuggester()
+    for row_idx, record in rows.items():
+        model.observe(row_idx, record)
+    return model
+
+
+def state(model: LabelSuggester):
+    return model.counts, model.totals, model.docs, model.vocab
+
+
+def test_relabelling_an_edited_row_unlearns_what_was_learned():
+    rows = {2: approved(2, "billing"), 3: approved(3, "billing"), 4: approved(4, "internet"), 5: approved(5, "internet")}
+    model = train(rows)
+    assert model.labels_for("ബിൽ തുക")["topic"] == "billing"
+
+    # The utterance is edited first (labels unchanged, so it is relearned), then the row is re-labelled
+    edited = dict(rows[3], utterance="ഇന്റർനെറ്റ് പോയി")
+    model.observe(3, edited)
+    model.observe(3, dict(edited, topic="internet"))
+    # ...and another row is un-approved
+    model.observe(5, dict(rows[5], status="rejected"))
+
+    final = {2: rows[2], 3: dict(edited, topic="internet"), 4: rows[4]}
+    assert state(model) == state(train(final))
+    assert all(n > 0 for counts in model.counts["topic"].values() for n in counts.values())
+    assert all(n > 0 for n in model.vocab.values())
+    assert model.docs["topic"] == {"billing": 1, "internet": 2}
+    assert model.labels_for("ഇന്റർനെറ്റ് പതുക്കെ")["topic"] == "internet"
+    assert model.labels_for("ബിൽ തുക")["topic"] == "billing"
+
+
+def test_a_saved_model_is_restored_and_checked_against_storage(tmp_path):
+    rows = {2: approved(2, "billing"), 4: approved(4, "internet")}
+    model = LabelSuggester(str(tmp_path / "model.json"))
+    for row_idx, record in rows.items():
+        model.observe(row_idx, record)
+    model.save()
+
+    restored = LabelSuggester(str(tmp_path / "model.json"))
+    restored.load()
+    for row_idx, record in rows.items():
+        restored.observe(row_idx, record)
+    restored.loaded(rows.items())
+    assert state(restored) == state(model)
+    assert restored.suggest("ബിൽ")["topic"][0] == "billing"
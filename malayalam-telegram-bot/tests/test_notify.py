@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from telegram.error import Forbidden, RetryAfter
+
+from fake_sheets import FakeClock
+from notify import Backlog, BacklogNotifier
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # The notifier's token buckets come from the Sheets scheduler
+    clock = FakeClock()
+    monkeypatch.setattr("sheets_scheduler.time.monotonic", clock.monotonic)
+    monkeypatch.setattr("sheets_scheduler.asyncio.sleep", clock.sleep)
+    return clock
+
+
+class Bot:
+    def __init__(self, clock, errors=None):
+        self.clock = clock
+        self.errors = errors or {}   # chat_id -> errors to raise first
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if self.errors.get(chat_id):
+            raise self.errors[chat_id].pop(0)
+        self.sent.append((chat_id, text, self.clock.now))
+
+
+def backlog(threshold: int, recipients, line: str) -> Backlog:
+    return Backlog(lambda record: record.get("status") == "pending", recipients, threshold, line)
+
+
+def fill(backlog: Backlog, count: int):
+    for row_idx in range(2, 2 + count):
+        backlog.observe(row_idx, {"status": "pending"})
+
+
+def test_backlog_counts_follow_row_changes():
+    rows = backlog(1, [], "{count}")
+    fill(rows, 3)
+    rows.observe(3, {"status": "approved"})
+    rows.observe(3, {"status": "approved"})
+    assert len(rows) == 2
+
+
+def test_announced_at_the_threshold_then_only_when_grown_and_due():
+    reviews = backlog(5, ["r1"], "📝 {count} to review")
+    notifier = BacklogNotifier([reviews], digest_seconds=3600)
+    fill(reviews, 4)
+    assert notifier.digests(0) == {}
+    fill(reviews, 5)
+    assert notifier.digests(0) == {"r1": "🔔 <b>Work is waiting</b>\n📝 5 to review"}
+    fill(reviews, 8)
+    # Grown, but the last digest was too recent
+    assert notifier.digests(1800) == {}
+    assert notifier.digests(3600) == {"r1": "🔔 <b>Work is waiting</b>\n📝 8 to review"}
+    # Due again, but not grown
+    assert notifier.digests(7200) == {}
+
+
+def test_dropping_below_the_threshold_starts_over():
+    reviews = backlog(3, ["r1"], "{count}")
+    notifier = BacklogNotifier([reviews])
+    fill(reviews, 3)
+    assert notifier.digests(0)
+    for row_idx in (2, 3):
+        reviews.observe(row_idx, {"status": "approved"})
+    assert notifier.digests(10) == {}
+    fill(reviews, 3)
+    # Announced straight away, without waiting for the digest interval
+    assert notifier.digests(20) == {"r1": "🔔 <b>Work is waiting</b>\n3"}
+
+
+def test_zero_threshold_never_announces():
+    quiet = backlog(0, ["r1"], "{count}")
+    fill(quiet, 100)
+    assert BacklogNotifier([quiet]).digests(0) == {}
+
+
+def test_each_user_gets_one_digest_for_every_backlog_due():
+    annotations = backlog(2, ["a1", "both"], "🏷 {count} to annotate")
+    reviews = backlog(2, ["both"], "📝 {count} to review")
+    fill(annotations, 2)
+    fill(reviews, 4)
+    digests = BacklogNotifier([annotations, reviews]).digests(0)
+    assert digests == {
+        "a1": "🔔 <b>Work is waiting</b>\n🏷 2 to annotate",
+        "both": "🔔 <b>Work is waiting</b>\n🏷 2 to annotate\n📝 4 to review",
+    }
+
+
+def test_sends_to_one_chat_are_paced_by_its_bucket(clock):
+    bot = Bot(clock)
+    notifier = BacklogNotifier([], messages_per_second=25, chat_messages_per_minute=20)
+
+    async def scenario():
+        for text in ("one", "two", "three"):
+            await notifier.send(bot, "r1", text)
+        await notifier.send(bot, "r2", "other chat")
+
+    start = clock.now
+    asyncio.run(scenario())
+    times = [sent_at - start for _, _, sent_at in bot.sent]
+    # One message per 3 s in a chat; another chat isn't held back by it
+    assert [chat_id for chat_id, _, _ in bot.sent] == ["r1", "r1", "r1", "r2"]
+    assert times[:3] == pytest.approx([0, 3, 6])
+    assert times[3] == pytest.approx(times[2])
+
+
+def test_retry_after_holds_back_sends_and_other_errors_are_skipped(clock):
+    bot = Bot(clock, errors={"r1": [RetryAfter(10)], "r2": [Forbidden("bot was blocked by the user")]})
+    notifier = BacklogNotifier([])
+
+    async def scenario():
+        await notifier.send(bot, "r1", "retried")
+        await notifier.send(bot, "r2", "blocked")
+        await notifier.send(bot, "r3", "sent")
+
+    start = clock.now
+    asyncio.run(scenario())
+    assert [(chat_id, text) for chat_id, text, _ in bot.sent] == [("r1", "retried"), ("r3", "sent")]
+    assert bot.sent[0][2] - start >= 10
@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+from fake_sheets import FakeWorksheet
+from sheets_gateway import SheetsGateway
+
+
+def test_timed_out_write_still_lands_but_queued_calls_never_run():
+    worksheet = FakeWorksheet(latency=0.3)
+    gateway = SheetsGateway(worksheet, max_workers=1, rate_per_minute=6000, burst=100)
+
+    async def scenario():
+        # Already running on the only thread when it times out: it can't be stopped
+        with pytest.raises(asyncio.TimeoutError):
+            await gateway.run(worksheet.append_row, ["1"], idempotent=False, timeout=0.05)
+        # Waiting for that thread when it times out: it never runs
+        with pytest.raises(asyncio.TimeoutError):
+            await gateway.run(worksheet.update_cell, 1, 2, "x", timeout=0.05)
+        await asyncio.sleep(0.5)
+
+    asyncio.run(scenario())
+    gateway.shutdown()
+    assert worksheet.values == [["1"]]
+    assert worksheet.calls["append_row"] == 1 and worksheet.calls["update_cell"] == 0
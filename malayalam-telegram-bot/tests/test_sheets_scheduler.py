@@ -0,0 +1,118 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from gspread.exceptions import APIError
+
+from fake_sheets import FakeClock, api_error
+from sheets_scheduler import BACKGROUND, INTERACTIVE, SheetsScheduler, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("sheets_scheduler.time.monotonic", clock.monotonic)
+    monkeypatch.setattr("sheets_scheduler.asyncio.sleep", clock.sleep)
+    return clock
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=1)
+    yield executor
+    executor.shutdown()
+
+
+def flaky(errors, calls: list):
+    """A Sheets call raising each of ``errors`` in turn, then returning how many attempts it took."""
+    errors = list(errors)
+
+    def call():
+        calls.append(len(calls) + 1)
+        if errors:
+            raise errors.pop(0)
+        return len(calls)
+    return call
+
+
+def test_interactive_calls_overtake_queued_background_ones(clock, executor):
+    scheduler = SheetsScheduler(executor, rate_per_minute=60, burst=1)
+    order = []
+
+    def call(tag):
+        def record():
+            order.append(tag)
+        return record
+
+    async def scenario():
+        await asyncio.gather(
+            *[scheduler.submit(call(f"background{i}"), priority=BACKGROUND) for i in range(3)],
+            scheduler.submit(call("interactive"), priority=INTERACTIVE),
+        )
+
+    start = clock.now
+    asyncio.run(scenario())
+    assert order == ["interactive", "background0", "background1", "background2"]
+    # One token a second after the single-call burst
+    assert clock.now - start == pytest.approx(3)
+
+
+def test_transient_errors_are_retried_with_growing_backoff(clock, executor):
+    scheduler = SheetsScheduler(executor, rate_per_minute=6000, burst=100, base_delay=1, max_delay=32)
+    calls = []
+
+    result = asyncio.run(scheduler.submit(flaky([api_error(503), api_error(500), api_error(502)], calls)))
+
+    assert result == 4 and scheduler.retries == 3
+    assert len(clock.sleeps) == 3
+    assert all(0 <= delay <= 2 ** attempt for attempt, delay in enumerate(clock.sleeps))
+
+
+def test_429_waits_for_retry_after_and_holds_back_other_calls(clock, executor):
+    scheduler = SheetsScheduler(executor, rate_per_minute=60, burst=10)
+    calls = []
+
+    async def scenario():
+        return await asyncio.gather(
+            scheduler.submit(flaky([api_error(429, retry_after=5)], calls), idempotent=False),
+            scheduler.submit(lambda: "later"),
+        )
+
+    start = clock.now
+    assert asyncio.run(scenario()) == [2, "later"]
+    assert clock.sleeps[0] == 5
+    # The bucket was drained for the Retry-After, so the retry waited longer than the backoff alone
+    assert clock.now - start > 5
+
+
+def test_non_idempotent_calls_are_not_retried_after_a_server_error(clock, executor):
+    scheduler = SheetsScheduler(executor)
+    calls = []
+
+    with pytest.raises(APIError):
+        asyncio.run(scheduler.submit(flaky([api_error(503)], calls), idempotent=False))
+    assert calls == [1] and scheduler.retries == 0
+
+
+def test_retries_give_up_after_max_retries(clock, executor):
+    scheduler = SheetsScheduler(executor, max_retries=2)
+    calls = []
+
+    with pytest.raises(APIError):
+        asyncio.run(scheduler.submit(flaky([api_error(503)] * 5, calls)))
+    assert calls == [1, 2, 3]
+
+
+def test_token_bucket_allows_a_burst_then_paces(clock):
+    bucket = TokenBucket(rate_per_minute=120, burst=3)
+
+    async def scenario():
+        for _ in range(5):
+            await bucket.take()
+
+    start = clock.now
+    asyncio.run(scenario())
+    assert clock.now - start == pytest.approx(1)
+    clock.now += 60
+    bucket._refill()
+    assert bucket.tokens == 3
@@ -0,0 +1,74 @@
+import asyncio
+
+import schema
+from conftest import dialogue, make_sheets_storage, sheet_values
+from sqlite_storage import SQLiteStorage
+
+
+def review(status: str, reviewer_id: str = "77") -> dict:
+    return {"reviewer_id": reviewer_id, "status": status}
+
+
+def test_sqlite_update_rows_if_skips_changed_rows():
+    storage = SQLiteStorage(":memory:")
+    rows = storage.add_dialogues([dialogue(1), dialogue(2), dialogue(3)])
+    versions = [schema.version(storage.get(row_idx)) for row_idx in rows]
+    heard = []
+    storage.listeners.append(lambda row_idx, record: heard.append(row_idx))
+
+    # Someone edits the second dialogue after the batch was listed
+    storage.update(rows[1], intent="greeting")
+    heard.clear()
+    results = storage.update_rows_if([
+        (rows[0], versions[0], review("approved")),
+        (rows[1], versions[1], review("approved")),
+        (rows[2], versions[2], review("rejected")),
+        (99, versions[0], review("approved")),
+    ])
+
+    assert results == [True, False, True, False]
+    assert [storage.get(row_idx)["status"] for row_idx in rows] == ["approved", "", "rejected"]
+    assert storage.get(rows[1])["intent"] == "greeting"
+    assert heard == [rows[0], rows[2]]
+
+
+def test_sqlite_update_rows_if_writes_nothing_when_a_write_fails():
+    storage = SQLiteStorage(":memory:")
+    rows = storage.add_dialogues([dialogue(1), dialogue(2)])
+    versions = [schema.version(storage.get(row_idx)) for row_idx in rows]
+    try:
+        storage.update_rows_if([
+            (rows[0], versions[0], review("approved")),
+            (rows[1], versions[1], {"no_such_field": "x"}),
+        ])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown field was written")
+    # One transaction: the first update was rolled back with the second
+    assert storage.get(rows[0])["status"] == ""
+
+
+def test_sheets_update_rows_if_skips_changed_and_archived_rows(spreadsheet, gateway):
+    spreadsheet.sheet1.values = sheet_values([dialogue(1), dialogue(2), dialogue(3)])
+
+    async def scenario():
+        storage = make_sheets_storage(spreadsheet, gateway)
+        await storage.start()
+        versions = {row_idx: schema.version(storage.get(row_idx)) for row_idx in (2, 3, 4)}
+        storage.update(3, emotion="sad")
+        storage.archive.add(storage.rows.detach([4]))
+
+        results = storage.update_rows_if([
+            (2, versions[2], review("approved")),
+            (3, versions[3], review("approved")),
+            (4, versions[4], review("rejected")),
+        ])
+        await storage.flush()
+
+        assert results == [True, False, False]
+        status = schema.col("status") - 1
+        assert [row[status] if len(row) > status else "" for row in spreadsheet.sheet1.values[1:]] == ["approved", "", ""]
+        assert spreadsheet.sheet1.values[2][schema.col("emotion") - 1] == "sad"
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+import asyncio
+
+from telegram import Chat, Message, Update, User
+
+from update_processor import PerUserUpdateProcessor
+
+
+def update_from(user_id: int, update_id: int) -> Update:
+    return Update(update_id, message=Message(update_id, None, Chat(user_id, "private"), from_user=User(user_id, "u", False)))
+
+
+def test_a_users_updates_run_one_at_a_time_in_order():
+    log = []
+
+    async def handle(tag, delay):
+        log.append(("start", tag))
+        await asyncio.sleep(delay)
+        log.append(("end", tag))
+
+    async def scenario():
+        processor = PerUserUpdateProcessor(4)
+        # Later updates are quicker, so they'd overtake earlier ones if they ran concurrently
+        await asyncio.gather(*[
+            processor.process_update(update_from(1, i), handle(i, 0.03 - i * 0.01)) for i in range(3)
+        ])
+        assert not processor._locks
+
+    asyncio.run(scenario())
+    assert log == [(event, i) for i in range(3) for event in ("start", "end")]
+
+
+def test_queued_updates_of_one_user_dont_block_other_users():
+    async def scenario():
+        processor = PerUserUpdateProcessor(2)
+        release = asyncio.Event()
+        other_done = asyncio.Event()
+
+        async def blocked():
+            await release.wait()
+
+        async def other():
+            other_done.set()
+
+        # One user's backlog is bigger than the limit...
+        backlog = [asyncio.create_task(processor.process_update(update_from(1, i), blocked())) for i in range(5)]
+        await asyncio.sleep(0)
+        # ...and another user still gets through while it waits
+        await asyncio.wait_for(processor.process_update(update_from(2, 99), other()), 1)
+        assert other_done.is_set()
+        release.set()
+        await asyncio.gather(*backlog)
+
+    asyncio.run(scenario())
+
+
+def test_the_limit_holds_across_users():
+    running = peak = 0
+
+    async def handle():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def scenario():
+        processor = PerUserUpdateProcessor(3)
+        await asyncio.gather(*[processor.process_update(update_from(100 + i, i), handle()) for i in range(9)])
+
+    asyncio.run(scenario())
+    assert peak == 3
@@ -0,0 +1,53 @@
+import unicodedata
+
+import pytest
+
+from utils import DEFAULT_EXTRA_CHARS, MalayalamValidator
+
+
+@pytest.fixture
+def validator():
+    return MalayalamValidator()
+
+
+def test_decomposed_vowel_signs_come_back_nfc(validator):
+    # കൊ typed as ക + െ + ാ, and ക + ൌ's two parts
+    text = "\u0D15\u0D46\u0D3E\u0D1F\u0D4D\u0D1F\u0D3F \u0D15\u0D46\u0D57"
+    normalized, reason = validator.check(text)
+    assert reason is None
+    assert normalized == unicodedata.normalize("NFC", text) != text
+
+
+def test_nfc_text_is_returned_unchanged(validator):
+    text = "നമസ്കാരം, സുഖമാണോ? 2024-ൽ കാണാം!"
+    assert validator.check(text) == (text, None)
+
+
+def test_rejections_name_the_offending_character(validator):
+    assert validator.check("നമസ്കാരം hello") == ("നമസ്കാരം hello", "“h” (U+0068) isn’t Malayalam script")
+    assert validator.check("നന്ദി 🙏")[1] == "“🙏” (U+1F64F) isn’t Malayalam script"
+    assert validator.check("... 123 !")[1] == "no Malayalam letters"
+    # Malayalam digits alone aren't letters either
+    assert validator.check("൧൨൩")[1] == "no Malayalam letters"
+
+
+def test_digits_and_extra_characters_are_configurable():
+    strict = MalayalamValidator(extra_chars="", allow_digits=False)
+    assert strict.check("നമസ്കാരം 2")[1] == "“2” (U+0032) isn’t Malayalam script"
+    assert strict.check("നമസ്കാരം!")[1] == "“!” (U+0021) isn’t Malayalam script"
+    assert MalayalamValidator(DEFAULT_EXTRA_CHARS + "#").is_valid("#നമസ്കാരം")
+
+
+def test_extra_characters_nfc_could_change_still_normalize():
+    # NFC maps the Angstrom sign to Å; that rules out the Malayalam-only shortcut
+    validator = MalayalamValidator(DEFAULT_EXTRA_CHARS + "\u212B\u00C5")
+    assert validator.check("\u0D15 \u212B") == ("\u0D15 \u00C5", None)
+    assert validator.check_many(["\u0D15 \u212B"]) == [("\u0D15 \u00C5", None)]
+
+
+def test_check_many_matches_check(validator):
+    texts = ["നമസ്കാരം", "\u0D15\u0D46\u0D3E", "...", "hello നന്ദി", "കോ"]
+    assert validator.check_many(texts) == [validator.check(text) for text in texts]
+    clean = [text for text in texts if "hello" not in text]
+    assert validator.check_many(clean) == [validator.check(text) for text in clean]
+    assert validator.check_many([]) == []
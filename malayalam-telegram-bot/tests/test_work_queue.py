@@ -0,0 +1,79 @@
+import pytest
+
+from conftest import dialogue
+from work_queue import LeasedQueue, needs_review
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("work_queue.time.monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def rows():
+    # row_idx -> record; a dict has the ``get`` the queue reads rows through
+    return {row_idx: dialogue(row_idx) for row_idx in (2, 3, 4)}
+
+
+@pytest.fixture
+def queue(rows):
+    queue = LeasedQueue(rows, needs_review, lease_seconds=60)
+    for row_idx, record in rows.items():
+        queue.offer(row_idx, record)
+    return queue
+
+
+def test_expired_lease_goes_back_to_the_front(clock, queue):
+    assert queue.lease("alice") == 2
+    clock.now += 30
+    assert queue.lease("bob") == 3
+    clock.now += 31
+    assert queue.lease("carol") == 2
+    # Alice's lease ended, so she gets the next free row rather than her old one
+    assert queue.lease("alice") == 4
+    assert queue.leases[2][0] == "carol"
+
+
+def test_renewed_lease_outlives_its_first_expiry(clock, queue):
+    assert queue.lease("alice") == 2
+    clock.now += 50
+    assert queue.lease("alice") == 2
+    clock.now += 20
+    # Only the stale heap entry of the first lease has passed
+    assert queue.lease("bob") == 3
+    assert queue.lease("alice") == 2
+
+
+def test_expired_row_no_longer_pending_is_dropped(clock, rows, queue):
+    assert queue.lease("alice") == 2
+    rows[2]["status"] = "approved"
+    clock.now += 61
+    assert queue.lease("bob") == 3
+    assert 2 not in queue.leases and 2 not in queue.queued
+
+
+def test_expired_batch_rows_are_requeued(clock, queue):
+    assert queue.lease_many("alice", 2) == [2, 3]
+    clock.now += 30
+    assert queue.renew("alice", [3]) == [3]
+    clock.now += 31
+    # Row 2 lapsed and is back in the queue; row 3 was renewed and stays Alice's
+    assert queue.lease_many("carol", 5) == [2, 4]
+    assert queue.leases[3][0] == "alice"
+
+
+def test_released_batch_rows_are_requeued_but_completed_ones_are_not(clock, queue):
+    assert queue.lease_many("alice", 3) == [2, 3, 4]
+    queue.complete(2)
+    queue.release_rows("alice", [2, 3, 4])
+    assert sorted(queue.lease_many("bob", 5)) == [3, 4]
@@ -0,0 +1,49 @@
+import asyncio
+import sys
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Processes up to ``max_concurrent_updates`` updates at once, but one at a time per user.
+
+    The ``context.user_data`` flows (submit → message, annotate → buttons,
+    reject → comment) assume a user's updates are handled in order, so each
+    user gets a FIFO lock while different users run concurrently. Locks are
+    dropped once a user has nothing in flight.
+
+    The limit is a semaphore taken once the user's lock is held: PTB's own
+    (taken before ``do_process_update``) is left unbounded, so updates
+    queued behind their user's earlier ones don't use up slots other users
+    could run in.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(sys.maxsize)
+        self.limit = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._locks = {}   # user_id -> [asyncio.Lock, updates waiting or running]
+
+    async def do_process_update(self, update: object, coroutine):
+        user = update.effective_user if isinstance(update, Update) else None
+        if user is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._locks.setdefault(user.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[user.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -1,12 +1,66 @@
-def is_malayalam(text: str) -> bool:
-  return all('\u0D00' <= char <= '\u0D7F' or char.isspace() or char in ",.!?:" for char in text)
+import re
+import unicodedata
+
+from config import VALIDATOR_EXTRA_CHARS, VALIDATOR_ALLOW_DIGITS
+
+MALAYALAM_BLOCK = "\u0D00-\u0D7F"
+MALAYALAM_LETTERS = "\u0D00-\u0D65\u0D70-\u0D7F"   # the block minus Malayalam digits
+# Punctuation accepted alongside Malayalam unless configured otherwise
+DEFAULT_EXTRA_CHARS = ",.!?:;'\"‘’“”-–—()…"
+JOINERS = "\u200C\u200D"                        # ZWNJ / ZWJ, used in conjuncts and old-style chillus
+
+
+# Within the Malayalam block, whitespace and joiners, NFC only changes two-part vowel
+# signs typed as two code points (ൊ ോ ൌ) and two legacy space characters
+DECOMPOSED = re.compile("\u0D46[\u0D3E\u0D57]|\u0D47\u0D3E|[\u2000\u2001]")
+
+
+class MalayalamValidator:
+  """Checks that text is Malayalam script plus whitespace, joiners and an allowed set of extra characters.
+
+  ``check`` returns the NFC-normalized text and ``None``, or a reason the
+  text was rejected. The character class is compiled once, so a check is a
+  regex scan; normalization only runs when the text has sequences NFC would
+  change, since a full ``is_normalized`` pass costs more than the check.
+  """
 
-def generate_short_id(sheet) -> str:
-  dialogue_ids = sheet.col_values(5)[1:]  # skip header
-  numeric_ids = [int(d_id) for d_id in dialogue_ids if d_id.isdigit()]
+  def __init__(self, extra_chars: str = DEFAULT_EXTRA_CHARS, allow_digits: bool = True):
+    allowed = MALAYALAM_BLOCK + JOINERS + re.escape(extra_chars) + ("0-9" if allow_digits else "")
+    self._disallowed = re.compile(f"[^{allowed}\\s]")
+    self._letter = re.compile(f"[{MALAYALAM_LETTERS}]")
+    # Extra characters that NFC could touch make the shortcut unsafe
+    self._full_nfc = any(unicodedata.normalize("NFD", c) != c or unicodedata.combining(c) for c in extra_chars)
 
-  if not numeric_ids:
-      return "1"
-  else:
-      last_id = max(numeric_ids)
-      return str(last_id + 1)
+  def _normalize(self, text: str) -> str:
+    if self._full_nfc or DECOMPOSED.search(text):
+      return unicodedata.normalize("NFC", text)
+    return text
+
+  def check(self, text: str):
+    """Return ``(normalized_text, reason)``; ``reason`` is ``None`` when the text is valid."""
+    bad = self._disallowed.search(text)
+    if bad:
+      char = bad.group()
+      return text, f"“{char}” (U+{ord(char):04X}) isn’t Malayalam script"
+    text = self._normalize(text)
+    if not self._letter.search(text):
+      return text, "no Malayalam letters"
+    return text, None
+
+  def check_many(self, texts):
+    """``check`` for a batch; a batch with no disallowed characters at all needs one scan in total."""
+    texts = list(texts)
+    if self._disallowed.search("\n".join(texts)):
+      return [self.check(t) for t in texts]
+    texts = [self._normalize(t) for t in texts]
+    return [(t, None if self._letter.search(t) else "no Malayalam letters") for t in texts]
+
+  def is_valid(self, text: str) -> bool:
+    return self.check(text)[1] is None
+
+
+validator = MalayalamValidator(DEFAULT_EXTRA_CHARS + VALIDATOR_EXTRA_CHARS, VALIDATOR_ALLOW_DIGITS)
+
+
+def is_malayalam(text: str) -> bool:
+  return validator.is_valid(text)
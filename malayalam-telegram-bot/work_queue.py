@@ -0,0 +1,191 @@
+import heapq
+import threading
+import time
+from collections import deque
+
+
+def needs_annotation(record: dict) -> bool:
+    # Annotations are saved in one write, so a row without a topic was never finished
+    return bool(record.get("dialogue_id")) and not record.get("topic")
+
+
+def needs_review(record: dict) -> bool:
+    # Topic is the last annotation step, so only fully annotated rows are reviewable
+    return bool(record.get("dialogue_id")) and bool(record.get("topic")) and not record.get("status")
+
+
+class LeasedQueue:
+    """FIFO of pending rows where each handed-out row is leased to one user.
+
+    Rows are offered by the row store as they load or change (see
+    ``RowStore.listeners``). ``lease`` gives a user their current row or the
+    next free one; rows whose lease expires go back to the front of the
+    queue. Rows that stopped being pending are dropped when they reach the
+    head, so every operation is O(1) amortized.
+
+    With a ``coordinator`` (multi-worker mode) each lease is also taken
+    under ``name`` in the shared store; rows another worker has leased wait
+    at the back of the queue until their lease ends.
+    """
+
+    def __init__(self, store, is_pending, lease_seconds: float = 900, coordinator=None, name: str = ""):
+        self.store = store
+        self.is_pending = is_pending
+        self.lease_seconds = lease_seconds
+        self.coordinator = coordinator
+        self.name = name
+        self.queue = deque()     # row_idx waiting to be handed out
+        self.queued = set()
+        self.leases = {}         # row_idx -> (user_id, expires_at)
+        self.by_user = {}        # user_id -> row_idx
+        self._expiry = []        # heap of (expires_at, row_idx)
+        self._lock = threading.Lock()
+
+    def offer(self, row_idx: int, record: dict):
+        """Row store listener: queue the row if it is pending and not already tracked."""
+        if not self.is_pending(record):
+            return
+        with self._lock:
+            if row_idx not in self.queued and row_idx not in self.leases:
+                self.queue.append(row_idx)
+                self.queued.add(row_idx)
+
+    def lease(self, user_id):
+        """Return the row leased to ``user_id`` (renewing it), or lease the next pending one."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            row_idx = self.by_user.get(user_id)
+            if row_idx is None or not self._still_pending(row_idx) or not self._share(row_idx, user_id):
+                self._drop(row_idx)
+                row_idx = None
+                busy = []
+                while self.queue:
+                    candidate = self.queue.popleft()
+                    self.queued.discard(candidate)
+                    if candidate not in self.leases and self._still_pending(candidate):
+                        if self._share(candidate, user_id):
+                            row_idx = candidate
+                            break
+                        busy.append(candidate)
+                self._park(busy)
+                if row_idx is None:
+                    return None
+            expires_at = now + self.lease_seconds
+            self.leases[row_idx] = (user_id, expires_at)
+            self.by_user[user_id] = row_idx
+            heapq.heappush(self._expiry, (expires_at, row_idx))
+            return row_idx
+
+    def claim(self, user_id, row_idx: int) -> bool:
+        """Lease a specific row to ``user_id`` (e.g. to resume a flow after a restart), unless someone else holds it."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            holder = self.leases.get(row_idx)
+            if holder and holder[0] != user_id or self.store.get(row_idx) is None or not self._share(row_idx, user_id):
+                return False
+            previous = self.by_user.get(user_id)
+            if previous is not None and previous != row_idx:
+                self._drop(previous)
+                self._requeue(previous)
+            expires_at = now + self.lease_seconds
+            self.leases[row_idx] = (user_id, expires_at)
+            self.by_user[user_id] = row_idx
+            heapq.heappush(self._expiry, (expires_at, row_idx))
+            return True
+
+    def lease_many(self, user_id, count: int) -> list:
+        """Lease up to ``count`` more pending rows to ``user_id`` at once (batch review), besides any single lease."""
+        now = time.monotonic()
+        rows, busy = [], []
+        with self._lock:
+            self._expire(now)
+            while self.queue and len(rows) < count:
+                candidate = self.queue.popleft()
+                self.queued.discard(candidate)
+                if candidate not in self.leases and self._still_pending(candidate):
+                    (rows if self._share(candidate, user_id) else busy).append(candidate)
+            self._park(busy)
+            self._hold(user_id, rows, now + self.lease_seconds)
+        return rows
+
+    def renew(self, user_id, rows) -> list:
+        """Extend ``user_id``'s leases on ``rows`` (re-leasing free ones); returns the rows they now hold."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            held = [
+                row_idx for row_idx in rows
+                if self.leases.get(row_idx, (user_id,))[0] == user_id and self._still_pending(row_idx)
+                and self._share(row_idx, user_id)
+            ]
+            self._hold(user_id, held, now + self.lease_seconds)
+        return held
+
+    def release_rows(self, user_id, rows):
+        """Give back the rows of a batch that ``user_id`` didn't get to."""
+        with self._lock:
+            for row_idx in rows:
+                if self.leases.get(row_idx, (None,))[0] == user_id:
+                    self._drop(row_idx)
+                    self._requeue(row_idx)
+
+    def complete(self, row_idx: int):
+        """The leased row is done; forget the lease without re-queueing it."""
+        with self._lock:
+            self._drop(row_idx)
+
+    def release(self, user_id):
+        """Give the user's row back to the front of the queue."""
+        with self._lock:
+            row_idx = self.by_user.get(user_id)
+            if row_idx is not None:
+                self._drop(row_idx)
+                self._requeue(row_idx)
+
+    def __len__(self):
+        return len(self.queue)
+
+    # ─── Internals (called with the lock held) ───
+    def _hold(self, user_id, rows, expires_at: float):
+        for row_idx in rows:
+            self.queued.discard(row_idx)
+            self.leases[row_idx] = (user_id, expires_at)
+            heapq.heappush(self._expiry, (expires_at, row_idx))
+
+    def _still_pending(self, row_idx: int) -> bool:
+        record = self.store.get(row_idx)
+        return record is not None and self.is_pending(record)
+
+    def _share(self, row_idx: int, user_id) -> bool:
+        """Take or extend the lease in the shared store; always granted without a coordinator."""
+        return self.coordinator is None or self.coordinator.try_lease(self.name, row_idx, str(user_id), self.lease_seconds)
+
+    def _park(self, rows):
+        # Leased by another worker: try again once the rest of the queue has had its turn
+        for row_idx in rows:
+            if row_idx not in self.queued:
+                self.queue.append(row_idx)
+                self.queued.add(row_idx)
+
+    def _drop(self, row_idx):
+        lease = self.leases.pop(row_idx, None)
+        if lease and self.by_user.get(lease[0]) == row_idx:
+            del self.by_user[lease[0]]
+        if lease and self.coordinator:
+            self.coordinator.release_lease(self.name, row_idx, str(lease[0]))
+
+    def _requeue(self, row_idx: int):
+        if row_idx not in self.queued and self._still_pending(row_idx):
+            self.queue.appendleft(row_idx)
+            self.queued.add(row_idx)
+
+    def _expire(self, now: float):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, row_idx = heapq.heappop(self._expiry)
+            lease = self.leases.get(row_idx)
+            # Renewed leases leave stale heap entries behind; only act on the current one
+            if lease and lease[1] == expires_at:
+                self._drop(row_idx)
+                self._requeue(row_idx)
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+
+import tornado.web
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+from tornado.httpserver import HTTPServer
+from telegram import Bot, Update
+
+from coordination import worker_for
+
+# Telegram sends the webhook secret in this header; the router passes it on to the workers
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def sender(update: dict):
+    """ID of the user a Bot API update comes from, or ``None`` (channel posts, polls)."""
+    for value in update.values():
+        if isinstance(value, dict):
+            user = value.get("from") or value.get("user")
+            if isinstance(user, dict) and "id" in user:
+                return user["id"]
+    return None
+
+
+def _stop_event() -> asyncio.Event:
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+    return stop
+
+
+class _Updates(tornado.web.RequestHandler):
+    """Webhook endpoint: checks the secret and answers with whatever ``handle`` returns for the update."""
+
+    def initialize(self, handle, secret):
+        self.handle = handle
+        self.secret = secret
+
+    async def post(self):
+        if self.secret and self.request.headers.get(SECRET_HEADER) != self.secret:
+            self.set_status(403)
+            return
+        try:
+            update = json.loads(self.request.body)
+        except ValueError:
+            self.set_status(400)
+            return
+        self.set_status(await self.handle(update, self.request.body))
+
+
+def _server(path: str, handle, secret) -> HTTPServer:
+    return HTTPServer(tornado.web.Application([(rf"/{path}/?", _Updates, {"handle": handle, "secret": secret})]))
+
+
+class Router:
+    """Front process in multi-worker mode: takes Telegram's webhook and passes each update to its user's worker.
+
+    Workers are this script run again with ``WORKER_INDEX`` set, listening on
+    127.0.0.1 from ``base_port`` up. Worker 0 starts first (it imports the
+    sheet into an empty database); the rest start once it is listening.
+    Workers that exit are restarted. Telegram gets the worker's answer, so an
+    update no worker took is delivered again.
+    """
+
+    def __init__(self, script: str, workers: int, base_port: int, path: str, secret=None, metrics_port: int = 0):
+        self.script = script
+        self.workers = workers
+        self.base_port = base_port
+        self.path = path
+        self.secret = secret
+        self.metrics_port = metrics_port
+        self.processes = {}
+        self.stopping = False
+        self.client = None
+
+    async def forward(self, update: dict, body: bytes) -> int:
+        user_id = sender(update)
+        index = worker_for(user_id, self.workers) if user_id is not None else 0
+        headers = {"Content-Type": "application/json"}
+        if self.secret:
+            headers[SECRET_HEADER] = self.secret
+        try:
+            response = await self.client.fetch(
+                f"http://127.0.0.1:{self.base_port + index}/{self.path}",
+                method="POST", body=body, headers=headers, request_timeout=30,
+            )
+            return response.code
+        except (HTTPClientError, OSError) as e:
+            logging.warning(f"Worker {index} didn't take update {update.get('update_id')}: {e}")
+            return 502
+
+    async def _keep_running(self, index: int):
+        env = dict(os.environ, WORKER_INDEX=str(index))
+        if self.metrics_port:
+            env["METRICS_PORT"] = str(self.metrics_port + index)
+        while not self.stopping:
+            process = await asyncio.create_subprocess_exec(sys.executable, self.script, env=env)
+            self.processes[index] = process
+            code = await process.wait()
+            if not self.stopping:
+                logging.error(f"Worker {index} exited with code {code}; restarting")
+                await asyncio.sleep(1)
+
+    async def _listening(self, index: int, timeout: float = 600):
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", self.base_port + index)
+                writer.close()
+                return
+            except OSError:
+                if asyncio.get_running_loop().time() > deadline:
+                    raise RuntimeError(f"Worker {index} didn't start listening within {timeout}s")
+                await asyncio.sleep(0.5)
+
+    async def run(self, token: str, listen: str, port: int, webhook_url: str, max_connections: int = 40):
+        stop = _stop_event()
+        self.client = AsyncHTTPClient()
+        tasks = [asyncio.create_task(self._keep_running(0))]
+        await self._listening(0)
+        tasks += [asyncio.create_task(self._keep_running(index)) for index in range(1, self.workers)]
+        for index in range(1, self.workers):
+            await self._listening(index)
+
+        server = _server(self.path, self.forward, self.secret)
+        server.listen(port, listen)
+        async with Bot(token) as bot:
+            await bot.set_webhook(webhook_url, secret_token=self.secret, max_connections=max_connections)
+        logging.info(f"🤖 Routing webhook updates on {listen}:{port}/{self.path} to {self.workers} workers...")
+
+        await stop.wait()
+        # Stop taking updates, then let each worker finish what it has
+        server.stop()
+        self.stopping = True
+        for process in self.processes.values():
+            if process.returncode is None:
+                process.terminate()
+        await asyncio.gather(*tasks)
+
+
+async def serve_worker(app, port: int, path: str, secret=None):
+    """Run ``app`` on the updates the router forwards to 127.0.0.1:``port`` until SIGINT/SIGTERM.
+
+    The same steps as ``Application.run_webhook``, except that the webhook is
+    the router's to set.
+    """
+    stop = _stop_event()
+
+    async def receive(update: dict, body: bytes) -> int:
+        await app.update_queue.put(Update.de_json(update, app.bot))
+        return 200
+
+    async with app:
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        try:
+            server = _server(path, receive, secret)
+            server.listen(port, "127.0.0.1")
+            logging.info(f"🤖 Worker is running (updates from the router on port {port})...")
+            await stop.wait()
+            server.stop()
+        finally:
+            await app.stop()
+    if app.post_shutdown:
+        await app.post_shutdown(app)
@@ -0,0 +1,220 @@
+import asyncio
+import contextlib
+import logging
+import re
+import threading
+
+from gspread.exceptions import APIError
+from gspread.utils import rowcol_to_a1, ValueInputOption
+
+from sheets_scheduler import status_code
+
+
+class _AppendAttempt:
+    """One ``append_rows`` call, so a flush that lost track of it can find out whether it ran."""
+
+    def __init__(self, appends):
+        self.appends = appends
+        self.lock = threading.Lock()
+        self.started = False
+        self.abandoned = False
+        self.finished = threading.Event()
+
+
+class WriteBuffer:
+    """Write-behind coalescer for the dialogue sheet.
+
+    Cell updates and appended rows are applied to the row store immediately
+    and queued; a flush sends every queued append as one ``append_rows`` call
+    and every queued cell as one ``batch_update`` call. Later writes to the
+    same cell replace earlier ones. A flush happens ``flush_interval``
+    seconds after the first queued write, as soon as ``max_pending`` writes
+    are queued, or when ``flush()`` is awaited (e.g. on shutdown).
+
+    Writes are queued by ``row_idx`` and placed with ``store.sheet_row`` at
+    flush time, so they land right even after rows above were moved out.
+
+    Appends aren't idempotent: rows are only sent again when Google refused
+    them outright. After a timeout, connection error or 5xx the call is left
+    to finish and the sheet's tail is checked for its dialogue IDs first.
+    """
+
+    def __init__(self, gateway, store, flush_interval: float = 2, max_pending: int = 50):
+        self.gateway = gateway
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.cells = {}        # (row, col) -> value
+        self.appends = []      # [(expected_row_idx, values), ...]
+        self.unconfirmed = None  # _AppendAttempt that failed without saying whether it landed
+        self._timer = None
+        self._flush_lock = asyncio.Lock()
+
+    # ─── Queueing ───
+    def update_cell(self, row: int, col: int, value):
+        self.store.apply_update(row, col, value)
+        self.cells[(row, col)] = value
+        self._schedule()
+
+    def update_cells(self, row: int, values: dict):
+        """Queue several ``{col: value}`` updates on one row."""
+        for col, value in values.items():
+            self.store.apply_update(row, col, value)
+            self.cells[(row, col)] = value
+        self._schedule()
+
+    def append_row(self, values) -> int:
+        """Queue a new row and return the row index it will land on."""
+        row_idx = self.store.apply_append(values)
+        self.appends.append((row_idx, list(values)))
+        self._schedule()
+        return row_idx
+
+    def append_rows(self, rows) -> list:
+        """Queue several new rows (sent in the same ``append_rows`` call) and return their row indexes."""
+        row_indexes = []
+        for values in rows:
+            row_idx = self.store.apply_append(values)
+            self.appends.append((row_idx, list(values)))
+            row_indexes.append(row_idx)
+        if row_indexes:
+            self._schedule()
+        return row_indexes
+
+    def pending(self) -> int:
+        return len(self.cells) + len(self.appends) + (len(self.unconfirmed.appends) if self.unconfirmed else 0)
+
+    def _schedule(self):
+        if self.pending() >= self.max_pending:
+            asyncio.create_task(self.flush())
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    # ─── Flushing ───
+    async def flush(self):
+        async with self._flush_lock:
+            await self._flush()
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self):
+        """Flush, then hold off other flushes until the block exits (rows are being moved in the sheet)."""
+        async with self._flush_lock:
+            await self._flush()
+            yield
+
+    async def _flush(self):
+        # New rows are numbered after the unconfirmed ones, so settle those first
+        if self.unconfirmed and not await self._confirm():
+            self._schedule()
+            return
+        appends, self.appends = self.appends, []
+        cells, self.cells = self.cells, {}
+        if not appends and not cells:
+            return
+
+        # Appends first, so queued cell updates on new rows have a row to land on
+        if appends:
+            attempt = _AppendAttempt(appends)
+            try:
+                response = await self.gateway.run(self._append_rows, attempt, idempotent=False)
+                self._check_append(appends[0][0], response)
+            except Exception as e:
+                if isinstance(e, APIError) and (status_code(e) or 500) < 500:
+                    # Google refused the request, so nothing was written
+                    logging.error(f"Error flushing {len(appends)} appended rows: {e}")
+                    self.appends = appends + self.appends
+                else:
+                    logging.error(f"Appending {len(appends)} rows didn't confirm ({e!r}); checking the sheet before resending")
+                    self.unconfirmed = attempt
+                self.cells = {**cells, **self.cells}
+                self._schedule()
+                return
+
+        data = self._ranges(self._in_sheet(cells))
+        if data:
+            try:
+                await self.gateway.batch_update(data, value_input_option=ValueInputOption.user_entered)
+            except Exception as e:
+                logging.error(f"Error flushing {len(cells)} cell updates: {e}")
+                self.cells = {**cells, **self.cells}
+                self._schedule()
+
+    def _append_rows(self, attempt: _AppendAttempt):
+        """Blocking: the ``append_rows`` call, unless ``_confirm`` gave up on it before it started."""
+        with attempt.lock:
+            if attempt.abandoned:
+                raise RuntimeError("append given up before it started")
+            attempt.started = True
+        try:
+            return self.store.worksheet.append_rows([values for _, values in attempt.appends])
+        finally:
+            attempt.finished.set()
+
+    async def _confirm(self) -> bool:
+        """Re-queue the unconfirmed rows unless the sheet has them; ``False`` to look again on the next flush."""
+        attempt = self.unconfirmed
+        with attempt.lock:
+            attempt.abandoned = True
+        if attempt.started:
+            if not attempt.finished.is_set():
+                return False   # still running on its thread
+            first = self.store.sheet_row(attempt.appends[0][0])
+            last_col = rowcol_to_a1(1, max(len(self.store.header), 1)).rstrip("0123456789")
+            try:
+                tail = await self.gateway.run(self.store.worksheet.get, f"A{first}:{last_col}")
+            except Exception as e:
+                logging.error(f"Couldn't check whether {len(attempt.appends)} appended rows landed: {e}")
+                return False
+            col = self.store.header.index("dialogue_id")
+            ids = {values[col] for _, values in attempt.appends if len(values) > col and values[col]}
+            landed = [offset for offset, values in enumerate(tail) if len(values) > col and values[col] in ids]
+            if landed:
+                # An append is all or nothing: it went through, so don't send it again
+                logging.info(f"{len(attempt.appends)} unconfirmed rows are in the sheet; not resending")
+                if landed[0]:
+                    logging.warning(f"Appended rows landed at {first + landed[0]}, expected {first}; reloading row store")
+                    self.store.loaded = False
+                self.unconfirmed = None
+                return True
+        self.appends = attempt.appends + self.appends
+        self.unconfirmed = None
+        return True
+
+    def _in_sheet(self, cells: dict) -> dict:
+        """Queued cells keyed by the sheet row their row is on now; writes to rows moved out are dropped."""
+        placed = {}
+        for (row, col), value in cells.items():
+            sheet_row = self.store.sheet_row(row)
+            if sheet_row is None:
+                logging.warning(f"Dropping a write to row {row}, which was moved to the archive")
+            else:
+                placed[(sheet_row, col)] = value
+        return placed
+
+    @staticmethod
+    def _ranges(cells: dict):
+        """Group queued cells into one range per run of adjacent columns in a row."""
+        data = []
+        for row, col in sorted(cells):
+            last = data[-1] if data else None
+            if last and last["row"] == row and last["end"] == col - 1:
+                last["values"][0].append(cells[(row, col)])
+                last["end"] = col
+            else:
+                data.append({"row": row, "start": col, "end": col, "values": [[cells[(row, col)]]]})
+        return [
+            {"range": f"{rowcol_to_a1(d['row'], d['start'])}:{rowcol_to_a1(d['row'], d['end'])}", "values": d["values"]}
+            for d in data
+        ]
+
+    def _check_append(self, expected_row: int, response):
+        updated = (response or {}).get("updates", {}).get("updatedRange", "")
+        match = re.search(r"![A-Z]+(\d+)", updated)
+        if match and int(match.group(1)) != self.store.sheet_row(expected_row):
+            # Someone else appended in between; our cached row numbers are off
+            logging.warning(f"Appended rows landed at {match.group(1)}, expected {expected_row}; reloading row store")
+            self.store.loaded = False